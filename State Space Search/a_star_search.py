@@ -1,14 +1,65 @@
-import queue
+import heapq
+from array import array
 import numpy as np
-from search_problems import Node, GridSearchProblem, get_random_grid_problem
+from search_problems import GridSearchProblem, get_random_grid_problem
+from csr_graph import trace_parents
+from node_store import NodeStore, NodeView
+from bitset import explored_set
+from search_instrumentation import STOP_CHECK_INTERVAL
+from grid_map import grid_arrays, cached_heuristic_table, padded_free_cells, to_padded, from_padded
 
-def a_star_search(problem):
+
+def goal_set_heuristic(problem):
+    """
+    Heuristic towards the whole goal set of a problem. problem.heuristic only measures the distance to
+    problem.goal_states[0], so with several goals on a GridSearchProblem the Manhattan distance to the closest goal is
+    looked up in a precomputed table instead; for other problems with several goals the heuristic is 0, unless the
+    problem sets multi_goal_heuristic to say its own heuristic already covers all goals.
+
+    :return: function state -> admissible estimate of the cost to the nearest goal
+    """
+    if len(set(problem.goal_states)) == 1 or getattr(problem, 'multi_goal_heuristic', False):
+        return problem.heuristic
+    if not hasattr(problem, 'grid_map'):
+        return lambda state: 0
+    M, N = problem.M, problem.N
+    hTable = memoryview(cached_heuristic_table(problem, M, N, problem.goal_states))
+    return lambda state: hTable[state]
+
+
+class CostTable(dict):
+    """
+    Best known path cost of every generated state, infinite for the states not generated yet. Missing states are not
+    stored on lookup.
+    """
+
+    def __missing__(self, state):
+        return float('inf')
+
+
+def cost_table(problem):
+    """
+    :return: empty table of best known path costs, an array('d') indexed by state for a GridSearchProblem (8 bytes per
+             cell) and a CostTable for other problems
+    """
+    if hasattr(problem, 'grid_map'):
+        return array('d', [float('inf')]) * (problem.M * problem.N)
+    return CostTable()
+
+
+def a_star_search(problem, instrumentation=None, visited_set=None, should_stop=None):
     """
     Uses the A* algorithm to solve an instance of GridSearchProblem. Use the methods of GridSearchProblem along with
-    structures and functions from the allowed imports (see above) to implement A*.
+    structures and functions from the allowed imports (see above) to implement A*. All of problem.goal_states are goals:
+    the heuristic is the minimum over the goals (see goal_set_heuristic) and the path leads to the nearest one.
 
     :param problem: an instance of GridSearchProblem to solve
-    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+    :param instrumentation: optional SearchInstrumentation collecting counters, callbacks and timings
+    :param visited_set: optional callable problem -> empty set of states, used for the closed set; by default
+                        bitset.explored_set, one bit per state on grids and a Python set otherwise
+    :param should_stop: optional callable polled every STOP_CHECK_INTERVAL expansions, see search_instrumentation
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
              num_nodes_expanded: number of nodes expanded by your search
              max_frontier_size: maximum frontier size during search
     """
@@ -20,54 +71,145 @@ def a_star_search(problem):
     path = []
 
     #SET UP:
-    #get initial and goal state, define initial node
+    #get initial and goal state, define initial node. The search tree lives in a NodeStore and the frontier only
+    #holds row indices into it.
     initState = problem.init_state
-    goalState = problem.goal_states[0]
-    initNode = Node(None, initState, None, 0)
+    goalStates = set(problem.goal_states)
+    nodes = NodeStore()
+    initNode = nodes.add(-1, initState, -1, 0)
+
+    #check if the initial state is a goal state, if yes return it immediately
+    if initState in goalStates:
+        return [initState], num_nodes_expanded, max_frontier_size
+
+    #closed set of expanded states, and best known path cost (g-score) of every generated state
+    closedStates = explored_set(problem) if visited_set is None else visited_set(problem)
+    gScores = cost_table(problem)
+    gScores[initState] = 0
+
+    #define frontier as a binary heap of (f-cost, node row). Rows are numbered in insertion order, so they break ties
+    #the same way a separate counter would and equal f-costs are popped in insertion order.
+    frontier = []
+    push, pop = heapq.heappush, heapq.heappop
+    heuristic = goal_set_heuristic(problem)
+    if instrumentation is not None:
+        problem = instrumentation.wrap_problem(problem)
+        push = instrumentation.timed('queue', push)
+        pop = instrumentation.timed('queue', pop)
+        heuristic = instrumentation.timed('heuristic', heuristic)
 
-    #check if the initial state is the goal state, if yes return it immediately
-    if initState == goalState:
-        return initState, num_nodes_expanded, max_frontier_size
+    #CHECK FIRST NODE:
+    push(frontier, (heuristic(initState), initNode))
+    currNode = NodeView(nodes, initNode)
 
-    #define set of explored states
-    exploredStates = set()
+    while len(frontier) > 0:
 
-    #define frontier as a priority queue so that we can prioritize by cost.
-    frontier = queue.PriorityQueue()
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        if instrumentation is not None:
+            instrumentation.frontier(len(frontier))
 
-    #CHECK FIRST NODE:
-    frontier.put((0, initNode))
-    num_nodes_expanded += 1
+        #unpack highest priority element into cost and node components
+        currCost, currIndex = pop(frontier)
+        currNode.load(currIndex)
+
+        #lazy deletion: skip stale entries left behind when a state was re-pushed with a cheaper path
+        if currNode.path_cost > gScores[currNode.state] or currNode.state in closedStates:
+            continue
+
+        #if current state is a goal state, we want to trace the path and return
+        if instrumentation is not None:
+            instrumentation.goal_test(currNode.state, currNode.state in goalStates)
+        if currNode.state in goalStates:
+            path = nodes.trace_path(currIndex)
+            return path, num_nodes_expanded, max_frontier_size
 
-    while frontier.empty() != True:
+        closedStates.add(currNode.state)
+        #poll before counting, so a stopped search reports only the expansions that called get_actions
+        if should_stop is not None and (num_nodes_expanded + 1) % STOP_CHECK_INTERVAL == 0 and should_stop():
+            return [], num_nodes_expanded, max_frontier_size
+        num_nodes_expanded += 1
 
-        max_frontier_size = max(max_frontier_size, frontier.qsize())
+        #otherwise, get a list of possible actions from our position in grid.
+        for k, a in enumerate(problem.get_actions(currNode.state)):
+            childNode = problem.get_child_node(currNode, a)
 
-        #unpack highest priority element into cost and node components
-        currCost, currNode = frontier.get()
+            #decrease-key: only push the child if this path to it is cheaper than the best one known so far. A closed
+            #state rarely passes the cost test, so the closed set is only checked after it
+            if childNode.path_cost < gScores[childNode.state] and childNode.state not in closedStates:
+                gScores[childNode.state] = childNode.path_cost
+                cost = childNode.path_cost + heuristic(childNode.state)
+                childIndex = nodes.add(currIndex, childNode.state, k, childNode.path_cost)
+                push(frontier, (cost, childIndex))
 
-        #if current state is the goal state, we want to trace the path and return
-        if (currNode.state == goalState):
-            path = problem.trace_path(currNode, initState)
-            num_nodes_expanded += len(exploredStates)
-            return path, num_nodes_expanded, max_frontier_size
+    return path, num_nodes_expanded, max_frontier_size
 
 
-        else:
-            #otherwise, get a list of possible actions from our position in grid.
-            currActions = problem.get_actions(currNode.state)
+def a_star_search_grid(problem, heuristic='manhattan'):
+    """
+    A* specialised for GridSearchProblem. Works directly on the occupancy matrix: states are flat cell ids of the map
+    padded with a wall (so neighbours are fixed offsets with no bounds checks), the heuristic to the goal is precomputed
+    for every cell (the minimum over all of problem.goal_states) and kept on the problem for later searches, and
+    g-costs, parents and the closed set live in flat arrays instead of Node objects.
 
-            for a in currActions:
-                #for each action, get the child node and check if child node was explored.
-                childNode = problem.get_child_node(currNode, a)
+    :param problem: an instance of GridSearchProblem to solve
+    :param heuristic: 'manhattan' or 'euclidean'
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+
+    if problem.init_state in problem.goal_states:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    occupied, M, N = grid_arrays(problem)
+    W = N + 2
+    initState = int(to_padded(problem.init_state, N))
+    goalStates = to_padded(problem.goal_states, N)
+
+    #the arrays stay NumPy int32/bool arrays, the memoryviews only make per-cell access from Python cheap
+    hArray = cached_heuristic_table(problem, M + 2, W, goalStates, heuristic)
+    goalArray = np.zeros((M + 2) * W, dtype=bool)
+    goalArray[goalStates] = True
+    gArray = np.full((M + 2) * W, np.iinfo(np.int32).max, dtype=np.int32)
+    parentArray = np.full((M + 2) * W, -1, dtype=np.int32)
+    openArray = padded_free_cells(occupied, M, N)
+    hTable = memoryview(hArray)
+    gCosts = memoryview(gArray)
+    parents = memoryview(parentArray)
+    isOpen = memoryview(openArray)
+    isGoal = memoryview(goalArray)
+    offsets = (-W, W, -1, 1)
+    gCosts[initState] = 0
+
+    #heap entries are (f, h, state): ties on f go to the state closer to the goal, and only numbers are compared
+    frontier = [(hTable[initState], hTable[initState], initState)]
+    while len(frontier) > 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        _, _, currState = heapq.heappop(frontier)
+        if isGoal[currState]:
+            path = from_padded(trace_parents(parentArray, currState), N).tolist()
+            return path, num_nodes_expanded, max_frontier_size
+        if not isOpen[currState]:
+            #stale entry of an already closed state
+            continue
 
-                if childNode.state not in exploredStates:
-                    #if not explored, calculated cost and add to priority queue
-                    cost = problem.heuristic(childNode.state)+currNode.path_cost
-                    frontier.put((cost, childNode))
-                    exploredStates.add(childNode.state)
+        #walls and closed states are both marked not open, so a single lookup filters the children
+        isOpen[currState] = False
+        num_nodes_expanded += 1
 
-    return path, num_nodes_expanded, max_frontier_size
+        childCost = gCosts[currState] + 1
+        for offset in offsets:
+            childState = currState + offset
+            if isOpen[childState] and childCost < gCosts[childState]:
+                gCosts[childState] = childCost
+                parents[childState] = currState
+                h = hTable[childState]
+                heapq.heappush(frontier, (childCost + h, h, childState))
+
+    return [], num_nodes_expanded, max_frontier_size
 
 
 def search_phase_transition():
@@ -76,6 +218,8 @@ def search_phase_transition():
     NOT need to submit your code that determines the values here: that should be computed on your own machine. Simply
     fill in the values!
 
+    The sweep that produces these values is phase_transition_benchmark.py; rerun it after changing a search engine.
+
     :return: tuple containing (transition_start_probability, transition_end_probability, peak_probability)
     """
     ####
@@ -0,0 +1,159 @@
+import heapq
+import time
+from itertools import count
+from search_problems import Node, get_random_grid_problem
+
+
+def iter_anytime_a_star(problem, initial_weight=3.0, weight_step=0.5, time_limit=None, node_budget=None):
+    """
+    Anytime Repairing A* (ARA*). The first solution comes from A* with the heuristic inflated by initial_weight, which
+    is found quickly; the weight is then lowered by weight_step and the search repaired, reusing the g-values of the
+    previous iterations and re-expanding only the states that became inconsistent. Every solution carries an upper
+    bound on its suboptimality (path cost <= bound * optimal cost); the bound reaches 1 once the path is optimal.
+
+    The search stops early, keeping the solutions yielded so far, when time_limit seconds have passed or node_budget
+    states have been expanded. If it ends without any solution (no path, or the budget ran out first), a last record
+    with an empty path and a bound of None reports the work done.
+
+    :param problem: any problem with get_actions, get_child_node and an admissible heuristic
+    :param initial_weight: heuristic weight of the first iteration (>= 1)
+    :param weight_step: amount the weight is lowered by between iterations
+    :param time_limit: wall time in seconds after which the search stops
+    :param node_budget: number of expansions after which the search stops
+    :return: generator of (path, num_nodes_expanded, max_frontier_size, bound), with cumulative counters; the value
+             it returns (StopIteration.value) is the final (num_nodes_expanded, max_frontier_size)
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    initState = problem.init_state
+    goalState = problem.goal_states[0]
+
+    gScores = {initState: 0}
+    parents = {initState: None}
+    hScores = {initState: problem.heuristic(initState)}
+    openStates = {}
+    frontier = []
+    closedStates = set()
+    inconsistent = set()
+    tieBreaker = count()
+    stats = {'expanded': 0, 'max_frontier': 0}
+
+    def push(state, weight):
+        openStates[state] = gScores[state]
+        heapq.heappush(frontier, (gScores[state] + weight * hScores[state], next(tieBreaker), state))
+
+    def out_of_budget():
+        return (deadline is not None and time.perf_counter() >= deadline) or \
+               (node_budget is not None and stats['expanded'] >= node_budget)
+
+    def improve_path(weight):
+        #expand while some open state could still improve the goal; returns False if the budget ran out
+        while len(frontier) > 0:
+            key, _, state = frontier[0]
+            if openStates.get(state) != gScores[state]:
+                #stale entry: the state was closed or re-pushed with a better g
+                heapq.heappop(frontier)
+                continue
+            if gScores.get(goalState, float('inf')) <= key:
+                return True
+            if out_of_budget():
+                return False
+            heapq.heappop(frontier)
+            del openStates[state]
+            closedStates.add(state)
+            stats['expanded'] += 1
+
+            parentNode = Node(None, state, None, gScores[state])
+            for a in problem.get_actions(state):
+                childNode = problem.get_child_node(parentNode, a)
+                child = childNode.state
+                if childNode.path_cost < gScores.get(child, float('inf')):
+                    gScores[child] = childNode.path_cost
+                    parents[child] = state
+                    if child not in hScores:
+                        hScores[child] = problem.heuristic(child)
+                    if child in closedStates:
+                        #already expanded in this iteration, repaired in the next one
+                        inconsistent.add(child)
+                    else:
+                        push(child, weight)
+            stats['max_frontier'] = max(stats['max_frontier'], len(openStates))
+        return True
+
+    def solution(weight):
+        path = []
+        state = goalState
+        while state is not None:
+            path.append(state)
+            state = parents[state]
+        path.reverse()
+        #g(goal) / (lowest unweighted f of any state still open or inconsistent) bounds the suboptimality
+        pending = [gScores[s] + hScores[s] for s in list(openStates) + list(inconsistent)]
+        bound = weight
+        if len(pending) > 0 and min(pending) > 0:
+            bound = min(weight, gScores[goalState] / min(pending))
+        elif len(pending) == 0:
+            bound = 1.0
+        return path, stats['expanded'], stats['max_frontier'], max(1.0, bound)
+
+    if initState == goalState:
+        yield [initState], 0, 0, 1.0
+        return 0, 0
+
+    weight = max(1.0, initial_weight)
+    lastReported = None
+    push(initState, weight)
+    while True:
+        finished = improve_path(weight)
+        if not finished:
+            #the bound only holds for a completed iteration, keep the solutions already reported
+            break
+        if goalState in gScores:
+            result = solution(weight)
+            if (gScores[goalState], result[3]) != lastReported:
+                lastReported = (gScores[goalState], result[3])
+                yield result
+            if result[3] <= 1.0:
+                break
+        if len(openStates) == 0 and len(inconsistent) == 0:
+            #nothing left to repair (or no path at all)
+            break
+
+        #lower the weight, move the inconsistent states back to OPEN and re-key everything
+        weight = max(1.0, weight - weight_step)
+        pending = list(openStates) + list(inconsistent)
+        inconsistent.clear()
+        openStates.clear()
+        frontier.clear()
+        closedStates.clear()
+        for state in pending:
+            push(state, weight)
+
+    if lastReported is None:
+        yield [], stats['expanded'], stats['max_frontier'], None
+    return stats['expanded'], stats['max_frontier']
+
+
+def anytime_a_star_search(problem, initial_weight=3.0, weight_step=0.5, time_limit=None, node_budget=None):
+    """
+    Run iter_anytime_a_star until it proves optimality or hits the time limit / node budget, and return the best
+    solution found.
+
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of nodes expanded by the whole search, also after the last solution
+             max_frontier_size: maximum frontier size during search
+             bound: suboptimality bound of the path (1.0 when optimal), None when no path was found
+    """
+    solutions = iter_anytime_a_star(problem, initial_weight, weight_step, time_limit, node_budget)
+    while True:
+        try:
+            path, num_nodes_expanded, max_frontier_size, bound = next(solutions)
+        except StopIteration as stop:
+            num_nodes_expanded, max_frontier_size = stop.value
+            return path, num_nodes_expanded, max_frontier_size, bound
+
+
+if __name__ == '__main__':
+    problem = get_random_grid_problem(0.25, 200, 200)
+    for path, num_nodes_expanded, max_frontier_size, bound in iter_anytime_a_star(problem):
+        print("cost {:} within {:.3f} of optimal after {:} expansions".format(len(path) - 1, bound,
+                                                                           num_nodes_expanded))
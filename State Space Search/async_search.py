@@ -0,0 +1,91 @@
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+from search_problems import get_random_grid_problem
+from breadth_first_search import breadth_first_search
+from bidirectional_search import bidirectional_search
+from a_star_search import a_star_search
+
+
+class CancellationToken:
+    """
+    Flag polled by a running search through its should_stop argument, every STOP_CHECK_INTERVAL expansions. Once it
+    is cancelled the search returns at its next poll, so the executor thread is released instead of finishing a search
+    nobody waits for anymore. No problem wrapping or timers are involved, polling costs one call per interval.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def should_stop(self):
+        return self.cancelled
+
+
+def _accepts_should_stop(search):
+    return 'should_stop' in inspect.signature(search).parameters
+
+
+async def run_search(search, problem, timeout=None, executor=None):
+    """
+    Run a blocking search on an executor so the event loop keeps serving other requests, with a timeout and support
+    for cancellation. Searches taking a should_stop argument (breadth_first_search, bidirectional_search,
+    a_star_search) are given a CancellationToken and stop at their next poll when the caller times out or is
+    cancelled. Other searches, and any search sent to a process pool, cannot be interrupted: their result is dropped
+    but they run to completion on the executor.
+
+    :param search: search function taking the problem
+    :param problem: problem to solve
+    :param timeout: seconds to wait for the result, None to wait forever
+    :param executor: concurrent.futures executor, the loop's default thread pool if None (a ProcessPoolExecutor
+                     side-steps the GIL for CPU-bound searches, but the problem and search must be picklable)
+    :return: the result of search, typically (path, num_nodes_expanded, max_frontier_size)
+    :raises asyncio.TimeoutError: when timeout seconds pass without a result
+    """
+    loop = asyncio.get_running_loop()
+    token = None
+    call = functools.partial(search, problem)
+    if _accepts_should_stop(search) and not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        #the timeout is enforced by wait_for, the token only stops the thread afterwards: a search stopped by the
+        #token returns an empty path, which nobody reads anymore once wait_for has raised
+        token = CancellationToken()
+        call = functools.partial(search, problem, should_stop=token.should_stop)
+
+    future = loop.run_in_executor(executor, call)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    finally:
+        #on timeout or cancellation, stop the search still running on the executor (a no-op once it has finished)
+        if token is not None:
+            token.cancel()
+
+
+async def async_breadth_first_search(problem, timeout=None, executor=None):
+    return await run_search(breadth_first_search, problem, timeout, executor)
+
+
+async def async_bidirectional_search(problem, timeout=None, executor=None):
+    return await run_search(bidirectional_search, problem, timeout, executor)
+
+
+async def async_a_star_search(problem, timeout=None, executor=None):
+    return await run_search(a_star_search, problem, timeout, executor)
+
+
+if __name__ == '__main__':
+    # One slow query with a timeout next to several quick ones: the quick ones are not held up by the slow one
+    async def main():
+        slow = get_random_grid_problem(0.2, 800, 800)
+        quick = [get_random_grid_problem(0.2, 30, 30) for _ in range(5)]
+        tasks = [async_breadth_first_search(slow, timeout=0.5)] + [async_a_star_search(p) for p in quick]
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, BaseException):
+                print("failed: {:}".format(type(result).__name__))
+            else:
+                path, num_nodes_expanded, max_frontier_size = result
+                print("{:} steps, {:} nodes expanded".format(len(path) - 1, num_nodes_expanded))
+
+    asyncio.run(main())
@@ -1,15 +1,25 @@
-from collections import deque
 import numpy as np
-from search_problems import Node, GraphSearchProblem
+from search_problems import GraphSearchProblem
+from graph_loader import load_graph
+from csr_graph import get_csr_graph, goal_indices, gather_neighbours, trace_parents
+from node_store import NodeStore, NodeView
+from bitset import explored_set
+from search_instrumentation import STOP_CHECK_INTERVAL
 
 
-def bidirectional_search(problem):
+def bidirectional_search(problem, instrumentation=None, visited_set=None, should_stop=None):
     """
         Implement a bidirectional search algorithm that takes instances of SimpleSearchProblem (or its derived
-        classes) and provides a valid and optimal path from the initial state to the goal state.
+        classes) and provides a valid and optimal path from the initial state to the goal state. The goal side starts
+        from all of problem.goal_states at once, so the path leads to the nearest goal.
 
         :param problem: instance of SimpleSearchProblem
-        :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+        :param instrumentation: optional SearchInstrumentation collecting counters, callbacks and timings
+        :param visited_set: optional callable problem -> empty set of states, used for the explored states of each
+                            side; by default bitset.explored_set, one bit per state on grids and a Python set otherwise
+        :param should_stop: optional callable polled every STOP_CHECK_INTERVAL expansions, see search_instrumentation
+        :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                       problem.goal_states
                  num_nodes_expanded: number of nodes expanded by your search
                  max_frontier_size: maximum frontier size during search
         """
@@ -23,176 +33,319 @@ def bidirectional_search(problem):
     #my code
 
     #SET UP:
-        #basically, we are creating two BFS, one that start at the init state and another at the goal state.
-        #need to set up twice the number of variables
+        #basically, we are creating two BFS, one that start at the init state and another at the goal states.
+        #each side keeps its search tree in a NodeStore and a set of explored states. The frontiers only hold row
+        #indices; the rows of the intersection state are looked up in the NodeStores once a path is found.
     initState = problem.init_state
-    goalState = problem.goal_states[0]
+    goalStates = set(problem.goal_states)
 
-    initNode = Node(None, initState, None, 0)
-    goalNode = Node(None, goalState, None, 0)
+    if initState in goalStates:
+        return [initState], num_nodes_expanded, max_frontier_size
 
-    initFrontier = deque()
-    goalFrontier = deque()
+    initNodes = NodeStore()
+    goalNodes = NodeStore()
 
-    initExploredStates = {} #child:parent dictionaries
-    goalExploredStates = {}
+    #every goal is a root of the goal side's search tree
+    initFrontier = [initNodes.add(-1, initState, -1, 0)]
+    goalFrontier = [goalNodes.add(-1, goalState, -1, 0) for goalState in goalStates]
 
-    pathFromInit = []
-    pathToGoal = []
+    if visited_set is None:
+        visited_set = explored_set
+    initExploredStates = visited_set(problem)
+    goalExploredStates = visited_set(problem)
+    initExploredStates.add(initState)
+    for goalState in goalStates:
+        goalExploredStates.add(goalState)
 
-    initSet = set() #will be used to determine if an intersection between both paths has occured.
-    goalSet = set()
+    intersectionState = None
+    initView = NodeView(initNodes, 0)
+    goalView = NodeView(goalNodes, 0)
 
+    """
+    Design of bidirectional BFS :
 
-    foundNode = False #set when intersecting node was found, and will stop the search
-    foundPath = False #set when each path is found.
-
-    #CHECK FIRST NODE OF EACH PATH:
-    initFrontier.append(initNode)
-    initExploredStates[initState] = None
-    initSet.add(initState)
+    loop runs while both frontiers > 0 and no intersection was found :
 
-    goalFrontier.append(goalNode)
-    #goalExploredStates[goalState] = None
-    goalSet.add(goalState)
+        pick the side with the smaller frontier, its level is the cheaper one to expand.
 
-    num_nodes_expanded += 2
+        expand every node of that frontier (one full BFS level) :
+            get child associated to each action.
+            if child already explored by this side -> skip
+            otherwise add child to this side's NodeStore and explored set
+                if child was explored by the other side -> intersection, stop
+                else child goes to the next frontier of this side
 
+    Expanding whole levels keeps the first intersection optimal: any shorter path would have had a state explored by
+    both sides at an earlier level, which would have been detected then. Membership tests are set (or bit) lookups, the
+    frontiers are never scanned.
     """
-    Design of bidirectional BFS :
-
-    loop runs while both frontier > 0 and path not found in both directions :
 
-        define temp queue to hold all neighbours (child) nodes that will be explored
+    if instrumentation is not None:
+        problem = instrumentation.wrap_problem(problem)
 
-        BFS loop for inital side - while the frontier not empty and have not found intersecting node:
-            pop a neighbour
-            add to setInit
-            get action list of node.
+    while len(initFrontier) > 0 and len(goalFrontier) > 0 and intersectionState is None:
 
-            loop through action list :
-                get child associated to each action.
-                check if child is in goalSet, then found intersection
-                or if child in goalFrontier, then node will be visited on goal side, and will become intersection.
-                    -> break and run goal side to get to child.
+        max_frontier_size = max(max_frontier_size, len(initFrontier), len(goalFrontier))
 
-                if not, check if child in initSet -> ie node was explored
-                or if it's in temp queue that holds neighbours -> will eventually be explored
-                    -> just continue, will get to node eventually
+        #always expand the smaller frontier
+        expandInit = len(initFrontier) <= len(goalFrontier)
+        if expandInit:
+            frontier, nodes, currNode = initFrontier, initNodes, initView
+            ownExplored, otherExplored = initExploredStates, goalExploredStates
+        else:
+            frontier, nodes, currNode = goalFrontier, goalNodes, goalView
+            ownExplored, otherExplored = goalExploredStates, initExploredStates
+
+        if instrumentation is not None:
+            instrumentation.frontier(len(frontier))
+
+        nextFrontier = []
+        push = nextFrontier.append
+        if instrumentation is not None:
+            push = instrumentation.timed('queue', push)
+        for currIndex in frontier:
+            currNode.load(currIndex)
+            #poll before counting, so a stopped search reports only the expansions that called get_actions
+            if should_stop is not None and (num_nodes_expanded + 1) % STOP_CHECK_INTERVAL == 0 and should_stop():
+                return [], num_nodes_expanded, max_frontier_size
+            num_nodes_expanded += 1
+            for k, a in enumerate(problem.get_actions(currNode.state)):
+                childNode = problem.get_child_node(currNode, a)
+
+                if childNode.state in ownExplored:
+                    #node has been or will be explored by this side
+                    continue
+
+                childIndex = nodes.add(currIndex, childNode.state, k, childNode.path_cost)
+                ownExplored.add(childNode.state)
+                if instrumentation is not None:
+                    instrumentation.goal_test(childNode.state, childNode.state in otherExplored)
+                if childNode.state in otherExplored:
+                    #intersection was found
+                    intersectionState = childNode.state
+                    break
+                push(childIndex)
 
-                if not in either
-                    ->append child to temp queue and add to initSet and initExploredStates
+            if intersectionState is not None:
+                break
 
-            when done looping through action list
-                -> load temp queue holding neighbours to initFrontier (official queue)
-                -> update nr of expanded nodes
+        if expandInit:
+            initFrontier = nextFrontier
+        else:
+            goalFrontier = nextFrontier
 
-        BFS loop for goal side
-            esentially repeat the process from the goal side
-    """
-
-    while (len(initFrontier)>0 and len(goalFrontier)>0 and not foundPath):
+    if intersectionState is None:
+        #no path between initial state and goal state
+        return path, num_nodes_expanded, max_frontier_size
 
-        max_frontier_size = max(max_frontier_size, len(initFrontier), len(goalFrontier))
+    #two half paths were found and intersection node identified.
+    #path found from init to intersection, and from goal to intersection (reversed to run towards the goal)
+    #every state is stored at most once per side, so the first row holding it is its node
+    pathFromInit = initNodes.trace_path(initNodes.states.index(intersectionState))
+    pathToGoal = goalNodes.trace_path(goalNodes.states.index(intersectionState))[::-1]
 
-        #BFS that starts at initial state
-        tempQ = deque()
-        while (len(initFrontier)>0 and foundNode!=True):
-            currNode = initFrontier.popleft()
-            initSet.add(currNode.state)
-            currActions = problem.get_actions(currNode.state)
-
-            a = 0
-            while a <= (len(currActions) - 1):
-                #regular BFS implementation
-                childNode = problem.get_child_node(currNode, currActions[a])
-                a += 1
-
-                if (childNode.state in goalSet) or (childNode in goalFrontier):
-                    #intersection was found or node is in goal-BFS queue and will become intersection.
-                    intersectionState = childNode.state
-                    initExploredStates[childNode.state] = currNode.state
-                    initSet.add(intersectionState)
+    #combine to get full path
+    path = pathFromInit + pathToGoal[1:]
+    return path, num_nodes_expanded, max_frontier_size
 
-                    foundNode = True
-                    foundPath = True
-                    break
-                else:
-                    if (childNode.state in initSet) or (childNode in tempQ):
-                        #node has been or will be explored
-                        continue
-                    else:
-                        tempQ.append(childNode)
-                        initSet.add(childNode.state)
-                        initExploredStates[childNode.state] = currNode.state
-        #when done looping through all the child-neighbour nodes or when intersecting state found
-        initFrontier = tempQ
-        num_nodes_expanded += len(tempQ) #add the increasing nr of child nodes
-        if foundPath == True:
-            break
 
-        #BFS that starts at goal state
-        tempQ = deque()
-        while (len(goalFrontier)>0 and foundNode!=True):
-            currNode = goalFrontier.popleft()
-            goalSet.add(currNode.state)
-            currActions = problem.get_actions(currNode.state)
+def bidirectional_search_csr(problem, graph=None):
+    """
+    Bidirectional breadth-first search over the CSR adjacency of a GraphSearchProblem. Each iteration expands one full
+    level of the side with the smaller frontier, as in bidirectional_search, but the neighbours come straight from the
+    indptr/indices arrays and each side keeps its parents in a flat integer array (-2 marks an unvisited vertex), so
+    checking whether the other side has reached a vertex is a single array lookup.
+
+    :param problem: instance of GraphSearchProblem
+    :param graph: CSRGraph of the problem, built from problem.V and problem.E if not given
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    if graph is None:
+        graph = get_csr_graph(problem)
+    max_frontier_size = 0
+    num_nodes_expanded = 0
 
-            a = 0
-            while a <= (len(currActions)-1):
-                #regular BFS implementation
-                childNode = problem.get_child_node(currNode, currActions[a])
-                a+=1
+    initIndex = graph.index_of(problem.init_state)
+    goalIndices = goal_indices(graph, problem.goal_states)
+    if initIndex == -1 or len(goalIndices) == 0:
+        return [], num_nodes_expanded, max_frontier_size
+    if initIndex in goalIndices:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    indptr = graph.indptr
+    indices = graph.indices
+    initParents = np.full(graph.num_vertices, -2, dtype=np.int64)
+    goalParents = np.full(graph.num_vertices, -2, dtype=np.int64)
+    initParents[initIndex] = -1
+    goalParents[goalIndices] = -1
+
+    initFrontier = [initIndex]
+    goalFrontier = goalIndices.tolist()
+    intersection = -1
+    while len(initFrontier) > 0 and len(goalFrontier) > 0 and intersection == -1:
+        max_frontier_size = max(max_frontier_size, len(initFrontier), len(goalFrontier))
 
-                if (childNode.state in initSet) or (childNode in initFrontier):
-                    intersectionState = childNode.state
-                    goalExploredStates[childNode.state] = currNode.state
-                    goalSet.add(intersectionState)
-                    foundNode = True
-                    foundPath = True
+        #expand one full level of the side with the smaller frontier
+        expandInit = len(initFrontier) <= len(goalFrontier)
+        if expandInit:
+            frontier, ownParents, otherParents = initFrontier, initParents, goalParents
+        else:
+            frontier, ownParents, otherParents = goalFrontier, goalParents, initParents
+
+        nextFrontier = []
+        for currIndex in frontier:
+            num_nodes_expanded += 1
+            for childIndex in indices[indptr[currIndex]:indptr[currIndex + 1]].tolist():
+                if ownParents[childIndex] != -2:
+                    continue
+                ownParents[childIndex] = currIndex
+                if otherParents[childIndex] != -2:
+                    intersection = childIndex
                     break
-                else:
-                    if (childNode.state in goalSet) or (childNode in tempQ):
-                        continue
-                    else:
-                        tempQ.append(childNode) #will be checked eventually
-                        goalSet.add(childNode.state)
-                        goalExploredStates[childNode.state] = currNode.state
-        goalFrontier = tempQ
-        num_nodes_expanded += len(tempQ)
-        if foundPath == True:
-            break
+                nextFrontier.append(childIndex)
+            if intersection != -1:
+                break
 
-    #two half paths were found and intersection node identified.
-    try:
-        #path found from init to intersection
-        pathFromInit.append(intersectionState)
+        if expandInit:
+            initFrontier = nextFrontier
+        else:
+            goalFrontier = nextFrontier
 
-        currState = initExploredStates[intersectionState]
-        while (currState != initState):
-            pathFromInit.append(currState)
-            currState = initExploredStates[currState]
+    if intersection == -1:
+        return [], num_nodes_expanded, max_frontier_size
 
-        pathFromInit.append(initState)
-        pathFromInit.reverse() #reverse to get correct order
+    pathFromInit = trace_parents(initParents, intersection)
+    pathToGoal = trace_parents(goalParents, intersection)[::-1]
+    path = graph.path_to_states(np.concatenate((pathFromInit, pathToGoal[1:])))
+    return path, num_nodes_expanded, max_frontier_size
 
-        #path found from intersection to goal
-        currGoalState = goalExploredStates[intersectionState]
-        while (currGoalState != goalState):
-            pathToGoal.append(currGoalState)
-            currGoalState = goalExploredStates[currGoalState] #gives next node explored on path to goal
 
-        pathToGoal.append(goalState)
+def _top_down_step(graph, frontier, parents):
+    #expand the frontier: gather its neighbours and keep the ones this side has not visited yet
+    neighbours, owners = gather_neighbours(graph, frontier)
+    unvisited = parents[neighbours] == -2
+    newStates, first = np.unique(neighbours[unvisited], return_index=True)
+    parents[newStates] = owners[unvisited][first]
+    return newStates
+
+
+def _bottom_up_step(graph, frontier, parents):
+    #every vertex this side has not visited yet looks for a neighbour in the frontier. Its neighbour list is scanned in
+    #chunks that double in size, and a vertex leaves the scan as soon as a chunk holds a frontier vertex, so the edges
+    #read stay within about twice the edges a sequential scan that stops at the first hit would read
+    inFrontier = np.zeros(graph.num_vertices, dtype=bool)
+    inFrontier[frontier] = True
+    candidates = np.flatnonzero(parents == -2)
+    starts = graph.indptr[candidates]
+    ends = graph.indptr[candidates + 1]
+    hasEdges = starts < ends
+    candidates, starts, ends = candidates[hasEdges], starts[hasEdges], ends[hasEdges]
+
+    newStates = []
+    width = 1
+    while len(candidates) > 0:
+        counts = np.minimum(ends - starts, width)
+        total = int(counts.sum())
+        owners = np.repeat(np.arange(len(candidates)), counts)
+        offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        neighbours = graph.indices[np.repeat(starts, counts) + offsets]
+        hits = inFrontier[neighbours]
+        found, first = np.unique(owners[hits], return_index=True)
+        parents[candidates[found]] = neighbours[hits][first]
+        newStates.append(candidates[found])
+
+        starts = starts + counts
+        keep = starts < ends
+        keep[found] = False
+        candidates, starts, ends = candidates[keep], starts[keep], ends[keep]
+        width *= 2
+    if len(newStates) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate(newStates))
+
+
+def bidirectional_search_direction_optimizing(problem, graph=None, alpha=2.0, beta=24.0):
+    """
+    Direction-optimizing bidirectional breadth-first search over the CSR adjacency of a GraphSearchProblem.
+
+    Each iteration expands one full level of whichever side has the smaller frontier. A level is expanded bottom-up
+    (unvisited vertices look for a neighbour in the frontier, each stopping at the first one found) when the edges
+    leaving the frontier exceed 1/alpha of the edges of the unvisited vertices and the frontier holds at least 1/beta
+    of the vertices, and top-down (frontier vertices scan their neighbours) otherwise. Both sides keep their parents in
+    flat integer arrays (-2 marks an unvisited vertex), so intersections are detected with O(1) lookups.
+
+    The defaults were measured on power-law graphs: unlike the original formulation, whose alpha is 14, a vectorized
+    level only pays off bottom-up once the unvisited edges are down to about twice the frontier edges. The direction is
+    chosen again at every level, so a side whose remaining vertices are mostly unreachable (another component) goes
+    back to top-down.
+
+    :param problem: instance of GraphSearchProblem
+    :param graph: CSRGraph of the problem, built from problem.V and problem.E if not given
+    :param alpha: bottom-up requires frontier edges * alpha > unvisited edges
+    :param beta: bottom-up requires frontier size * beta >= number of vertices
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    if graph is None:
+        graph = get_csr_graph(problem)
+    max_frontier_size = 0
+    num_nodes_expanded = 0
 
-        #combine to get full path
-        path = pathFromInit + pathToGoal
-        return path, num_nodes_expanded, max_frontier_size
+    initIndex = graph.index_of(problem.init_state)
+    goalIndices = goal_indices(graph, problem.goal_states)
+    if initIndex == -1 or len(goalIndices) == 0:
+        return [], num_nodes_expanded, max_frontier_size
+    if initIndex in goalIndices:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    degrees = np.diff(graph.indptr)
+    numVertices = graph.num_vertices
+
+    #per side: parents array, current frontier, edges still attached to unvisited vertices
+    sides = []
+    for roots in (np.array([initIndex], dtype=np.int64), goalIndices):
+        parents = np.full(numVertices, -2, dtype=np.int64)
+        parents[roots] = -1
+        sides.append({'parents': parents,
+                      'frontier': roots,
+                      'unvisitedEdges': graph.num_edges - int(degrees[roots].sum())})
+
+    intersection = -1
+    while len(sides[0]['frontier']) > 0 and len(sides[1]['frontier']) > 0:
+        max_frontier_size = max(max_frontier_size, len(sides[0]['frontier']), len(sides[1]['frontier']))
+
+        #always expand the smaller frontier
+        ownSide = 0 if len(sides[0]['frontier']) <= len(sides[1]['frontier']) else 1
+        side = sides[ownSide]
+        otherParents = sides[1 - ownSide]['parents']
+        frontier = side['frontier']
+        num_nodes_expanded += len(frontier)
+
+        frontierEdges = int(degrees[frontier].sum())
+        if frontierEdges * alpha > side['unvisitedEdges'] and len(frontier) * beta >= numVertices:
+            newStates = _bottom_up_step(graph, frontier, side['parents'])
+        else:
+            newStates = _top_down_step(graph, frontier, side['parents'])
+        side['frontier'] = newStates
+        side['unvisitedEdges'] -= int(degrees[newStates].sum())
+
+        #a whole level was expanded, so any state already reached by the other side closes an optimal path
+        meeting = newStates[otherParents[newStates] != -2]
+        if len(meeting) > 0:
+            intersection = int(meeting[0])
+            break
 
-    except KeyError:
-        #if error occurs, as in no path is found between initial state and goal state
-        #set path to None/empty.
-        path = []
+    if intersection == -1:
+        return [], num_nodes_expanded, max_frontier_size
 
+    pathFromInit = trace_parents(sides[0]['parents'], intersection)
+    pathToGoal = trace_parents(sides[1]['parents'], intersection)[::-1]
+    path = graph.path_to_states(np.concatenate((pathFromInit, pathToGoal[1:])))
     return path, num_nodes_expanded, max_frontier_size
 
 
@@ -221,8 +374,7 @@ if __name__ == '__main__':
     print(path)
 
     # Use stanford_large_network_facebook_combined.txt to make your own test instances
-    E = np.loadtxt('C:\\Users\\SarahAgib\\Desktop\\UofT-Year3B\\ROB311 - Artifical Intelligence\\lab1\\rob311_winter_2023_project_01_handout\\stanford_large_network_facebook_combined.txt', dtype=int)
-    V = np.unique(E)
+    V, E, graph = load_graph('C:\\Users\\SarahAgib\\Desktop\\UofT-Year3B\\ROB311 - Artifical Intelligence\\lab1\\rob311_winter_2023_project_01_handout\\stanford_large_network_facebook_combined.txt')
     goal_states = [349]
     init_state = 0
     problem = GraphSearchProblem(goal_states, init_state, V, E)
@@ -231,4 +383,8 @@ if __name__ == '__main__':
     print("Solution is correct: {:}".format(correct))
     print(path)
 
+    # The cached CSR graph from load_graph can be reused by the array-based searches
+    path, num_nodes_expanded, max_frontier_size = bidirectional_search_direction_optimizing(problem, graph)
+    print("Direction-optimizing search: {:} nodes expanded, path {:}".format(num_nodes_expanded, path))
+
     # Be sure to compare with breadth_first_search!
\ No newline at end of file
@@ -0,0 +1,134 @@
+import numpy as np
+
+#number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class Bitset:
+    """
+    Fixed-size set of the integers 0..n-1 stored as one bit per integer in a NumPy uint8 array.
+
+    Attributes
+    --------------
+
+        n: number of integers the set can hold
+        bits: packed uint8 array of (n + 7) // 8 bytes, bit i % 8 of byte i // 8 is set when i is in the set
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.bits = np.zeros((n + 7) // 8, dtype=np.uint8)
+        #single-bit operations go through a memoryview, which reads and writes plain ints without NumPy scalars
+        self.view = memoryview(self.bits)
+
+    def test(self, i):
+        return bool((self.view[i >> 3] >> (i & 7)) & 1)
+
+    def set(self, i):
+        self.view[i >> 3] |= 1 << (i & 7)
+
+    def test_many(self, indices):
+        """
+        :param indices: integer array
+        :return: boolean array, True where the integer is in the set
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return ((self.bits[indices >> 3] >> (indices & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def set_many(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        #np.bitwise_or.at handles repeated bytes, a plain fancy-index |= would drop all but one update per byte
+        np.bitwise_or.at(self.bits, indices >> 3, np.left_shift(1, indices & 7).astype(np.uint8))
+
+    def test_and_set_many(self, indices):
+        """
+        Set a batch of integers and report which of them were new.
+
+        :param indices: integer array
+        :return: boolean array, True where the integer was not in the set before (only for its first occurrence when
+                 it appears several times in indices)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        new = ~self.test_many(indices)
+        candidates = indices[new]
+        if len(candidates) > 1:
+            _, first = np.unique(candidates, return_index=True)
+            if len(first) < len(candidates):
+                keep = np.zeros(len(candidates), dtype=bool)
+                keep[first] = True
+                new[np.flatnonzero(new)[~keep]] = False
+        self.set_many(indices[new])
+        return new
+
+    def count(self):
+        return int(POPCOUNT[self.bits].sum(dtype=np.int64))
+
+
+class VisitedSet(Bitset):
+    """
+    Set of integer states backed by a Bitset, usable in place of the Python set of explored states in the searches:
+    it supports `in`, add and len, and the bulk add_many for vectorized searches. One bit per possible state instead
+    of ~100 bytes per stored state, at the cost of allocating the whole range up front, so it suits dense state ids
+    such as grid cells or the vertices of V.
+
+    :param n: number of possible states
+    :param offset: smallest possible state, states are offset..offset+n-1
+    """
+
+    def __init__(self, n, offset=0):
+        super().__init__(n)
+        self.offset = offset
+        self.size = 0
+
+    @classmethod
+    def for_problem(cls, problem):
+        """
+        Empty VisitedSet covering every state of a GridSearchProblem (M*N cells) or GraphSearchProblem (the range of V
+        and E), to be passed as the visited_set argument of the searches.
+        """
+        if hasattr(problem, 'grid_map'):
+            return cls(problem.M * problem.N)
+        states = np.concatenate((np.asarray(problem.V, dtype=np.int64).ravel(),
+                                 np.asarray(problem.E, dtype=np.int64).ravel()))
+        low = int(states.min()) if len(states) > 0 else 0
+        high = int(states.max()) if len(states) > 0 else -1
+        return cls(high - low + 1, low)
+
+    def __contains__(self, state):
+        i = state - self.offset
+        return 0 <= i < self.n and (self.view[i >> 3] >> (i & 7)) & 1 == 1
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state):
+        i = state - self.offset
+        if not 0 <= i < self.n:
+            raise IndexError('state {:} outside of the range of the set'.format(state))
+        byte = self.view[i >> 3]
+        mask = 1 << (i & 7)
+        if not byte & mask:
+            self.view[i >> 3] = byte | mask
+            self.size += 1
+
+    def add_many(self, states):
+        """
+        :param states: array of states
+        :return: boolean array, True for the states that were not in the set yet
+        """
+        indices = np.asarray(states, dtype=np.int64) - self.offset
+        if len(indices) > 0 and (indices.min() < 0 or indices.max() >= self.n):
+            raise IndexError('states outside of the range of the set')
+        new = self.test_and_set_many(indices)
+        self.size += int(new.sum())
+        return new
+
+
+def explored_set(problem):
+    """
+    Default set of explored states of the searches: a VisitedSet for a GridSearchProblem, whose M*N cells are dense
+    state ids, and a Python set for other problems, whose range of states may be far larger than what a search reaches.
+    """
+    if hasattr(problem, 'grid_map'):
+        return VisitedSet.for_problem(problem)
+    return set()
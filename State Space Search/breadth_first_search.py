@@ -1,16 +1,26 @@
 from collections import deque
 import numpy as np
-from search_problems import Node, GraphSearchProblem
+from search_problems import GraphSearchProblem
+from graph_loader import load_graph
+from csr_graph import get_csr_graph, goal_mask, expand_level, trace_parents
+from node_store import NodeStore, NodeView
+from bitset import explored_set
+from search_instrumentation import STOP_CHECK_INTERVAL
 
 ###
-def breadth_first_search(problem):
+def breadth_first_search(problem, instrumentation=None, visited_set=None, should_stop=None):
     """
     Implement a simple breadth-first search algorithm that takes instances of SimpleSearchProblem (or its derived
     classes) and provides a valid and optimal path from the initial state to the goal state. Useful for testing your
-    bidirectional and A* search algorithms.
+    bidirectional and A* search algorithms. All of problem.goal_states are goals, so one search finds the nearest.
 
     :param problem: instance of SimpleSearchProblem
-    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+    :param instrumentation: optional SearchInstrumentation collecting counters, callbacks and timings
+    :param visited_set: optional callable problem -> empty set of states, used for the explored states; by default
+                        bitset.explored_set, one bit per state on grids and a Python set otherwise
+    :param should_stop: optional callable polled every STOP_CHECK_INTERVAL expansions, see search_instrumentation
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
              num_nodes_expanded: number of nodes expanded by your search
              max_frontier_size: maximum frontier size during search
     """
@@ -24,21 +34,28 @@ def breadth_first_search(problem):
 
     #my code
 
-    #set up of know conditions : goal state, initial state and starting node.
-    goalState = problem.goal_states[0]
+    #set up of know conditions : goal states, initial state and starting node.
+    #the search tree lives in a NodeStore, the queue only holds row indices into it.
+    goalStates = set(problem.goal_states)
     initState = problem.init_state
-    startingNode = Node(None, initState, None, 0)
+    nodes = NodeStore()
+    startingNode = nodes.add(-1, initState, -1, 0)
 
-    #define dictionary of explored states which will contain child:parent pairs
+    #define set of explored states
     #define queue that will hold neighbours to be checked.
-    exploredStates = {}
+    exploredStates = explored_set(problem) if visited_set is None else visited_set(problem)
     frontierQ = deque()
+    push, pop = frontierQ.append, frontierQ.popleft
+    if instrumentation is not None:
+        problem = instrumentation.wrap_problem(problem)
+        push = instrumentation.timed('queue', push)
+        pop = instrumentation.timed('queue', pop)
 
 
     #explore first node (first search)
-    frontierQ.append(startingNode)
-    exploredStates[initState] = None
-    num_nodes_expanded += 1
+    push(startingNode)
+    exploredStates.add(initState)
+    currNode = NodeView(nodes, startingNode)
 
 
     #define breadth first search loop
@@ -56,21 +73,29 @@ def breadth_first_search(problem):
         '''
 
         max_frontier_size = max(len(frontierQ), max_frontier_size)
+        if instrumentation is not None:
+            instrumentation.frontier(len(frontierQ))
 
-        currNode = frontierQ.popleft()
-        num_nodes_expanded += 1
+        currIndex = pop()
+        currNode.load(currIndex)
 
         #if statement enacts when we have found the goal state.
-        if currNode.state == goalState :
-            path = problem.trace_path(currNode, initState)
+        if instrumentation is not None:
+            instrumentation.goal_test(currNode.state, currNode.state in goalStates)
+        if currNode.state in goalStates:
+            path = nodes.trace_path(currIndex)
             return path, num_nodes_expanded, max_frontier_size
+        #poll before counting, so a stopped search reports only the expansions that called get_actions
+        if should_stop is not None and (num_nodes_expanded + 1) % STOP_CHECK_INTERVAL == 0 and should_stop():
+            return [], num_nodes_expanded, max_frontier_size
+        num_nodes_expanded += 1
 
         #if current state is not goal state.
         #1. get all actions associate to current state
         currActions = problem.get_actions(currNode.state)
 
-        #2. for each action, get child node
-        for a in currActions:
+        #2. for each action, get child node. The Node returned by the problem is only read, never kept.
+        for k, a in enumerate(currActions):
             childNode = problem.get_child_node(currNode, a)
 
             #two cases:
@@ -83,20 +108,118 @@ def breadth_first_search(problem):
                 continue #will be eventually explored.
 
             else:
-                exploredStates[childNode.state] = currNode #add to explored.
+                exploredStates.add(childNode.state) #add to explored.
+                childIndex = nodes.add(currIndex, childNode.state, k, childNode.path_cost)
 
-                if childNode.state == goalState:
+                if instrumentation is not None:
+                    instrumentation.goal_test(childNode.state, childNode.state in goalStates)
+                if childNode.state in goalStates:
                     #essentially repeat the process in the first if statement.
-                    path = problem.trace_path(childNode, initState)
+                    path = nodes.trace_path(childIndex)
                     return path, num_nodes_expanded, max_frontier_size
                 else:
-                    frontierQ.append(childNode)
+                    push(childIndex)
 
     #null case. no path to be found.
     path = []
     return path, num_nodes_expanded, max_frontier_size
 
 
+def breadth_first_search_csr(problem, graph=None):
+    """
+    Breadth-first search over the CSR adjacency of a GraphSearchProblem. Same search as breadth_first_search, but the
+    neighbours are read straight from the indptr/indices arrays and the explored states and parents are kept in flat
+    integer arrays, so no Node is allocated per edge.
+
+    :param problem: instance of GraphSearchProblem
+    :param graph: CSRGraph of the problem, built from problem.V and problem.E if not given
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    if graph is None:
+        graph = get_csr_graph(problem)
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+
+    initIndex = graph.index_of(problem.init_state)
+    isGoal = goal_mask(graph, problem.goal_states)
+    if initIndex == -1 or not isGoal.any():
+        return [], num_nodes_expanded, max_frontier_size
+    if isGoal[initIndex]:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    indptr = graph.indptr
+    indices = graph.indices
+    parents = np.full(graph.num_vertices, -1, dtype=np.int64)
+    explored = np.zeros(graph.num_vertices, dtype=bool)
+    explored[initIndex] = True
+
+    frontierQ = deque([initIndex])
+    while len(frontierQ) > 0:
+        max_frontier_size = max(len(frontierQ), max_frontier_size)
+        currIndex = frontierQ.popleft()
+        num_nodes_expanded += 1
+
+        for childIndex in indices[indptr[currIndex]:indptr[currIndex + 1]].tolist():
+            if explored[childIndex]:
+                continue
+            explored[childIndex] = True
+            parents[childIndex] = currIndex
+            if isGoal[childIndex]:
+                path = graph.path_to_states(trace_parents(parents, childIndex))
+                return path, num_nodes_expanded, max_frontier_size
+            frontierQ.append(childIndex)
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+def breadth_first_search_level_sync(problem, graph=None):
+    """
+    Level-synchronous breadth-first search over the CSR adjacency of a GraphSearchProblem. Instead of popping one node
+    at a time, the whole frontier is expanded in one NumPy step: the neighbours of every frontier vertex are gathered,
+    already visited vertices are masked out with a boolean array and the parents of the new vertices are written into
+    an integer array. The next frontier is the set of newly visited vertices.
+
+    :param problem: instance of GraphSearchProblem
+    :param graph: CSRGraph of the problem, built from problem.V and problem.E if not given
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    if graph is None:
+        graph = get_csr_graph(problem)
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+
+    initIndex = graph.index_of(problem.init_state)
+    isGoal = goal_mask(graph, problem.goal_states)
+    if initIndex == -1 or not isGoal.any():
+        return [], num_nodes_expanded, max_frontier_size
+    if isGoal[initIndex]:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    parents = np.full(graph.num_vertices, -1, dtype=np.int64)
+    visited = np.zeros(graph.num_vertices, dtype=bool)
+    visited[initIndex] = True
+
+    frontier = np.array([initIndex], dtype=np.int64)
+    while len(frontier) > 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        num_nodes_expanded += len(frontier)
+
+        frontier = expand_level(graph, frontier, visited, parents)
+
+        reached = frontier[isGoal[frontier]]
+        if len(reached) > 0:
+            path = graph.path_to_states(trace_parents(parents, reached[0]))
+            return path, num_nodes_expanded, max_frontier_size
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
 if __name__ == '__main__':
     # Simple example
     goal_states = [0]
@@ -122,8 +245,7 @@ if __name__ == '__main__':
     print(path)
 
     # Use stanford_large_network_facebook_combined.txt to make your own test instances
-    E = np.loadtxt('C:\\Users\\SarahAgib\\Desktop\\UofT-Year3B\\ROB311 - Artifical Intelligence\\lab1\\rob311_winter_2023_project_01_handout\\stanford_large_network_facebook_combined.txt',dtype=int)
-    V = np.unique(E)
+    V, E, graph = load_graph('C:\\Users\\SarahAgib\\Desktop\\UofT-Year3B\\ROB311 - Artifical Intelligence\\lab1\\rob311_winter_2023_project_01_handout\\stanford_large_network_facebook_combined.txt')
     goal_states = [349]
     init_state = 0
     problem = GraphSearchProblem(goal_states, init_state, V, E)
@@ -131,3 +253,7 @@ if __name__ == '__main__':
     correct = problem.check_graph_solution(path)
     print("Solution is correct: {:}".format(correct))
     print(path)
+
+    # The cached CSR graph from load_graph can be reused by the array-based searches
+    path, num_nodes_expanded, max_frontier_size = breadth_first_search_level_sync(problem, graph)
+    print("Level-synchronous BFS: {:} nodes expanded, path {:}".format(num_nodes_expanded, path))
@@ -0,0 +1,413 @@
+import heapq
+from itertools import accumulate
+from operator import itemgetter
+import os
+import numpy as np
+from search_problems import GraphSearchProblem
+from csr_graph import CSRGraph, get_csr_graph
+from graph_loader import load_graph, default_cache_dir, read_cache_meta
+
+#bound on the vertices settled by one witness search; a search that gives up adds a (possibly redundant) shortcut
+WITNESS_SETTLE_LIMIT = 64
+#bounds of the witness searches that only estimate the priority of a vertex; contracting it uses the full search
+ESTIMATE_HOP_LIMIT = 5
+ESTIMATE_SETTLE_LIMIT = 16
+#contraction stops once the remaining graph has this many times the edges of the input; its vertices are left as an
+#uncontracted core
+CORE_EDGE_FACTOR = 1.0
+
+
+def _witness_search(adj, source, excluded, targets, maxCost, maxHops=None, settleLimit=WITNESS_SETTLE_LIMIT):
+    #Dijkstra from source over the uncontracted graph without excluded, looking for a witness to every target: a path
+    #of at most the cost of source-excluded-target. Cut off at maxCost, maxHops edges and settleLimit settled vertices,
+    #returns the targets left without a witness
+    via = adj[excluded]
+    sourceCost = via[source]
+    unwitnessed = set(targets)
+    dist = {source: 0}
+    frontier = [(0, 0, source)]
+    settled = 0
+    while len(frontier) > 0 and settled < settleLimit and len(unwitnessed) > 0:
+        d, hops, u = heapq.heappop(frontier)
+        if d > dist[u]:
+            continue
+        settled += 1
+        adjU = adj[u]
+        if d + 1 >= maxCost or (maxHops is not None and hops + 1 >= maxHops):
+            #whatever u reaches is never expanded, so only the targets still without a witness can matter
+            for w in adjU.keys() & unwitnessed:
+                if d + adjU[w] <= sourceCost + via[w]:
+                    unwitnessed.discard(w)
+            continue
+        if len(frontier) == 0 and (d + 2 >= maxCost or (maxHops is not None and hops + 2 >= maxHops)):
+            #u is the last vertex to expand and none of its neighbours is expanded: settle the nearest ones straight
+            #away instead of queueing every neighbour, the rest can only be witnesses themselves
+            for w in adjU.keys() & unwitnessed:
+                if d + adjU[w] <= sourceCost + via[w]:
+                    unwitnessed.discard(w)
+            for w, c in sorted(adjU.items(), key=itemgetter(1)):
+                if settled >= settleLimit or len(unwitnessed) == 0:
+                    break
+                if w == excluded:
+                    continue
+                settled += 1
+                adjW = adj[w]
+                for x in adjW.keys() & unwitnessed:
+                    if d + c + adjW[x] <= sourceCost + via[x]:
+                        unwitnessed.discard(x)
+            break
+        for w, c in adjU.items():
+            if w == excluded:
+                continue
+            nd = d + c
+            if nd < dist.get(w, maxCost + 1):
+                dist[w] = nd
+                if w in unwitnessed and nd <= sourceCost + via[w]:
+                    unwitnessed.discard(w)
+                #edges cost at least 1, nothing beyond a vertex at maxCost can still be a witness
+                if nd < maxCost:
+                    heapq.heappush(frontier, (nd, hops + 1, w))
+    return unwitnessed
+
+
+def _needed_shortcuts(adj, v, maxHops=None, settleLimit=WITNESS_SETTLE_LIMIT):
+    #shortcuts (u, w, cost) that contracting v requires: u-v-w with no witness path of at most the same cost; with
+    #maxHops, only witnesses of at most that many edges are looked for, which can only add shortcuts
+    via = adj[v]
+    neighbours = list(via)
+    #largest cost from v to any neighbour after the i-th, which bounds the witness searches from the i-th
+    laterCost = list(accumulate(reversed(list(via.values())), max))[::-1]
+    shortcuts = []
+    for i, u in enumerate(neighbours[:-1]):
+        unwitnessed = _witness_search(adj, u, v, neighbours[i + 1:], via[u] + laterCost[i + 1], maxHops, settleLimit)
+        shortcuts.extend((u, w, via[u] + via[w]) for w in unwitnessed)
+    return shortcuts
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy of an undirected unit-cost graph, for answering many point-to-point shortest-path queries
+    after a single preprocessing pass. Vertices are contracted one at a time in order of importance: twice the edge
+    difference, plus the number of contracted neighbours and the depth in the hierarchy, kept up to date lazily.
+    Contracting v adds a shortcut u-w with the cost of u-v-w whenever no witness path of at most that cost avoids v.
+    Every edge and shortcut is then stored once, at its lower-ranked endpoint, which gives the upward graph. A query
+    runs Dijkstra upward from both ends, meets at the highest vertex of the shortest path and unpacks the shortcuts
+    back into original edges.
+
+    Graphs with little hierarchy (small-world social graphs) get large upward search spaces, and the query is then
+    not faster than bidirectional_search_csr; road-like and clustered graphs are where the index pays off.
+
+    Social graphs end in a dense core of hubs where every contraction adds a clique of shortcuts. Contraction stops
+    once the remaining graph has core_factor times as many edges as the input, i.e. by default as soon as contracting
+    no longer thins it out; the core vertices share the top rank, keep their edges in both directions and are
+    searched like a plain bidirectional Dijkstra by the query.
+
+    The queue is seeded with the edge difference of contracting a vertex without any shortcut, which needs no witness
+    search. A popped vertex is re-prioritised with witness searches bounded to ESTIMATE_HOP_LIMIT edges and
+    ESTIMATE_SETTLE_LIMIT vertices, and only the vertex actually contracted gets the full ones. A 4039-vertex,
+    88k-edge power-law graph builds in seconds; save the index with save and reload it with load (or use
+    load_contraction_hierarchy, which keeps it next to the graph cache) to skip even that.
+
+    Attributes
+    --------------
+
+        states: sorted array of the original states, as in CSRGraph
+        rank: contraction order of every vertex (0 was contracted first), the core vertices all have the largest rank
+        up_indptr, up_indices: CSR upward graph, the higher-ranked (or core) neighbours of vertex v are
+                               up_indices[up_indptr[v]:up_indptr[v+1]], sorted
+        up_weights: cost of every upward edge
+        up_middle: vertex an upward edge is a shortcut over, -1 for an original edge
+    """
+
+    ARRAYS = ('states', 'rank', 'up_indptr', 'up_indices', 'up_weights', 'up_middle')
+
+    def __init__(self, states, rank, up_indptr, up_indices, up_weights, up_middle):
+        self.states = states
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+        self._upward = None
+
+    @classmethod
+    def from_graph(cls, graph, core_factor=CORE_EDGE_FACTOR):
+        """
+        :param graph: CSRGraph of an undirected graph
+        :param core_factor: growth of the edge count at which contraction stops, None to contract every vertex
+        :return: ContractionHierarchy
+        """
+        n = graph.num_vertices
+        adj = [{} for _ in range(n)]
+        for u in range(n):
+            for w in graph.neighbours(u).tolist():
+                if w != u:
+                    adj[u][w] = 1
+        middle = {}
+        contractedNeighbours = [0] * n
+        depth = [0] * n
+
+        def priority(v, numShortcuts):
+            return 2 * (numShortcuts - len(adj[v])) + contractedNeighbours[v] + depth[v]
+
+        #seed with the edge difference of a contraction without shortcuts, a lower bound that needs no witness search
+        queue = [(priority(v, 0), v) for v in range(n)]
+        heapq.heapify(queue)
+        rank = np.full(n, -1, dtype=np.int64)
+        upward = [None] * n
+        nextRank = 0
+        remainingEdges = sum(len(neighbours) for neighbours in adj)
+        coreEdges = None if core_factor is None else core_factor * remainingEdges
+        while len(queue) > 0:
+            if coreEdges is not None and remainingEdges > coreEdges:
+                break
+            _, v = heapq.heappop(queue)
+            if rank[v] != -1:
+                continue
+            #lazy update: contract v only if its estimated priority is still the smallest one
+            current = priority(v, len(_needed_shortcuts(adj, v, ESTIMATE_HOP_LIMIT, ESTIMATE_SETTLE_LIMIT)))
+            if len(queue) > 0 and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+
+            for u, w, cost in _needed_shortcuts(adj, v):
+                if cost < adj[u].get(w, cost + 1):
+                    if w not in adj[u]:
+                        remainingEdges += 2
+                    adj[u][w] = adj[w][u] = cost
+                    middle[(u, w)] = middle[(w, u)] = v
+            #all remaining neighbours are contracted later, so these are v's upward edges
+            upward[v] = [(w, c, middle.get((v, w), -1)) for w, c in sorted(adj[v].items())]
+            for u in adj[v]:
+                del adj[u][v]
+                contractedNeighbours[u] += 1
+                depth[u] = max(depth[u], depth[v] + 1)
+            remainingEdges -= 2 * len(adj[v])
+            adj[v] = {}
+            rank[v] = nextRank
+            nextRank += 1
+
+        #the core: edges among the remaining vertices are kept in both directions
+        for v in np.flatnonzero(rank == -1).tolist():
+            upward[v] = [(w, c, middle.get((v, w), -1)) for w, c in sorted(adj[v].items())]
+            rank[v] = nextRank
+
+        counts = np.array([len(edges) for edges in upward], dtype=np.int64)
+        upIndptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=upIndptr[1:])
+        flat = np.array([edge for edges in upward for edge in edges], dtype=np.int64).reshape(-1, 3)
+        return cls(np.asarray(graph.states), rank, upIndptr, flat[:, 0].copy(), flat[:, 1].copy(), flat[:, 2].copy())
+
+    def save(self, path, source_sha1=None):
+        """
+        Serialize the index into a single .npz file, written to a temporary file first so that an interrupted save
+        never leaves a truncated index behind.
+
+        :param source_sha1: hash of the edge list the graph was loaded from, checked by load_contraction_hierarchy
+        """
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            np.savez(f, sha1=np.array('' if source_sha1 is None else source_sha1), **arrays)
+        os.replace(tmpPath, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*[data[name] for name in cls.ARRAYS])
+
+    @staticmethod
+    def saved_sha1(path):
+        with np.load(path) as data:
+            return str(data['sha1']) or None
+
+    @property
+    def num_shortcuts(self):
+        return int((self.up_middle != -1).sum())
+
+    def index_of(self, state):
+        i = int(np.searchsorted(self.states, state))
+        if i < len(self.states) and self.states[i] == state:
+            return i
+        return -1
+
+    def _upward_lists(self):
+        #per vertex {neighbour: (weight, middle)} and the ranks as Python objects, built on the first query: a query
+        #touches few vertices, and dict access beats NumPy scalar indexing at that scale
+        if self._upward is None:
+            indices = self.up_indices.tolist()
+            edges = list(zip(self.up_weights.tolist(), self.up_middle.tolist()))
+            bounds = self.up_indptr.tolist()
+            self._upward = ([dict(zip(indices[start:end], edges[start:end]))
+                             for start, end in zip(bounds[:-1], bounds[1:])], self.rank.tolist())
+        return self._upward
+
+    def _middle(self, a, b):
+        #an edge is stored at its lower-ranked endpoint, core edges at both
+        upward, rank = self._upward_lists()
+        low, high = (a, b) if rank[a] < rank[b] else (b, a)
+        return upward[low][high][1]
+
+    def _unpack(self, path):
+        #replace every shortcut on a path of vertex indices by the two edges it stands for, until none is left
+        unpacked = [path[0]]
+        stack = [(a, b) for a, b in zip(path[::-1][1:], path[::-1][:-1])]
+        while len(stack) > 0:
+            a, b = stack.pop()
+            m = self._middle(a, b)
+            if m == -1:
+                unpacked.append(b)
+            else:
+                stack.append((m, b))
+                stack.append((a, m))
+        return unpacked
+
+    def query_indices(self, source, target):
+        """
+        :param source: vertex index
+        :param target: vertex index
+        :return: path: list of vertex indices from source to target, empty if there is no path
+                 num_nodes_expanded: number of vertices settled by both upward searches
+                 max_frontier_size: largest combined size of the two queues
+        """
+        if source == target:
+            return [source], 0, 0
+        upward = self._upward_lists()[0]
+        inf = float('inf')
+        dists = ({source: 0}, {target: 0})
+        parents = ({source: -1}, {target: -1})
+        queues = ([(0, source)], [(0, target)])
+        best = inf
+        meeting = -1
+        num_nodes_expanded = 0
+        max_frontier_size = 0
+        while True:
+            #stop once neither side can improve the best meeting point found so far
+            keys = [queue[0][0] if len(queue) > 0 else inf for queue in queues]
+            if min(keys) >= best:
+                break
+            side = 0 if keys[0] <= keys[1] else 1
+            max_frontier_size = max(max_frontier_size, len(queues[0]) + len(queues[1]))
+            d, u = heapq.heappop(queues[side])
+            dist = dists[side]
+            if d > dist[u]:
+                #stale entry
+                continue
+            num_nodes_expanded += 1
+            other = dists[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+                meeting = u
+            for w, (c, _) in upward[u].items():
+                if d + c < dist.get(w, inf):
+                    dist[w] = d + c
+                    parents[side][w] = u
+                    heapq.heappush(queues[side], (d + c, w))
+
+        if meeting == -1:
+            return [], num_nodes_expanded, max_frontier_size
+        halves = []
+        for side in (0, 1):
+            half = [meeting]
+            while parents[side][half[-1]] != -1:
+                half.append(parents[side][half[-1]])
+            halves.append(half)
+        path = halves[0][::-1] + halves[1][1:]
+        return self._unpack(path), num_nodes_expanded, max_frontier_size
+
+    def query(self, init_state, goal_state):
+        """
+        :param init_state: start state
+        :param goal_state: goal state
+        :return: path: a list of states (ints) describing the path from init_state to goal_state
+                 num_nodes_expanded: number of vertices settled by both upward searches
+                 max_frontier_size: largest combined size of the two queues
+        """
+        source = self.index_of(init_state)
+        target = self.index_of(goal_state)
+        if source == -1 or target == -1:
+            return [], 0, 0
+        path, num_nodes_expanded, max_frontier_size = self.query_indices(source, target)
+        return self.states[np.array(path, dtype=np.int64)].tolist(), num_nodes_expanded, max_frontier_size
+
+
+def load_contraction_hierarchy(path, cache_dir=None, mmap_mode='r'):
+    """
+    Load an edge list with load_graph together with its contraction hierarchy. The hierarchy is built on the first
+    call and stored as contraction_hierarchy.npz in the graph cache directory; it is rebuilt when the source file
+    changes.
+
+    :param path: path of the edge list
+    :param cache_dir: graph cache directory, defaults to path + '.csr'
+    :param mmap_mode: mode passed to np.load for the cached graph arrays
+    :return: V: array of states
+             E: (m, 2) array of edges
+             graph: CSRGraph
+             hierarchy: ContractionHierarchy
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    V, E, graph = load_graph(path, cache_dir, mmap_mode)
+    sha1 = read_cache_meta(cache_dir).get('sha1')
+    indexPath = os.path.join(cache_dir, 'contraction_hierarchy.npz')
+    if os.path.exists(indexPath) and ContractionHierarchy.saved_sha1(indexPath) == sha1:
+        hierarchy = ContractionHierarchy.load(indexPath)
+        if len(hierarchy.states) == graph.num_vertices:
+            return V, E, graph, hierarchy
+    hierarchy = ContractionHierarchy.from_graph(graph)
+    hierarchy.save(indexPath, sha1)
+    return V, E, graph, hierarchy
+
+
+def contraction_hierarchy_search(problem, hierarchy=None):
+    """
+    Shortest path of a GraphSearchProblem through a ContractionHierarchy, built from the problem's graph if not given
+    (build it once, or load a saved one, and reuse it for repeated queries).
+
+    :param problem: instance of GraphSearchProblem
+    :param hierarchy: ContractionHierarchy of the problem's graph
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of vertices settled by the query
+             max_frontier_size: maximum frontier size during the query
+    """
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy.from_graph(get_csr_graph(problem))
+    return hierarchy.query(problem.init_state, problem.goal_states[0])
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    from bidirectional_search import bidirectional_search_csr
+    # Road-like test graph: a 100x100 grid with a few random long edges; build and save the index once, then compare
+    # many queries with bidirectional BFS
+    rng = np.random.default_rng(0)
+    side = 100
+    cells = np.arange(side * side).reshape(side, side)
+    E = np.concatenate((np.stack((cells[:, :-1].ravel(), cells[:, 1:].ravel()), axis=1),
+                        np.stack((cells[:-1, :].ravel(), cells[1:, :].ravel()), axis=1),
+                        rng.integers(0, side * side, size=(20, 2))))
+    V = np.arange(side * side)
+    graph = CSRGraph.from_edges(V, E)
+    start = time.perf_counter()
+    hierarchy = ContractionHierarchy.from_graph(graph)
+    print("Contracted {:} vertices in {:.1f}s, {:} shortcuts".format(graph.num_vertices, time.perf_counter() - start,
+                                                                     hierarchy.num_shortcuts))
+    indexPath = os.path.join(tempfile.gettempdir(), 'contraction_hierarchy_demo.npz')
+    hierarchy.save(indexPath)
+    hierarchy = ContractionHierarchy.load(indexPath)
+    hierarchy.query(0, 1)
+
+    queries = rng.choice(V, size=(200, 2)).tolist()
+    for name, search in (('CH', lambda p: contraction_hierarchy_search(p, hierarchy)),
+                         ('Bidirectional BFS', lambda p: bidirectional_search_csr(p, graph))):
+        elapsed = 0.0
+        expanded = 0
+        for init_state, goal_state in queries:
+            problem = GraphSearchProblem([goal_state], init_state, V, E)
+            start = time.perf_counter()
+            path, num_nodes_expanded, max_frontier_size = search(problem)
+            elapsed += time.perf_counter() - start
+            expanded += num_nodes_expanded
+        print("{:}: {:.0f} us and {:.0f} nodes expanded per query".format(name, 1e6 * elapsed / len(queries),
+                                                                          expanded / len(queries)))
@@ -0,0 +1,213 @@
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Compressed-sparse-row adjacency of an (undirected by default) graph, built once from the V and E arrays handed to
+    GraphSearchProblem. Vertices are relabelled to dense indices 0..n-1 so that the searches can keep their bookkeeping
+    in flat NumPy arrays; self.states maps an index back to the original state.
+
+    Attributes
+    --------------
+
+        states: sorted array of the original states, states[i] is the state of vertex index i
+        indptr: array of length n+1, the neighbours of vertex i are indices[indptr[i]:indptr[i+1]]
+        indices: concatenated neighbour lists (vertex indices, not states)
+    """
+
+    def __init__(self, states, indptr, indices):
+        self.states = states
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, V, E, directed=False):
+        """
+        Build the adjacency from a vertex array V and an (m, 2) edge array E.
+
+        :param V: array of states (ints); states appearing only in E are added as well
+        :param E: (m, 2) array of edges between states
+        :param directed: if False, every edge is stored in both directions
+        :return: CSRGraph
+        """
+        E = np.asarray(E, dtype=np.int64).reshape(-1, 2)
+        states = _sorted_unique(np.concatenate((np.asarray(V, dtype=np.int64).ravel(), E.ravel())))
+        src = np.searchsorted(states, E[:, 0])
+        dst = np.searchsorted(states, E[:, 1])
+        if not directed:
+            src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+
+        #sort by (src, dst) through a single int64 key so neighbour lists are contiguous and ordered, and drop
+        #duplicate edges on the way
+        n = len(states)
+        keys = _sorted_unique(src * n + dst)
+        src = keys // n
+        dst = keys % n
+
+        indptr = np.zeros(len(states) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(states)), out=indptr[1:])
+        return cls(states, indptr, dst.astype(np.int64))
+
+    @property
+    def num_vertices(self):
+        return len(self.states)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def degree(self, i):
+        return self.indptr[i + 1] - self.indptr[i]
+
+    def neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def index_of(self, state):
+        """
+        :param state: original state
+        :return: vertex index of state, or -1 if the state is not in the graph
+        """
+        i = int(np.searchsorted(self.states, state))
+        if i < len(self.states) and self.states[i] == state:
+            return i
+        return -1
+
+    def path_to_states(self, index_path):
+        return [int(s) for s in self.states[np.asarray(index_path, dtype=np.int64)]]
+
+
+def _sorted_unique(a):
+    #np.unique without the extra bookkeeping, noticeably faster on the multi-million entry edge arrays
+    a = np.sort(a)
+    if len(a) > 1:
+        a = a[np.concatenate(([True], a[1:] != a[:-1]))]
+    return a
+
+
+class GraphQuery:
+    """
+    Bare (init_state, goal_states) pair accepted by the searches that take their adjacency from a CSRGraph, for use
+    where building a GraphSearchProblem with the whole edge array is not wanted.
+    """
+
+    def __init__(self, goal_states, init_state):
+        self.goal_states = goal_states
+        self.init_state = init_state
+
+
+def get_csr_graph(problem):
+    """
+    Return the CSR adjacency of a GraphSearchProblem, building it from problem.V and problem.E on first use and
+    keeping it on the problem so later searches on the same instance do not rebuild it.
+
+    :param problem: instance of GraphSearchProblem
+    :return: CSRGraph
+    """
+    graph = getattr(problem, '_csr_graph', None)
+    if graph is None:
+        graph = CSRGraph.from_edges(problem.V, problem.E)
+        problem._csr_graph = graph
+    return graph
+
+
+def goal_indices(graph, goal_states):
+    """
+    :param graph: CSRGraph
+    :param goal_states: list of goal states
+    :return: sorted array of the vertex indices of the goals that are in the graph
+    """
+    return _sorted_unique(np.array([graph.index_of(s) for s in goal_states] + [-1], dtype=np.int64))[1:]
+
+
+def goal_mask(graph, goal_states):
+    """
+    :return: boolean array over the vertices, True for the goals
+    """
+    isGoal = np.zeros(graph.num_vertices, dtype=bool)
+    isGoal[goal_indices(graph, goal_states)] = True
+    return isGoal
+
+
+def gather_neighbours(graph, frontier):
+    """
+    Gather the neighbours of every vertex in frontier in one vectorized step.
+
+    :param graph: CSRGraph
+    :param frontier: array of vertex indices
+    :return: neighbours: concatenated neighbour indices of the frontier vertices
+             owners: owners[k] is the frontier vertex that neighbours[k] was reached from
+    """
+    frontier = np.asarray(frontier, dtype=np.int64)
+    starts = graph.indptr[frontier]
+    counts = graph.indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    owners = np.repeat(frontier, counts)
+    #position of each gathered entry inside its own neighbour list
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    neighbours = graph.indices[np.repeat(starts, counts) + offsets]
+    return neighbours, owners
+
+
+def expand_level(graph, frontier, visited, parents):
+    """
+    One level-synchronous BFS step: expand the whole frontier at once, mark the newly reached vertices as visited and
+    record their parents. A vertex reached from several frontier vertices keeps the first one as its parent.
+
+    :param graph: CSRGraph
+    :param frontier: array of vertex indices
+    :param visited: boolean array over the vertices, updated in place
+    :param parents: integer parent array over the vertices, updated in place
+    :return: array of the newly visited vertices, the next frontier
+    """
+    neighbours, owners = gather_neighbours(graph, frontier)
+    unvisited = ~visited[neighbours]
+    nextFrontier, first = np.unique(neighbours[unvisited], return_index=True)
+    visited[nextFrontier] = True
+    parents[nextFrontier] = owners[unvisited][first]
+    return nextFrontier
+
+
+def trace_parents(parents, target):
+    """
+    Walk an integer parent array (parent of a root is -1) from target back to the root.
+
+    :return: int64 array of vertex indices from the root to target
+    """
+    path = []
+    i = target
+    while i >= 0:
+        path.append(i)
+        i = parents[i]
+    return np.array(path[::-1], dtype=np.int64)
+
+
+def trace_parents_many(parents, targets):
+    """
+    Rebuild the paths to many targets of one integer parent array at once (parent of a root is -1). All the targets
+    step to their parents together, one vectorized gather per level, so the work in Python grows with the depth of the
+    deepest target rather than with the total length of the paths.
+
+    :param parents: integer parent array over the vertices
+    :param targets: array of vertex indices
+    :return: path_indices: the paths concatenated, each from its root to its target
+             path_ptr: array of length len(targets)+1, the path to targets[j] is path_indices[path_ptr[j]:path_ptr[j+1]]
+    """
+    current = np.asarray(targets, dtype=np.int64).ravel()
+    #levels[d, j] is the ancestor of targets[j] d steps up, -1 past its root
+    levels = []
+    while (current >= 0).any():
+        levels.append(current)
+        current = np.where(current >= 0, parents[np.maximum(current, 0)], -1)
+    pathPtr = np.zeros(len(current) + 1, dtype=np.int64)
+    if len(levels) == 0:
+        return np.empty(0, dtype=np.int64), pathPtr
+    levels = np.array(levels)
+    lengths = (levels >= 0).sum(axis=0)
+    np.cumsum(lengths, out=pathPtr[1:])
+    #entry k of path j is the ancestor lengths[j]-1-k steps up, which puts the root first
+    owners = np.repeat(np.arange(len(lengths)), lengths)
+    steps = np.arange(pathPtr[-1], dtype=np.int64) - np.repeat(pathPtr[:-1], lengths)
+    return levels[lengths[owners] - 1 - steps, owners], pathPtr
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+from csr_graph import CSRGraph
+
+#arrays stored in a graph cache directory, one .npy file each so they can be memory-mapped
+CACHE_ARRAYS = ('E', 'states', 'indptr', 'indices')
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def parse_edge_list(path):
+    """
+    Parse a whitespace separated edge list (one 'u v' pair per line, SNAP style '#' comment lines allowed).
+
+    :param path: path of the text file
+    :return: (m, 2) int64 array of edges
+    """
+    #SNAP files keep their comments in a header at the top
+    with open(path, 'rb') as f:
+        hasComments = b'#' in f.read(1 << 16)
+    if not hasComments:
+        #np.fromfile parses plain whitespace separated integers far faster than np.loadtxt, but stops at a comment
+        #further down the file (older NumPy versions only warn and return the edges read so far)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DeprecationWarning)
+                return np.fromfile(path, dtype=np.int64, sep=' ').reshape(-1, 2)
+        except (ValueError, DeprecationWarning):
+            pass
+    return np.loadtxt(path, dtype=np.int64, comments='#', ndmin=2).reshape(-1, 2)
+
+
+def default_cache_dir(path):
+    return path + '.csr'
+
+
+def _source_info(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _cache_is_valid(path, cache_dir, info):
+    #cheap check on size and mtime first; if only the mtime moved (copy, touch), fall back to the content hash
+    metaPath = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(metaPath):
+        return False
+    with open(metaPath) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION or meta.get('size') != info['size']:
+        return False
+    if not all(os.path.exists(os.path.join(cache_dir, name + '.npy')) for name in CACHE_ARRAYS):
+        return False
+    if meta.get('mtime_ns') == info['mtime_ns']:
+        return True
+    if meta.get('sha1') != file_digest(path):
+        return False
+    meta['mtime_ns'] = info['mtime_ns']
+    with open(metaPath, 'w') as f:
+        json.dump(meta, f)
+    return True
+
+
+def write_graph_cache(path, cache_dir, E, graph):
+    """
+    Write the edge array and the CSR arrays of a graph next to its source file, as .npy files plus a meta.json
+    recording the size, mtime and hash of the source.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {'E': E, 'states': graph.states, 'indptr': graph.indptr, 'indices': graph.indices}
+    for name in CACHE_ARRAYS:
+        tmpPath = os.path.join(cache_dir, name + '.tmp.npy')
+        np.save(tmpPath, arrays[name])
+        os.replace(tmpPath, os.path.join(cache_dir, name + '.npy'))
+    meta = dict(_source_info(path), version=CACHE_VERSION, sha1=file_digest(path))
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def read_cache_meta(cache_dir):
+    """
+    :return: the meta.json of a graph cache (size, mtime and sha1 of the source), empty if there is none
+    """
+    metaPath = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(metaPath):
+        return {}
+    with open(metaPath) as f:
+        return json.load(f)
+
+
+def read_graph_cache(cache_dir, mmap_mode='r'):
+    """
+    Load a graph cache written by write_graph_cache, memory-mapping the arrays by default.
+
+    :return: V: array of states
+             E: (m, 2) array of edges
+             graph: CSRGraph
+    """
+    arrays = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode=mmap_mode) for name in CACHE_ARRAYS}
+    graph = CSRGraph(arrays['states'], arrays['indptr'], arrays['indices'])
+    return graph.states, arrays['E'], graph
+
+
+def load_graph(path, cache_dir=None, mmap_mode='r'):
+    """
+    Load an edge list such as stanford_large_network_facebook_combined.txt. The text is parsed only on the first call;
+    the edges and CSR arrays are then cached in binary form and later calls memory-map the cache. The cache is rebuilt
+    when the source file changes.
+
+    :param path: path of the edge list
+    :param cache_dir: where to keep the binary cache, defaults to path + '.csr'
+    :param mmap_mode: mode passed to np.load for the cached arrays (None loads them fully into memory)
+    :return: V: array of states, same as np.unique(E)
+             E: (m, 2) array of edges
+             graph: CSRGraph of the undirected graph
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    if not _cache_is_valid(path, cache_dir, _source_info(path)):
+        E = parse_edge_list(path)
+        graph = CSRGraph.from_edges(np.empty(0, dtype=np.int64), E)
+        write_graph_cache(path, cache_dir, E, graph)
+    return read_graph_cache(cache_dir, mmap_mode)
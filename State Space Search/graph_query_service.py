@@ -0,0 +1,146 @@
+from collections import OrderedDict
+import numpy as np
+from csr_graph import CSRGraph, expand_level, trace_parents, trace_parents_many
+
+
+class BFSTree:
+    """
+    Breadth-first search tree grown from one source vertex. The traversal is resumable: it only advances level by
+    level until the requested targets are reached, and a later query continues from the frontier it stopped at.
+
+    Attributes
+    --------------
+
+        source: vertex index of the root
+        parents: parent array over the vertices (-1 for the root and for unvisited vertices)
+        visited: boolean array over the vertices
+        frontier: vertices of the next level to expand (empty once the traversal is complete)
+    """
+
+    def __init__(self, graph, source):
+        self.graph = graph
+        self.source = source
+        self.parents = np.full(graph.num_vertices, -1, dtype=np.int64)
+        self.visited = np.zeros(graph.num_vertices, dtype=bool)
+        self.visited[source] = True
+        self.frontier = np.array([source], dtype=np.int64)
+
+    @property
+    def complete(self):
+        return len(self.frontier) == 0
+
+    def grow(self, targets):
+        """
+        Expand levels until every target is visited or the traversal is complete.
+
+        :param targets: array of vertex indices
+        :return: num_nodes_expanded: number of vertices expanded by this call
+                 max_frontier_size: largest frontier expanded by this call
+        """
+        num_nodes_expanded = 0
+        max_frontier_size = 0
+        while not self.complete and not self.visited[targets].all():
+            max_frontier_size = max(max_frontier_size, len(self.frontier))
+            num_nodes_expanded += len(self.frontier)
+            self.frontier = expand_level(self.graph, self.frontier, self.visited, self.parents)
+        return num_nodes_expanded, max_frontier_size
+
+    def path_to(self, target):
+        if not self.visited[target]:
+            return np.empty(0, dtype=np.int64)
+        return trace_parents(self.parents, target)
+
+    def paths_to(self, targets):
+        """
+        Rebuild the paths to a batch of targets at once, see trace_parents_many. The path to a target that is not
+        visited (or is -1) is empty.
+
+        :param targets: array of vertex indices
+        :return: path_indices, path_ptr as returned by trace_parents_many
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        reached = np.where(targets >= 0, targets, 0)
+        return trace_parents_many(self.parents, np.where((targets >= 0) & self.visited[reached], targets, -1))
+
+
+class GraphQueryService:
+    """
+    Answers many shortest-path queries against one graph that stays loaded. The BFS tree of every source queried is
+    kept in an LRU cache, so a repeated query from the same source (or towards a source whose tree is cached, since
+    the graph is undirected) is a table lookup, and a query to a target the cached tree has not reached yet resumes
+    that traversal instead of starting a new one.
+
+    :param V: array of states
+    :param E: (m, 2) array of undirected edges between states
+    :param cache_size: maximum number of BFS trees kept
+    :param graph: prebuilt CSRGraph to use instead of building one from V and E
+    """
+
+    def __init__(self, V=None, E=None, cache_size=64, graph=None):
+        if graph is None:
+            graph = CSRGraph.from_edges(V, E)
+        self.graph = graph
+        self.cache_size = cache_size
+        self.trees = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_tree(self, source):
+        tree = self.trees.get(source)
+        if tree is None:
+            self.misses += 1
+            tree = BFSTree(self.graph, source)
+            self.trees[source] = tree
+            if len(self.trees) > self.cache_size:
+                self.trees.popitem(last=False)
+        else:
+            self.hits += 1
+            self.trees.move_to_end(source)
+        return tree
+
+    def query(self, init_state, goal_state):
+        """
+        :param init_state: start state
+        :param goal_state: goal state
+        :return: path: a list of states (ints) describing the path from init_state to goal_state
+                 num_nodes_expanded: number of nodes expanded to answer this query (0 for a cached answer)
+                 max_frontier_size: maximum frontier size expanded for this query
+        """
+        initIndex = self.graph.index_of(init_state)
+        goalIndex = self.graph.index_of(goal_state)
+        if initIndex == -1 or goalIndex == -1:
+            return [], 0, 0
+
+        #a complete tree rooted at the goal answers the query backwards
+        reverseTree = self.trees.get(goalIndex)
+        if initIndex not in self.trees and reverseTree is not None and \
+                (reverseTree.visited[initIndex] or reverseTree.complete):
+            self.hits += 1
+            self.trees.move_to_end(goalIndex)
+            return self.graph.path_to_states(reverseTree.path_to(initIndex)[::-1]), 0, 0
+
+        paths, num_nodes_expanded, max_frontier_size = self.query_many(init_state, [goal_state])
+        return paths[0], num_nodes_expanded, max_frontier_size
+
+    def query_many(self, init_state, goal_states):
+        """
+        Shortest paths from one source to a batch of targets with a single traversal.
+
+        :param init_state: start state
+        :param goal_states: list of goal states
+        :return: paths: list of paths (lists of states), an empty list for an unreachable or unknown goal
+                 num_nodes_expanded: number of nodes expanded to answer this query
+                 max_frontier_size: maximum frontier size expanded for this query
+        """
+        initIndex = self.graph.index_of(init_state)
+        if initIndex == -1:
+            return [[] for _ in goal_states], 0, 0
+        goalIndices = np.array([self.graph.index_of(s) for s in goal_states], dtype=np.int64)
+
+        tree = self._get_tree(initIndex)
+        num_nodes_expanded, max_frontier_size = tree.grow(goalIndices[goalIndices != -1])
+        pathIndices, pathPtr = tree.paths_to(goalIndices)
+        pathStates = self.graph.states[pathIndices].tolist()
+        bounds = pathPtr.tolist()
+        paths = [pathStates[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        return paths, num_nodes_expanded, max_frontier_size
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def grid_arrays(problem):
+    """
+    Flat view of the occupancy matrix of a GridSearchProblem. States are the flat cell ids row*N + col used by
+    GridSearchProblem, so a state can index the returned array directly.
+
+    :param problem: instance of GridSearchProblem
+    :return: occupied: boolean array of length M*N, True where the cell is an obstacle
+             M: number of rows
+             N: number of columns
+    """
+    grid = np.asarray(problem.grid_map)
+    M, N = grid.shape
+    return grid.astype(bool).ravel(), M, N
+
+
+def heuristic_table(M, N, goal_states, kind='manhattan'):
+    """
+    Precompute the heuristic of every cell in vectorized passes. With several goals the table holds the minimum over
+    the goals, which stays admissible; the goals are folded in one at a time, so memory stays at a few arrays of M*N
+    whatever the number of goals.
+
+    :param M: number of rows
+    :param N: number of columns
+    :param goal_states: list of goal cell ids
+    :param kind: 'manhattan' (int32 table), 'euclidean' or 'octile' (float64 tables); octile is the length of the
+                 shortest 8-connected path on an empty map, with diagonal steps of length sqrt(2)
+    :return: array of length M*N
+    """
+    if kind == 'manhattan':
+        table = np.full(M * N, np.iinfo(np.int32).max, dtype=np.int32)
+    elif kind in ('euclidean', 'octile'):
+        table = np.full(M * N, np.inf)
+    else:
+        raise ValueError("Unknown heuristic '{:}'".format(kind))
+    rows, cols = np.divmod(np.arange(M * N, dtype=np.int32), np.int32(N))
+    for goal in np.unique(np.asarray(goal_states, dtype=np.int64)).tolist():
+        goalRow, goalCol = divmod(goal, N)
+        dr = np.abs(rows - np.int32(goalRow))
+        dc = np.abs(cols - np.int32(goalCol))
+        if kind == 'manhattan':
+            np.add(dr, dc, out=dr)
+            np.minimum(table, dr, out=table)
+        elif kind == 'euclidean':
+            np.minimum(table, np.hypot(dr, dc), out=table)
+        else:
+            np.minimum(table, np.maximum(dr, dc) + (np.sqrt(2.0) - 1.0) * np.minimum(dr, dc), out=table)
+    return table
+
+
+def cached_heuristic_table(problem, M, N, goal_states, kind='manhattan'):
+    """
+    heuristic_table kept on the problem, keyed by the table size, the goal tuple and the kind, so repeated searches
+    on the same problem skip the rebuild and a change of goals rebuilds it. The returned table is read-only.
+    """
+    key = (M, N, tuple(int(g) for g in np.asarray(goal_states).ravel()), kind)
+    tables = getattr(problem, '_heuristic_tables', None)
+    if tables is None or len(tables) >= 4:
+        #a few tables at most: the unpadded and padded tables of the current goals, and the kinds in use
+        tables = {}
+        problem._heuristic_tables = tables
+    table = tables.get(key)
+    if table is None:
+        table = heuristic_table(M, N, goal_states, kind)
+        table.flags.writeable = False
+        tables[key] = table
+    return table
+
+
+def padded_free_cells(occupied, M, N):
+    """
+    Free-cell mask of the map surrounded by a one cell wide wall. In the padded map the neighbours of cell i are
+    i - (N+2), i + (N+2), i - 1 and i + 1 without any bounds checks.
+
+    :param occupied: flat boolean occupancy array from grid_arrays
+    :param M: number of rows
+    :param N: number of columns
+    :return: boolean array of length (M+2)*(N+2), True where the cell is free
+    """
+    free = np.zeros((M + 2, N + 2), dtype=bool)
+    free[1:-1, 1:-1] = ~occupied.reshape(M, N)
+    return free.ravel()
+
+
+def to_padded(states, N):
+    rows, cols = np.divmod(np.asarray(states, dtype=np.int64), N)
+    return (rows + 1) * (N + 2) + cols + 1
+
+
+def from_padded(states, N):
+    rows, cols = np.divmod(np.asarray(states, dtype=np.int64), N + 2)
+    return (rows - 1) * N + cols - 1
+
@@ -0,0 +1,289 @@
+import heapq
+from collections import deque
+import numpy as np
+from search_problems import get_random_grid_problem
+from grid_map import grid_arrays, padded_free_cells, to_padded, from_padded
+
+#entrances at least this wide get a transition at each end instead of a single one in the middle
+WIDE_ENTRANCE = 6
+#keys of the start and goal in the abstract search (cells are non-negative, -1 marks a root in parent maps)
+START = -2
+GOAL = -3
+
+
+class HPAStarPlanner:
+    """
+    Hierarchical path-finding A* (HPA*) for 4-connected unit-cost GridSearchProblem maps. The map is split into square
+    clusters. Along every border between two clusters, each run of cells that is free on both sides is an entrance,
+    and one or two transition cell pairs per entrance become nodes of an abstract graph. The nodes inside a cluster are
+    joined by edges with their exact in-cluster distance, computed by one BFS per node restricted to the cluster.
+
+    A query connects the start and goal to the nodes of their clusters, searches the small abstract graph with A* and
+    refines every abstract edge into cells with a search restricted to one cluster; refined segments are cached. The
+    paths are near-optimal: they only cross cluster borders at transition cells. update_cells flips cells and rebuilds
+    only the clusters around them.
+
+    Cells are ids of the map padded with a wall (see grid_map) inside the planner, and original states outside it.
+
+    :param problem: instance of GridSearchProblem; its grid_map is updated by update_cells as well
+    :param cluster_size: side of the square clusters, in cells
+    """
+
+    def __init__(self, problem, cluster_size=16):
+        self.problem = problem
+        occupied, self.M, self.N = grid_arrays(problem)
+        self.W = self.N + 2
+        self.K = cluster_size
+        self.rows = -(-self.M // self.K)
+        self.cols = -(-self.N // self.K)
+
+        #cluster id of every free padded cell, -1 for walls and the padding
+        rows, cols = np.divmod(np.arange((self.M + 2) * self.W), self.W)
+        self.clusterArray = (((rows - 1) // self.K) * self.cols + (cols - 1) // self.K).astype(np.int32)
+        self.homeArray = self.clusterArray.copy()
+        self.clusterArray[~padded_free_cells(occupied, self.M, self.N)] = -1
+        self.clusterOf = memoryview(self.clusterArray)
+        self.offsets = (-self.W, self.W, -1, 1)
+
+        #transition pairs of every border, nodes of every cluster, abstract adjacency {cell: {cell: cost}}
+        self.borders = {}
+        self.clusterNodes = {}
+        self.edges = {}
+        self.segments = {}
+        for c in range(self.rows * self.cols):
+            for border in self._borders_of(c):
+                if border not in self.borders:
+                    self.borders[border] = self._find_transitions(*border)
+        for c in range(self.rows * self.cols):
+            self._build_cluster(c)
+
+    def _cluster_box(self, c):
+        #first and last (inclusive) padded row and column of cluster c
+        ci, cj = divmod(c, self.cols)
+        return ci * self.K + 1, min((ci + 1) * self.K, self.M), cj * self.K + 1, min((cj + 1) * self.K, self.N)
+
+    def _neighbour_clusters(self, c):
+        ci, cj = divmod(c, self.cols)
+        neighbours = []
+        if ci > 0:
+            neighbours.append(c - self.cols)
+        if ci < self.rows - 1:
+            neighbours.append(c + self.cols)
+        if cj > 0:
+            neighbours.append(c - 1)
+        if cj < self.cols - 1:
+            neighbours.append(c + 1)
+        return neighbours
+
+    def _borders_of(self, c):
+        return [(min(c, d), max(c, d)) for d in self._neighbour_clusters(c)]
+
+    def _find_transitions(self, a, b):
+        #pairs of facing cells (in a, in b) crossing the border between clusters a < b
+        r0, r1, c0, c1 = self._cluster_box(a)
+        if a // self.cols == b // self.cols:
+            #b is to the right: walk down a's last column
+            facing = [(r * self.W + c1, r * self.W + c1 + 1) for r in range(r0, r1 + 1)]
+        else:
+            #b is below: walk along a's last row
+            facing = [(r1 * self.W + c, (r1 + 1) * self.W + c) for c in range(c0, c1 + 1)]
+
+        transitions = []
+        run = []
+        for pair in facing + [None]:
+            if pair is not None and self.clusterOf[pair[0]] != -1 and self.clusterOf[pair[1]] != -1:
+                run.append(pair)
+                continue
+            if len(run) >= WIDE_ENTRANCE:
+                transitions += [run[0], run[-1]]
+            elif len(run) > 0:
+                transitions.append(run[len(run) // 2])
+            run = []
+        return transitions
+
+    def _local_bfs(self, source, cluster, targets=None):
+        #BFS from source restricted to the free cells of one cluster; stops early once every target is reached
+        parents = {source: -1}
+        queue = deque([source])
+        remaining = set(targets) - {source} if targets is not None else None
+        while len(queue) > 0 and (remaining is None or len(remaining) > 0):
+            s = queue.popleft()
+            for offset in self.offsets:
+                child = s + offset
+                if child not in parents and self.clusterOf[child] == cluster:
+                    parents[child] = s
+                    queue.append(child)
+                    if remaining is not None:
+                        remaining.discard(child)
+        return parents
+
+    @staticmethod
+    def _trace(parents, target):
+        path = [target]
+        while parents[path[-1]] != -1:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def _build_cluster(self, c):
+        #nodes of c are its ends of the transitions on its borders; intra edges carry the in-cluster distance
+        for node in self.clusterNodes.get(c, ()):
+            self.edges.pop(node, None)
+        self.segments[c] = {}
+        nodes = set()
+        inter = []
+        for border in self._borders_of(c):
+            for pair in self.borders[border]:
+                own, other = pair if self.clusterOf[pair[0]] == c else pair[::-1]
+                nodes.add(own)
+                inter.append((own, other))
+        self.clusterNodes[c] = nodes
+
+        for node in nodes:
+            self.edges[node] = {}
+        for own, other in inter:
+            self.edges[own][other] = 1
+        for node in nodes:
+            parents = self._local_bfs(node, c, nodes)
+            for target in nodes:
+                if target != node and target in parents:
+                    path = self._trace(parents, target)
+                    self.edges[node][target] = len(path) - 1
+                    self.segments[c][(node, target)] = path
+
+    def _segment(self, u, v):
+        #cells from abstract node u to v: a border crossing, or a cached in-cluster path
+        if self.homeArray[u] != self.homeArray[v]:
+            return [u, v]
+        c = self.clusterOf[u]
+        path = self.segments[c].get((u, v))
+        if path is None:
+            path = self._trace(self._local_bfs(u, c, [v]), v)
+            self.segments[c][(u, v)] = path
+        return path
+
+    def query(self, init_state=None, goal_state=None):
+        """
+        :param init_state: start state, problem.init_state by default
+        :param goal_state: goal state, problem.goal_states[0] by default
+        :return: path: a list of states (ints) describing the path from init_state to goal_state
+                 num_nodes_expanded: number of abstract nodes expanded by the coarse search
+                 max_frontier_size: maximum frontier size of the coarse search
+        """
+        if init_state is None:
+            init_state = self.problem.init_state
+        if goal_state is None:
+            goal_state = self.problem.goal_states[0]
+        num_nodes_expanded = 0
+        max_frontier_size = 0
+        start, goal = to_padded([init_state, goal_state], self.N).tolist()
+        startCluster = self.clusterOf[start]
+        goalCluster = self.clusterOf[goal]
+        if startCluster == -1 or goalCluster == -1:
+            return [], num_nodes_expanded, max_frontier_size
+        if start == goal:
+            return [int(init_state)], num_nodes_expanded, max_frontier_size
+
+        #temporary edges: start to the nodes of its cluster (and to the goal if it is in the same cluster), nodes of
+        #the goal's cluster to the goal. The start and goal get their own keys in the abstract search, so that they
+        #stay apart from the abstract nodes they may coincide with.
+        startParents = self._local_bfs(start, startCluster)
+        goalParents = self._local_bfs(goal, goalCluster)
+        startEdges = {node: self._trace(startParents, node) for node in self.clusterNodes[startCluster]
+                      if node in startParents}
+        if goal in startParents:
+            startEdges[GOAL] = self._trace(startParents, goal)
+        goalEdges = {node: self._trace(goalParents, node)[::-1] for node in self.clusterNodes[goalCluster]
+                     if node in goalParents}
+
+        goalRow, goalCol = divmod(goal, self.W)
+
+        def heuristic(cell):
+            if cell == GOAL:
+                return 0
+            row, col = divmod(start if cell == START else cell, self.W)
+            return abs(row - goalRow) + abs(col - goalCol)
+
+        gCosts = {START: 0}
+        parents = {START: -1}
+        closed = set()
+        frontier = [(heuristic(START), START)]
+        while len(frontier) > 0:
+            max_frontier_size = max(max_frontier_size, len(frontier))
+            _, cell = heapq.heappop(frontier)
+            if cell in closed:
+                continue
+            if cell == GOAL:
+                break
+            closed.add(cell)
+            num_nodes_expanded += 1
+
+            if cell == START:
+                successors = [(node, len(path) - 1) for node, path in startEdges.items()]
+            else:
+                successors = list(self.edges[cell].items())
+                if cell in goalEdges:
+                    successors.append((GOAL, len(goalEdges[cell]) - 1))
+            for child, cost in successors:
+                childCost = gCosts[cell] + cost
+                if child not in closed and childCost < gCosts.get(child, float('inf')):
+                    gCosts[child] = childCost
+                    parents[child] = cell
+                    heapq.heappush(frontier, (childCost + heuristic(child), child))
+
+        if GOAL not in parents:
+            return [], num_nodes_expanded, max_frontier_size
+
+        #refinement: expand every abstract edge into cells
+        abstractPath = self._trace(parents, GOAL)
+        cells = [start]
+        for u, v in zip(abstractPath[:-1], abstractPath[1:]):
+            if u == START:
+                segment = startEdges[v]
+            elif v == GOAL:
+                segment = goalEdges[u]
+            else:
+                segment = self._segment(u, v)
+            cells += segment[1:]
+        return from_padded(cells, self.N).tolist(), num_nodes_expanded, max_frontier_size
+
+    def update_cells(self, states, occupied):
+        """
+        Flip a batch of cells between free and occupied and rebuild the abstraction around them: the borders of the
+        clusters holding a changed cell, and the nodes and intra edges of those clusters and their neighbours.
+
+        :param states: list of cell ids (row*N + col) that changed
+        :param occupied: bool, or a list of bools with the new occupancy of each cell
+        """
+        states = np.asarray(states, dtype=np.int64).ravel()
+        occupied = np.broadcast_to(np.asarray(occupied, dtype=bool), states.shape)
+        grid = np.asarray(self.problem.grid_map)
+        rows, cols = np.divmod(states, self.N)
+        grid[rows, cols] = occupied
+
+        cells = to_padded(states, self.N)
+        self.clusterArray[cells] = np.where(occupied, -1, self.homeArray[cells])
+        changed = set(self.homeArray[cells].tolist())
+        for c in changed:
+            for border in self._borders_of(c):
+                self.borders[border] = self._find_transitions(*border)
+        rebuilt = set(changed)
+        for c in changed:
+            rebuilt.update(self._neighbour_clusters(c))
+        for c in rebuilt:
+            self._build_cluster(c)
+
+
+if __name__ == '__main__':
+    import time
+    from a_star_search import a_star_search_grid
+    problem = get_random_grid_problem(0.2, 256, 256)
+    start = time.perf_counter()
+    planner = HPAStarPlanner(problem, cluster_size=16)
+    print("Abstraction built in {:.2f}s, {:} abstract nodes".format(time.perf_counter() - start, len(planner.edges)))
+    start = time.perf_counter()
+    path, num_nodes_expanded, max_frontier_size = planner.query()
+    print("HPA*: {:} steps in {:.4f}s".format(len(path) - 1, time.perf_counter() - start))
+    start = time.perf_counter()
+    path, num_nodes_expanded, max_frontier_size = a_star_search_grid(problem)
+    print("A*:   {:} steps in {:.4f}s".format(len(path) - 1, time.perf_counter() - start))
@@ -0,0 +1,148 @@
+import heapq
+import numpy as np
+from search_problems import get_random_grid_problem
+from grid_map import grid_arrays, heuristic_table, padded_free_cells, to_padded, from_padded
+
+
+class LPAStarGridPlanner:
+    """
+    Lifelong Planning A* (LPA*) on a 4-connected unit-cost GridSearchProblem. The g and rhs values of the cells are
+    kept between calls to plan, so after update_cells flips a batch of cells between free and occupied only the
+    cells whose shortest-path distance is affected by the change are expanded again.
+
+    Cells are the flat ids of the map padded with a wall (see grid_map), g and rhs live in float64 arrays (inf for
+    unreached cells) and the priority queue is a heap with lazy deletion of outdated keys.
+
+    :param problem: instance of GridSearchProblem; its grid_map is updated by update_cells as well
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        occupied, self.M, self.N = grid_arrays(problem)
+        self.W = self.N + 2
+        size = (self.M + 2) * self.W
+        self.start, self.goal = to_padded([problem.init_state, problem.goal_states[0]], self.N).tolist()
+
+        self.freeArray = padded_free_cells(occupied, self.M, self.N)
+        self.hArray = heuristic_table(self.M + 2, self.W, [self.goal]).astype(np.float64)
+        self.gArray = np.full(size, np.inf)
+        self.rhsArray = np.full(size, np.inf)
+        self.isFree = memoryview(self.freeArray)
+        self.h = memoryview(self.hArray)
+        self.g = memoryview(self.gArray)
+        self.rhs = memoryview(self.rhsArray)
+        self.offsets = (-self.W, self.W, -1, 1)
+
+        self.queue = []
+        self.rhs[self.start] = 0.0
+        self._push(self.start)
+
+    def _key(self, s):
+        best = min(self.g[s], self.rhs[s])
+        return best + self.h[s], best
+
+    def _push(self, s):
+        k1, k2 = self._key(s)
+        heapq.heappush(self.queue, (k1, k2, s))
+
+    def _update_vertex(self, s):
+        if s != self.start:
+            best = np.inf
+            if self.isFree[s]:
+                g = self.g
+                for offset in self.offsets:
+                    p = s + offset
+                    if self.isFree[p] and g[p] + 1.0 < best:
+                        best = g[p] + 1.0
+            self.rhs[s] = best
+        if self.g[s] != self.rhs[s]:
+            self._push(s)
+
+    def _top_key(self):
+        #drop entries of consistent cells or with an outdated key, return the key of the first valid entry
+        while len(self.queue) > 0:
+            k1, k2, s = self.queue[0]
+            if self.g[s] != self.rhs[s] and (k1, k2) == self._key(s):
+                return k1, k2
+            heapq.heappop(self.queue)
+        return np.inf, np.inf
+
+    def _compute_shortest_path(self):
+        num_nodes_expanded = 0
+        max_frontier_size = 0
+        while True:
+            topKey = self._top_key()
+            if not (topKey < self._key(self.goal) or self.rhs[self.goal] != self.g[self.goal]):
+                break
+            if topKey[0] == np.inf:
+                break
+            max_frontier_size = max(max_frontier_size, len(self.queue))
+            _, _, s = heapq.heappop(self.queue)
+            num_nodes_expanded += 1
+            if self.g[s] > self.rhs[s]:
+                self.g[s] = self.rhs[s]
+            else:
+                self.g[s] = np.inf
+                self._update_vertex(s)
+            for offset in self.offsets:
+                if self.isFree[s + offset]:
+                    self._update_vertex(s + offset)
+        return num_nodes_expanded, max_frontier_size
+
+    def _extract_path(self):
+        if self.g[self.goal] == np.inf:
+            return []
+        path = [self.goal]
+        s = self.goal
+        while s != self.start:
+            #step back to the neighbour the current cell's g-value came from
+            s = min((s + offset for offset in self.offsets if self.isFree[s + offset]), key=lambda p: self.g[p])
+            path.append(s)
+        path.reverse()
+        return from_padded(path, self.N).tolist()
+
+    def plan(self):
+        """
+        Bring the search up to date with the current map and return the shortest path.
+
+        :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+                 num_nodes_expanded: number of nodes expanded by this call
+                 max_frontier_size: maximum frontier size during this call
+        """
+        num_nodes_expanded, max_frontier_size = self._compute_shortest_path()
+        return self._extract_path(), num_nodes_expanded, max_frontier_size
+
+    def update_cells(self, states, occupied):
+        """
+        Flip a batch of cells between free and occupied. Only the changed cells and their neighbours are put back on
+        the queue; the next call to plan repairs the affected part of the search.
+
+        :param states: list of cell ids (row*N + col) that changed
+        :param occupied: bool, or a list of bools with the new occupancy of each cell
+        """
+        states = np.asarray(states, dtype=np.int64).ravel()
+        occupied = np.broadcast_to(np.asarray(occupied, dtype=bool), states.shape)
+        grid = np.asarray(self.problem.grid_map)
+        rows, cols = np.divmod(states, self.N)
+        grid[rows, cols] = occupied
+
+        for s, blocked in zip(to_padded(states, self.N).tolist(), occupied.tolist()):
+            if self.isFree[s] == (not blocked):
+                continue
+            self.isFree[s] = not blocked
+            self._update_vertex(s)
+            for offset in self.offsets:
+                if self.isFree[s + offset]:
+                    self._update_vertex(s + offset)
+
+
+if __name__ == '__main__':
+    # Replan after closing a few random free cells
+    problem = get_random_grid_problem(0.2, 100, 100)
+    planner = LPAStarGridPlanner(problem)
+    path, num_nodes_expanded, max_frontier_size = planner.plan()
+    print("Initial plan: {:} steps, {:} nodes expanded".format(len(path) - 1, num_nodes_expanded))
+    blocked = [s for s in path[1:-1]][::7][:3]
+    planner.update_cells(blocked, True)
+    path, num_nodes_expanded, max_frontier_size = planner.plan()
+    print("Replanned: {:} steps, {:} nodes expanded".format(len(path) - 1, num_nodes_expanded))
@@ -0,0 +1,144 @@
+import heapq
+import numpy as np
+from search_problems import get_random_grid_problem
+from grid_map import grid_arrays, heuristic_table, padded_free_cells, to_padded, from_padded
+
+
+def _jump_horizontal(isFree, W, goalState, state, step):
+    #slide along the row until the goal, a wall, or a cell with a forced vertical neighbour
+    while True:
+        nextState = state + step
+        if not isFree[nextState]:
+            return -1
+        if nextState == goalState:
+            return nextState
+        if (isFree[nextState - W] and not isFree[state - W]) or (isFree[nextState + W] and not isFree[state + W]):
+            return nextState
+        state = nextState
+
+
+def _jump_vertical(isFree, W, goalState, state, step):
+    #slide along the column, stopping wherever a horizontal jump from the cell would find a jump point
+    while True:
+        nextState = state + step
+        if not isFree[nextState]:
+            return -1
+        if nextState == goalState:
+            return nextState
+        if _jump_horizontal(isFree, W, goalState, nextState, 1) != -1 or \
+                _jump_horizontal(isFree, W, goalState, nextState, -1) != -1:
+            return nextState
+        state = nextState
+
+
+def _successor_steps(isFree, W, state, step):
+    if step == 0:
+        #the start cell: all four directions
+        return (-W, W, -1, 1)
+    if step == W or step == -W:
+        #moving vertically: keep going, or turn into either horizontal direction
+        return (step, -1, 1)
+    #moving horizontally: keep going, plus the vertical neighbours that are forced by a wall behind them
+    steps = [step]
+    for vertical in (-W, W):
+        if isFree[state + vertical] and not isFree[state - step + vertical]:
+            steps.append(vertical)
+    return steps
+
+
+def jump_point_search(problem):
+    """
+    Jump Point Search for uniform-cost 4-connected GridSearchProblem instances. Among the many symmetric optimal
+    paths of an open grid only the canonical ones (vertical moves first, turning vertically again only when a wall
+    forces it) are followed, and straight runs are jumped over without being put on the frontier. A* then only
+    expands the jump points, with the Manhattan distance between them as edge cost.
+
+    :param problem: an instance of GridSearchProblem to solve
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of jump points expanded by the search
+             max_frontier_size: maximum frontier size during search
+    """
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+
+    if problem.init_state == problem.goal_states[0]:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    occupied, M, N = grid_arrays(problem)
+    W = N + 2
+    initState, goalState = to_padded([problem.init_state, problem.goal_states[0]], N).tolist()
+
+    hArray = heuristic_table(M + 2, W, [goalState])
+    gArray = np.full((M + 2) * W, np.iinfo(np.int32).max, dtype=np.int32)
+    parentArray = np.full((M + 2) * W, -1, dtype=np.int32)
+    closedArray = np.zeros((M + 2) * W, dtype=bool)
+    freeArray = padded_free_cells(occupied, M, N)
+    hTable = memoryview(hArray)
+    gCosts = memoryview(gArray)
+    parents = memoryview(parentArray)
+    closed = memoryview(closedArray)
+    isFree = memoryview(freeArray)
+    if not isFree[initState] or not isFree[goalState]:
+        return [], num_nodes_expanded, max_frontier_size
+    gCosts[initState] = 0
+
+    #heap entries are (f, h, state, direction the state was reached in)
+    frontier = [(hTable[initState], hTable[initState], initState, 0)]
+    while len(frontier) > 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        _, _, currState, currStep = heapq.heappop(frontier)
+        if closed[currState]:
+            continue
+        if currState == goalState:
+            return _expand_jumps(parentArray, goalState, W, N), num_nodes_expanded, max_frontier_size
+
+        closed[currState] = True
+        num_nodes_expanded += 1
+
+        for step in _successor_steps(isFree, W, currState, currStep):
+            if step == W or step == -W:
+                jumpState = _jump_vertical(isFree, W, goalState, currState, step)
+            else:
+                jumpState = _jump_horizontal(isFree, W, goalState, currState, step)
+            if jumpState == -1 or closed[jumpState]:
+                continue
+
+            #jump points share a row or a column with their parent
+            distance = abs(jumpState - currState)
+            if distance >= W:
+                distance //= W
+            childCost = gCosts[currState] + distance
+            if childCost < gCosts[jumpState]:
+                gCosts[jumpState] = childCost
+                parents[jumpState] = currState
+                h = hTable[jumpState]
+                heapq.heappush(frontier, (childCost + h, h, jumpState, step))
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+def _expand_jumps(parents, goalState, W, N):
+    #fill in the straight runs between consecutive jump points and map back to unpadded states
+    path = [goalState]
+    state = goalState
+    while parents[state] != -1:
+        parent = int(parents[state])
+        step = (1 if parent > state else -1) * (W if abs(parent - state) >= W else 1)
+        while state != parent:
+            state += step
+            path.append(state)
+    path.reverse()
+    return from_padded(path, N).tolist()
+
+
+if __name__ == '__main__':
+    # Compare nodes expanded against plain A* on a random instance
+    from a_star_search import a_star_search
+    p_occ = 0.25
+    M = 100
+    N = 100
+    problem = get_random_grid_problem(p_occ, M, N)
+    path, num_nodes_expanded, max_frontier_size = jump_point_search(problem)
+    correct = problem.check_solution(path)
+    print("Solution is correct: {:}".format(correct))
+    print("JPS expanded {:} nodes, A* expanded {:}".format(num_nodes_expanded, a_star_search(problem)[1]))
@@ -0,0 +1,256 @@
+import heapq
+import json
+import os
+import numpy as np
+from search_problems import GraphSearchProblem
+from csr_graph import get_csr_graph, gather_neighbours, trace_parents
+from graph_loader import load_graph, default_cache_dir, read_cache_meta
+
+#files of a landmark table inside a graph cache directory
+LANDMARK_ARRAYS = ('landmarks', 'landmark_distances')
+
+
+def bfs_distances(graph, source):
+    """
+    Hop distances from one vertex to every vertex of a CSRGraph, computed level by level.
+
+    :param graph: CSRGraph
+    :param source: vertex index
+    :return: int32 array over the vertices, -1 for vertices not reachable from source
+    """
+    distances = np.full(graph.num_vertices, -1, dtype=np.int32)
+    distances[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    level = 0
+    while len(frontier) > 0:
+        level += 1
+        neighbours, _ = gather_neighbours(graph, frontier)
+        frontier = np.unique(neighbours[distances[neighbours] < 0])
+        distances[frontier] = level
+    return distances
+
+
+class LandmarkTable:
+    """
+    ALT (A*, landmarks, triangle inequality) preprocessing of an undirected unit-cost graph. For every landmark L the
+    hop distance d(L, v) to all vertices is stored, and since d(v, t) >= |d(L, v) - d(L, t)| for every landmark, the
+    largest of these differences is an admissible and consistent heuristic for A*. The distances are kept as an
+    (n, k) int32 array so the k values of one vertex are contiguous.
+
+    Attributes
+    --------------
+
+        graph: CSRGraph the table was built on
+        landmarks: array of the k landmark vertex indices
+        distances: (n, k) int32 array, distances[v, j] is the hop distance between landmarks[j] and v (-1 if there is
+                   no path)
+    """
+
+    def __init__(self, graph, landmarks, distances):
+        self.graph = graph
+        self.landmarks = landmarks
+        self.distances = distances
+
+    @classmethod
+    def from_graph(cls, graph, k=16):
+        """
+        Pick k landmarks by farthest-point selection, which spreads them towards the periphery of the graph where the
+        triangle-inequality bounds are tightest: the first landmark is the vertex farthest from the highest-degree
+        vertex, every next one the vertex whose distance to its closest landmark is largest. Vertices outside the
+        component of the highest-degree vertex are never chosen, queries there get a zero heuristic.
+
+        :param graph: CSRGraph
+        :param k: number of landmarks
+        :return: LandmarkTable
+        """
+        degrees = np.diff(graph.indptr)
+        distances = bfs_distances(graph, int(np.argmax(degrees)))
+        closest = np.where(distances >= 0, np.iinfo(np.int32).max, -1).astype(np.int64)
+        rows = []
+        landmarks = []
+        while len(landmarks) < min(k, graph.num_vertices):
+            #the first pass measures from the highest-degree vertex, later ones from the landmarks themselves
+            scores = distances if len(landmarks) == 0 else closest
+            landmark = int(np.argmax(scores))
+            if scores[landmark] <= 0:
+                #every reachable vertex is a landmark already
+                break
+            landmarks.append(landmark)
+            distances = bfs_distances(graph, landmark)
+            rows.append(distances)
+            closest = np.minimum(closest, np.where(distances >= 0, distances, -1))
+        table = np.ascontiguousarray(np.array(rows, dtype=np.int32).reshape(len(rows), graph.num_vertices).T)
+        return cls(graph, np.array(landmarks, dtype=np.int64), table)
+
+    @property
+    def num_landmarks(self):
+        return len(self.landmarks)
+
+    def lower_bounds(self, vertices, target):
+        """
+        Triangle-inequality lower bounds on the hop distance from several vertices to one target.
+
+        :param vertices: array of vertex indices
+        :param target: vertex index
+        :return: float64 array, inf where a landmark proves that the vertex cannot reach the target
+        """
+        fromVertices = self.distances[np.asarray(vertices, dtype=np.int64)]
+        toTarget = self.distances[target]
+        bounds = np.abs(fromVertices - toTarget).astype(np.float64)
+        #a landmark reaching only one of the two puts them in different components; reaching neither tells nothing
+        bounds[(fromVertices < 0) != (toTarget < 0)] = np.inf
+        bounds[(fromVertices < 0) & (toTarget < 0)] = 0.0
+        if bounds.shape[1] == 0:
+            return np.zeros(len(fromVertices))
+        return bounds.max(axis=1)
+
+    def heuristic_for(self, goal_state):
+        """
+        :param goal_state: original state of the goal
+        :return: function state -> lower bound on the hop distance to goal_state, for use as problem.heuristic
+        """
+        graph = self.graph
+        target = graph.index_of(goal_state)
+
+        def heuristic(state):
+            i = graph.index_of(state)
+            if i == -1 or target == -1:
+                return 0
+            return float(self.lower_bounds([i], target)[0])
+        return heuristic
+
+    def save(self, cache_dir, source_sha1=None, k=None):
+        """
+        Write the table next to a graph cache, as .npy files plus landmarks.json recording the source hash so that a
+        rebuilt graph cache invalidates it.
+
+        :param k: number of landmarks asked for, recorded in place of num_landmarks (a graph can end up with fewer)
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = {'landmarks': self.landmarks, 'landmark_distances': self.distances}
+        for name in LANDMARK_ARRAYS:
+            tmpPath = os.path.join(cache_dir, name + '.tmp.npy')
+            np.save(tmpPath, arrays[name])
+            os.replace(tmpPath, os.path.join(cache_dir, name + '.npy'))
+        meta = {'k': self.num_landmarks if k is None else k, 'num_vertices': self.graph.num_vertices,
+                'sha1': source_sha1}
+        with open(os.path.join(cache_dir, 'landmarks.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, graph, cache_dir, mmap_mode='r'):
+        arrays = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in LANDMARK_ARRAYS}
+        return cls(graph, arrays['landmarks'], arrays['landmark_distances'])
+
+
+def load_landmark_table(path, k=16, cache_dir=None, mmap_mode='r'):
+    """
+    Load an edge list with load_graph together with its landmark table. The table is built on the first call and
+    stored in the graph cache directory; later calls memory-map it. It is rebuilt when the source file changes or a
+    different k is asked for.
+
+    :param path: path of the edge list
+    :param k: number of landmarks
+    :param cache_dir: graph cache directory, defaults to path + '.csr'
+    :param mmap_mode: mode passed to np.load for the cached arrays (None loads them fully into memory)
+    :return: V: array of states
+             E: (m, 2) array of edges
+             graph: CSRGraph
+             table: LandmarkTable
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    V, E, graph = load_graph(path, cache_dir, mmap_mode)
+    sha1 = read_cache_meta(cache_dir).get('sha1')
+    metaPath = os.path.join(cache_dir, 'landmarks.json')
+    meta = {}
+    if os.path.exists(metaPath):
+        with open(metaPath) as f:
+            meta = json.load(f)
+    if meta.get('sha1') == sha1 and meta.get('num_vertices') == graph.num_vertices and meta.get('k') == k:
+        return V, E, graph, LandmarkTable.load(graph, cache_dir, mmap_mode)
+    table = LandmarkTable.from_graph(graph, k)
+    table.save(cache_dir, sha1, k)
+    return V, E, graph, table
+
+
+def a_star_search_landmarks(problem, table=None, graph=None, k=16):
+    """
+    A* over the CSR adjacency of a GraphSearchProblem, guided by the ALT heuristic of a LandmarkTable. The heuristic
+    of all the children of a vertex is computed in one vectorized step, and g-costs, parents and the closed set live
+    in flat arrays. Vertices that a landmark proves cannot reach the goal are never pushed.
+
+    :param problem: instance of GraphSearchProblem
+    :param table: LandmarkTable of the graph, built with k landmarks if not given (build it once and reuse it for
+                  repeated queries)
+    :param graph: CSRGraph of the problem, defaults to table.graph or one built from problem.V and problem.E
+    :return: path: a list of states (ints) describing the path from problem.init_state to problem.goal_state[0]
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    if graph is None:
+        graph = table.graph if table is not None else get_csr_graph(problem)
+    if table is None:
+        table = LandmarkTable.from_graph(graph, k)
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+
+    initIndex = graph.index_of(problem.init_state)
+    goalIndex = graph.index_of(problem.goal_states[0])
+    if initIndex == -1 or goalIndex == -1:
+        return [], num_nodes_expanded, max_frontier_size
+    if initIndex == goalIndex:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    indptr = graph.indptr
+    indices = graph.indices
+    gCosts = np.full(graph.num_vertices, np.iinfo(np.int64).max, dtype=np.int64)
+    parents = np.full(graph.num_vertices, -1, dtype=np.int64)
+    closed = np.zeros(graph.num_vertices, dtype=bool)
+    gCosts[initIndex] = 0
+
+    h = float(table.lower_bounds([initIndex], goalIndex)[0])
+    if h == np.inf:
+        return [], num_nodes_expanded, max_frontier_size
+    #heap entries are (f, h, vertex): ties on f go to the vertex closer to the goal
+    frontier = [(h, h, initIndex)]
+    while len(frontier) > 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        _, _, currIndex = heapq.heappop(frontier)
+        if currIndex == goalIndex:
+            path = graph.path_to_states(trace_parents(parents, goalIndex))
+            return path, num_nodes_expanded, max_frontier_size
+        if closed[currIndex]:
+            #stale entry of an already closed vertex
+            continue
+        closed[currIndex] = True
+        num_nodes_expanded += 1
+
+        childCost = gCosts[currIndex] + 1
+        children = indices[indptr[currIndex]:indptr[currIndex + 1]]
+        children = children[~closed[children] & (childCost < gCosts[children])]
+        if len(children) == 0:
+            continue
+        hScores = table.lower_bounds(children, goalIndex)
+        reachable = hScores != np.inf
+        children = children[reachable]
+        gCosts[children] = childCost
+        parents[children] = currIndex
+        for childIndex, h in zip(children.tolist(), hScores[reachable].tolist()):
+            heapq.heappush(frontier, (childCost + h, h, childIndex))
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+if __name__ == '__main__':
+    # Compare with uninformed search on the Facebook graph, building the landmark table once
+    from breadth_first_search import breadth_first_search_csr
+    V, E, graph, table = load_landmark_table('stanford_large_network_facebook_combined.txt', k=16)
+    rng = np.random.default_rng(0)
+    for init_state, goal_state in rng.choice(V, size=(5, 2)).tolist():
+        problem = GraphSearchProblem([goal_state], init_state, V, E)
+        path, num_nodes_expanded, max_frontier_size = a_star_search_landmarks(problem, table)
+        bfsPath, bfsExpanded, _ = breadth_first_search_csr(problem, graph)
+        print("{:} -> {:}: {:} steps, ALT expanded {:} nodes, BFS {:}".format(init_state, goal_state, len(path) - 1,
+                                                                            num_nodes_expanded, bfsExpanded))
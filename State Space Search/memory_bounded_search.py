@@ -0,0 +1,261 @@
+import heapq
+from itertools import count
+from search_problems import Node, get_random_grid_problem
+from a_star_search import goal_set_heuristic
+
+
+def ida_star_search(problem, max_nodes=None):
+    """
+    Iterative-deepening A*. Depth-first searches bounded by an f-cost threshold, raised after every iteration to the
+    smallest f-cost that exceeded it. The current path is stored (plus the pending actions of its states), and each
+    iteration keeps the best g-cost it has reached every state with: a child that does not improve on it is pruned, so
+    an iteration expands a state only a few times instead of once per simple path. The threshold is only raised by
+    cut-off paths that no cheaper path to the same state replaced, so a problem with no path ends once the reachable
+    region has been covered instead of going through every simple path of it.
+
+    :param problem: any problem with get_actions, get_child_node and an admissible heuristic
+    :param max_nodes: hard cap on the nodes stored on the path, and on the states kept in each of the g-cost and
+                      cut-off tables; deeper paths are cut off, which may lose the solution, and states beyond the cap
+                      are only pruned when already on the path. Without a cap the tables grow with the explored space,
+                      like A*
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by the search, over all iterations
+             max_frontier_size: maximum number of nodes stored at once
+    """
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+    initState = problem.init_state
+    goalStates = set(problem.goal_states)
+    heuristic = goal_set_heuristic(problem)
+    initNode = Node(None, initState, None, 0)
+    if initState in goalStates:
+        return [initState], num_nodes_expanded, max_frontier_size
+
+    threshold = heuristic(initState)
+    while threshold != float('inf'):
+        nextThreshold = float('inf')
+        #stack of (node, remaining actions), one entry per state on the current path
+        stack = [(initNode, iter(problem.get_actions(initState)))]
+        pathStates = {initState}
+        #best g-cost of every state reached in this iteration, and (g, f) of the cheapest path to every state cut off
+        #by the threshold
+        bestCosts = {initState: 0}
+        cutoffs = {}
+        num_nodes_expanded += 1
+        while len(stack) > 0:
+            max_frontier_size = max(max_frontier_size, len(stack))
+            node, actions = stack[-1]
+            a = next(actions, None)
+            if a is None:
+                stack.pop()
+                pathStates.discard(node.state)
+                continue
+
+            childNode = problem.get_child_node(node, a)
+            if childNode.state in pathStates or childNode.path_cost >= bestCosts.get(childNode.state, float('inf')):
+                continue
+            f = childNode.path_cost + heuristic(childNode.state)
+            if f > threshold:
+                known = cutoffs.get(childNode.state)
+                if known is not None and known[0] <= childNode.path_cost:
+                    continue
+                if known is None and max_nodes is not None and len(cutoffs) >= max_nodes:
+                    nextThreshold = min(nextThreshold, f)
+                else:
+                    cutoffs[childNode.state] = (childNode.path_cost, f)
+                continue
+            if childNode.state in goalStates:
+                path = [entry[0].state for entry in stack] + [childNode.state]
+                return path, num_nodes_expanded, max_frontier_size
+            if max_nodes is not None and len(stack) >= max_nodes:
+                continue
+
+            if max_nodes is None or len(bestCosts) < max_nodes or childNode.state in bestCosts:
+                bestCosts[childNode.state] = childNode.path_cost
+            stack.append((childNode, iter(problem.get_actions(childNode.state))))
+            pathStates.add(childNode.state)
+            num_nodes_expanded += 1
+
+        #a cut-off state that was later expanded with a lower or equal g-cost leads nowhere new, only the others raise
+        #the threshold. With no path at all, this ends the search once the reachable region fits under the threshold
+        for state, (g, f) in cutoffs.items():
+            if g < bestCosts.get(state, float('inf')):
+                nextThreshold = min(nextThreshold, f)
+        threshold = nextThreshold
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+class _SMANode:
+    __slots__ = ('state', 'parent', 'g', 'f', 'depth', 'children', 'forgotten', 'pendingF', 'alive')
+
+    def __init__(self, state, parent, g, f, depth):
+        self.state = state
+        self.parent = parent
+        self.g = g
+        self.f = f
+        self.depth = depth
+        self.children = []
+        #f-cost of every child dropped from memory, by state
+        self.forgotten = {}
+        #lowest f-cost among the successors not in memory, inf once they all are
+        self.pendingF = f
+        self.alive = True
+
+
+def sma_star_search(problem, max_nodes):
+    """
+    Simplified memory-bounded A* (SMA*). Like A*, the most promising node (lowest f-cost, deepest on ties) is chosen,
+    but it generates one successor at a time. Once max_nodes nodes are stored, the worst leaf (highest f-cost,
+    shallowest) is dropped to make room and its parent remembers the dropped f-cost, so that subtree is regenerated
+    only when nothing better is left. f-costs are backed up from the children, and a successor is skipped while a node
+    of the same state with a lower or equal g-cost is in memory. The path is optimal whenever max_nodes leaves room for
+    it, otherwise the best path that fits is returned, or no path. As with IDA*, proving that there is no path at all
+    under a tight budget may take exponentially many regenerations.
+
+    :param problem: any problem with get_actions, get_child_node and an admissible heuristic
+    :param max_nodes: hard cap on the number of nodes stored in the search tree
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes generated by the search
+             max_frontier_size: maximum number of nodes stored at once
+    """
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+    initState = problem.init_state
+    goalStates = set(problem.goal_states)
+    heuristic = goal_set_heuristic(problem)
+    if initState in goalStates:
+        return [initState], num_nodes_expanded, max_frontier_size
+
+    root = _SMANode(initState, None, 0, heuristic(initState), 0)
+    storedNodes = 1
+    tieBreaker = count()
+    #nodes with successors left to generate keyed by (next f-cost, -depth): deepest of the cheapest first;
+    #candidate leaves to drop keyed by (-f, depth); both with lazy deletion of outdated entries
+    openHeap = []
+    leafHeap = []
+    #node with the lowest g-cost for every state in memory
+    bestNodes = {initState: root}
+
+    def add_open(node):
+        if node.pendingF != float('inf'):
+            heapq.heappush(openHeap, (node.pendingF, -node.depth, next(tieBreaker), node))
+
+    def add_leaf(node):
+        heapq.heappush(leafHeap, (-node.f, node.depth, next(tieBreaker), node))
+
+    def backup(node):
+        #f-cost of a node: lowest f-cost of its children in memory and of the successors still to generate
+        while node is not None:
+            best = min([child.f for child in node.children] + [node.pendingF])
+            if best == node.f:
+                break
+            node.f = best
+            if len(node.children) == 0:
+                add_leaf(node)
+            node = node.parent
+
+    def pending_successors(node):
+        #(f, child) of the successors not in memory and not covered by a cheaper node of the same state
+        present = {child.state for child in node.children}
+        parentNode = Node(None, node.state, None, node.g)
+        successors = []
+        for a in problem.get_actions(node.state):
+            childNode = problem.get_child_node(parentNode, a)
+            if childNode.state in present:
+                continue
+            known = bestNodes.get(childNode.state)
+            if known is not None and known.g <= childNode.path_cost:
+                continue
+            if childNode.state in node.forgotten:
+                f = node.forgotten[childNode.state]
+            elif childNode.state not in goalStates and node.depth + 1 >= max_nodes - 1:
+                #no room to ever extend this node further
+                f = float('inf')
+            else:
+                f = max(node.f, childNode.path_cost + heuristic(childNode.state))
+            successors.append((f, childNode))
+        return successors
+
+    def drop_worst_leaf(keep):
+        skipped = None
+        dropped = False
+        while len(leafHeap) > 0:
+            negF, depth, _, leaf = heapq.heappop(leafHeap)
+            if not leaf.alive or len(leaf.children) > 0 or -negF != leaf.f or leaf is root:
+                continue
+            if leaf is keep:
+                #the node just generated stays, its entry is pushed back once another leaf has been dropped
+                skipped = (negF, depth, _, leaf)
+                continue
+            leaf.alive = False
+            if bestNodes.get(leaf.state) is leaf:
+                del bestNodes[leaf.state]
+            parent = leaf.parent
+            parent.children.remove(leaf)
+            parent.forgotten[leaf.state] = leaf.f
+            if leaf.f < parent.pendingF:
+                parent.pendingF = leaf.f
+                add_open(parent)
+            if len(parent.children) == 0:
+                add_leaf(parent)
+            dropped = True
+            break
+        if skipped is not None:
+            heapq.heappush(leafHeap, skipped)
+        return dropped
+
+    add_open(root)
+    add_leaf(root)
+    while len(openHeap) > 0:
+        key, negDepth, _, node = heapq.heappop(openHeap)
+        if not node.alive or key != node.pendingF:
+            continue
+        if node.state in goalStates:
+            path = []
+            while node is not None:
+                path.append(node.state)
+                node = node.parent
+            return path[::-1], num_nodes_expanded, max_frontier_size
+
+        successors = pending_successors(node)
+        if len(successors) == 0:
+            node.pendingF = float('inf')
+            backup(node)
+            continue
+        successors.sort(key=lambda entry: entry[0])
+        childF, childNode = successors[0]
+        num_nodes_expanded += 1
+        child = _SMANode(childNode.state, node, childNode.path_cost, childF, node.depth + 1)
+        node.children.append(child)
+        node.forgotten.pop(child.state, None)
+        bestNodes[child.state] = child
+        storedNodes += 1
+        add_open(child)
+        add_leaf(child)
+        node.pendingF = successors[1][0] if len(successors) > 1 else float('inf')
+        add_open(node)
+        backup(node)
+
+        while storedNodes > max_nodes and drop_worst_leaf(child):
+            storedNodes -= 1
+        max_frontier_size = max(max_frontier_size, storedNodes)
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+if __name__ == '__main__':
+    problem = get_random_grid_problem(0.2, 12, 12)
+    path, num_nodes_expanded, max_frontier_size = ida_star_search(problem)
+    if len(path) == 0:
+        print("IDA*: no path, {:} expansions".format(num_nodes_expanded))
+    else:
+        print("IDA*: {:} steps, {:} expansions".format(len(path) - 1, num_nodes_expanded))
+    path, num_nodes_expanded, max_frontier_size = sma_star_search(problem, 200)
+    if len(path) == 0:
+        print("SMA*: no path, {:} expansions, at most {:} nodes stored".format(num_nodes_expanded, max_frontier_size))
+    else:
+        print("SMA*: {:} steps, {:} expansions, at most {:} nodes stored".format(len(path) - 1, num_nodes_expanded,
+                                                                                  max_frontier_size))
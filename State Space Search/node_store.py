@@ -0,0 +1,76 @@
+from array import array
+
+
+class NodeView:
+    """
+    Thin stand-in for search_problems.Node backed by a row of a NodeStore. It exposes the same parent, state, action
+    and path_cost attributes, so it can be passed to problem.get_child_node. The action is the position of the action
+    in problem.get_actions(parent state), -1 for a root. The searches keep one view per store and move it with load
+    instead of allocating a view per popped node, so a Node from get_child_node only sees its parent until the next pop.
+    """
+    __slots__ = ('store', 'index', 'state', 'action', 'path_cost')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.load(index)
+
+    def load(self, index):
+        """
+        Point the view at row index of its store.
+        """
+        store = self.store
+        self.index = index
+        self.state = store.states[index]
+        self.action = store.actions[index]
+        self.path_cost = store.costs[index]
+        return self
+
+    @property
+    def parent(self):
+        parentIndex = self.store.parents[self.index]
+        return None if parentIndex == -1 else NodeView(self.store, parentIndex)
+
+
+class NodeStore:
+    """
+    Search tree kept in parallel typed arrays instead of one Node object per generated child. Row i holds the index
+    of the parent row (-1 for a root), the state, the position of the action in the parent's action list and the path
+    cost, about 32 bytes per node and nothing for the garbage collector to track.
+    """
+
+    def __init__(self):
+        self.parents = array('q')
+        self.states = array('q')
+        self.actions = array('q')
+        self.costs = array('d')
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, parent, state, action, path_cost):
+        """
+        :param parent: row of the parent node, -1 for a root
+        :param state: state (int)
+        :param action: position of the action in the parent's action list, -1 for a root
+        :param path_cost: cost of the path from the root
+        :return: row of the new node
+        """
+        self.parents.append(parent)
+        self.states.append(state)
+        self.actions.append(action)
+        self.costs.append(path_cost)
+        return len(self.states) - 1
+
+    def view(self, index):
+        return NodeView(self, index)
+
+    def trace_path(self, index):
+        """
+        :return: list of states from the root to the node in row index
+        """
+        path = []
+        while index != -1:
+            path.append(self.states[index])
+            index = self.parents[index]
+        path.reverse()
+        return path
@@ -0,0 +1,291 @@
+import json
+import os
+import tempfile
+import numpy as np
+from bitset import Bitset
+from csr_graph import CSRGraph, gather_neighbours, goal_indices, trace_parents
+
+#default number of neighbour entries gathered at once, bounds the RAM used by one expansion batch
+MAX_BATCH_EDGES = 1 << 22
+
+
+def iter_edge_chunks(path, chunk_bytes=1 << 26):
+    """
+    Stream the edges of a file in (k, 2) int64 chunks without loading the whole file. Works on a .npy edge array
+    (read through a memory map) or on a whitespace separated text edge list ('#' comment lines allowed).
+    """
+    if path.endswith('.npy'):
+        E = np.load(path, mmap_mode='r')
+        step = max(1, chunk_bytes // (2 * E.itemsize))
+        for start in range(0, len(E), step):
+            yield np.asarray(E[start:start + step], dtype=np.int64)
+        return
+
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            data = rest + block
+            if block:
+                #only parse whole lines, keep the partial last line for the next block
+                cut = data.rfind(b'\n') + 1
+                data, rest = data[:cut], data[cut:]
+            lines = [line for line in data.splitlines() if line.strip() and not line.lstrip().startswith(b'#')]
+            if lines:
+                yield np.array(b' '.join(lines).split(), dtype=np.int64).reshape(-1, 2)
+            if not block:
+                return
+
+
+def build_graph_files(edge_path, out_dir, directed=False, chunk_bytes=1 << 26):
+    """
+    Build CSR adjacency files for an edge list that does not fit in memory. The edges are streamed twice: once to
+    count the degrees, once to scatter every edge into its slot of the on-disk indices array. States must be
+    non-negative integers; vertex i is state i, so no relabelling table is needed. Only the degree counts and
+    write cursors (two int64 per vertex) are held in RAM.
+
+    :param edge_path: text edge list or .npy (m, 2) edge array
+    :param out_dir: directory receiving indptr.npy, indices.npy and meta.json
+    :param directed: if False, every edge is stored in both directions
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    degrees = np.zeros(0, dtype=np.int64)
+    for chunk in iter_edge_chunks(edge_path, chunk_bytes):
+        top = int(chunk.max(initial=-1)) + 1
+        if top > len(degrees):
+            degrees = np.concatenate((degrees, np.zeros(top - len(degrees), dtype=np.int64)))
+        src = chunk[:, 0] if directed else chunk.ravel()
+        degrees += np.bincount(src, minlength=len(degrees))
+
+    indptr = np.lib.format.open_memmap(os.path.join(out_dir, 'indptr.npy'), mode='w+', dtype=np.int64,
+                                       shape=(len(degrees) + 1,))
+    indptr[0] = 0
+    np.cumsum(degrees, out=indptr[1:])
+    numEdges = int(indptr[-1])
+    del degrees
+    indices = np.lib.format.open_memmap(os.path.join(out_dir, 'indices.npy'), mode='w+', dtype=np.int64,
+                                        shape=(numEdges,))
+
+    cursor = np.array(indptr[:-1])
+    for chunk in iter_edge_chunks(edge_path, chunk_bytes):
+        if directed:
+            src, dst = chunk[:, 0], chunk[:, 1]
+        else:
+            src = np.concatenate((chunk[:, 0], chunk[:, 1]))
+            dst = np.concatenate((chunk[:, 1], chunk[:, 0]))
+        order = np.argsort(src, kind='stable')
+        src = src[order]
+        dst = dst[order]
+        #rank of each edge among the edges of the same source in this chunk
+        groupStart = np.searchsorted(src, src, side='left')
+        rank = np.arange(len(src), dtype=np.int64) - groupStart
+        indices[cursor[src] + rank] = dst
+        cursor += np.bincount(src, minlength=len(cursor))
+
+    indptr.flush()
+    indices.flush()
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'num_vertices': len(cursor), 'num_edges': numEdges, 'directed': directed}, f)
+
+
+class IdentityStates:
+    """
+    Stand-in for the states array of a graph whose vertex i is state i: indexing returns the indices themselves, so
+    nothing of 8 bytes per vertex is allocated.
+    """
+
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return np.arange(*i.indices(self.n), dtype=np.int64)
+        indices = np.asarray(i, dtype=np.int64)
+        if indices.size > 0 and (indices.min() < 0 or indices.max() >= self.n):
+            raise IndexError('vertex index out of range')
+        return indices.copy() if indices.ndim > 0 else int(indices)
+
+
+class IdentityCSRGraph(CSRGraph):
+    """
+    CSRGraph whose states are the vertex indices 0..n-1, as written by build_graph_files. The mapping between states
+    and indices is the identity and is never materialized.
+    """
+
+    def __init__(self, indptr, indices):
+        super().__init__(IdentityStates(len(indptr) - 1), indptr, indices)
+
+    def index_of(self, state):
+        return int(state) if 0 <= state < self.num_vertices else -1
+
+
+def open_graph_files(out_dir):
+    """
+    Memory-map CSR files written by build_graph_files.
+
+    :return: IdentityCSRGraph whose indptr and indices are read from disk on demand
+    """
+    indptr = np.load(os.path.join(out_dir, 'indptr.npy'), mmap_mode='r')
+    indices = np.load(os.path.join(out_dir, 'indices.npy'), mmap_mode='r')
+    return IdentityCSRGraph(indptr, indices)
+
+
+class _SearchSide:
+    """
+    Out-of-core state of one BFS from one or more roots: a visited bitset in RAM, the parents in a memory-mapped
+    scratch file, and the frontier of the current level spilled to a scratch file.
+    """
+
+    def __init__(self, graph, roots, work_dir, name):
+        roots = np.asarray(roots, dtype=np.int64)
+        self.visited = Bitset(graph.num_vertices)
+        self.visited.set_many(roots)
+        self.parents = np.memmap(os.path.join(work_dir, name + '_parents.bin'), mode='w+', dtype=np.int64,
+                                 shape=(graph.num_vertices,))
+        self.parents[roots] = -1
+        self.frontierPath = os.path.join(work_dir, name + '_frontier.bin')
+        self.nextPath = os.path.join(work_dir, name + '_next.bin')
+        roots.tofile(self.frontierPath)
+        self.frontierSize = len(roots)
+
+    def frontier_batches(self, graph, max_batch_edges):
+        #read the frontier back in slices whose neighbour lists hold about max_batch_edges entries
+        if self.frontierSize == 0:
+            return
+        frontier = np.memmap(self.frontierPath, mode='r', dtype=np.int64, shape=(self.frontierSize,))
+        start = 0
+        while start < self.frontierSize:
+            block = np.array(frontier[start:start + max_batch_edges])
+            edges = np.cumsum(graph.indptr[block + 1] - graph.indptr[block])
+            stop = max(1, int(np.searchsorted(edges, max_batch_edges, side='right')))
+            yield block[:stop]
+            start += stop
+        del frontier
+
+    def expand_level(self, graph, max_batch_edges, otherVisited=None):
+        """
+        Expand the whole current frontier batch by batch, writing the next frontier to disk.
+
+        :return: a vertex visited by both sides (or -1), and the number of expanded vertices
+        """
+        expanded = 0
+        nextSize = 0
+        meeting = -1
+        #closing the generator early (on a meeting) releases its memory map of the frontier file before it is replaced
+        batches = self.frontier_batches(graph, max_batch_edges)
+        try:
+            with open(self.nextPath, 'wb') as nextFile:
+                for batch in batches:
+                    expanded += len(batch)
+                    neighbours, owners = gather_neighbours(graph, batch)
+                    unvisited = ~self.visited.test_many(neighbours)
+                    newStates, first = np.unique(neighbours[unvisited], return_index=True)
+                    self.visited.set_many(newStates)
+                    self.parents[newStates] = owners[unvisited][first]
+                    newStates.tofile(nextFile)
+                    nextSize += len(newStates)
+                    if otherVisited is not None and len(newStates) > 0:
+                        shared = newStates[otherVisited.test_many(newStates)]
+                        if len(shared) > 0:
+                            meeting = int(shared[0])
+                            break
+        finally:
+            batches.close()
+        os.replace(self.nextPath, self.frontierPath)
+        self.frontierSize = nextSize
+        return meeting, expanded
+
+    def close(self):
+        #drop the memory map of the parents file before its directory is removed, Windows cannot delete a file that
+        #is still mapped
+        self.parents = None
+
+
+def breadth_first_search_out_of_core(problem, graph, work_dir=None, max_batch_edges=MAX_BATCH_EDGES):
+    """
+    Level-synchronous BFS over a memory-mapped CSR graph (see open_graph_files). Only the visited bitset and one
+    batch of neighbours are held in RAM; parents and frontiers live in scratch files under work_dir.
+
+    :param problem: any object with init_state and goal_states, the edges do not need to be loaded
+    :param graph: CSRGraph, typically from open_graph_files
+    :param work_dir: directory for scratch files, a temporary directory by default
+    :param max_batch_edges: number of neighbour entries gathered per batch
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    if problem.init_state in problem.goal_states:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+    initIndex = graph.index_of(problem.init_state)
+    goalIndices = goal_indices(graph, problem.goal_states)
+    if initIndex == -1 or len(goalIndices) == 0:
+        return [], num_nodes_expanded, max_frontier_size
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        side = _SearchSide(graph, [initIndex], scratch, 'init')
+        try:
+            while side.frontierSize > 0:
+                max_frontier_size = max(max_frontier_size, side.frontierSize)
+                _, expanded = side.expand_level(graph, max_batch_edges)
+                num_nodes_expanded += expanded
+                #every goal reached in this level is at the same, smallest depth
+                reached = goalIndices[side.visited.test_many(goalIndices)]
+                if len(reached) > 0:
+                    path = graph.path_to_states(trace_parents(side.parents, reached[0]))
+                    return path, num_nodes_expanded, max_frontier_size
+        finally:
+            side.close()
+    return [], num_nodes_expanded, max_frontier_size
+
+
+def bidirectional_search_out_of_core(problem, graph, work_dir=None, max_batch_edges=MAX_BATCH_EDGES):
+    """
+    Bidirectional BFS over a memory-mapped CSR graph of an undirected graph, expanding one full level of the smaller
+    side at a time; the goal side starts from all of problem.goal_states. Each side keeps a visited bitset in RAM, so
+    the intersection test is a bit lookup; parents and frontiers live in scratch files under work_dir.
+
+    :param problem: any object with init_state and goal_states, the edges do not need to be loaded
+    :param graph: CSRGraph, typically from open_graph_files
+    :param work_dir: directory for scratch files, a temporary directory by default
+    :param max_batch_edges: number of neighbour entries gathered per batch
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    max_frontier_size = 0
+    num_nodes_expanded = 0
+    if problem.init_state in problem.goal_states:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+    initIndex = graph.index_of(problem.init_state)
+    goalIndices = goal_indices(graph, problem.goal_states)
+    if initIndex == -1 or len(goalIndices) == 0:
+        return [], num_nodes_expanded, max_frontier_size
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+        initSide = _SearchSide(graph, [initIndex], scratch, 'init')
+        goalSide = _SearchSide(graph, goalIndices, scratch, 'goal')
+        try:
+            while initSide.frontierSize > 0 and goalSide.frontierSize > 0:
+                max_frontier_size = max(max_frontier_size, initSide.frontierSize, goalSide.frontierSize)
+                if initSide.frontierSize <= goalSide.frontierSize:
+                    meeting, expanded = initSide.expand_level(graph, max_batch_edges, goalSide.visited)
+                else:
+                    meeting, expanded = goalSide.expand_level(graph, max_batch_edges, initSide.visited)
+                num_nodes_expanded += expanded
+                if meeting != -1:
+                    pathFromInit = trace_parents(initSide.parents, meeting)
+                    pathToGoal = trace_parents(goalSide.parents, meeting)[::-1]
+                    path = graph.path_to_states(np.concatenate((pathFromInit, pathToGoal[1:])))
+                    return path, num_nodes_expanded, max_frontier_size
+        finally:
+            initSide.close()
+            goalSide.close()
+    return [], num_nodes_expanded, max_frontier_size
@@ -0,0 +1,76 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from csr_graph import CSRGraph, GraphQuery
+from breadth_first_search import breadth_first_search_level_sync
+
+#arrays of a CSRGraph placed in shared memory
+SHARED_ARRAYS = ('states', 'indptr', 'indices')
+
+#set in every worker by _attach_graph
+_worker_graph = None
+_worker_blocks = []
+
+
+class SharedCSRGraph:
+    """
+    Copy of a CSRGraph in multiprocessing.shared_memory blocks. Workers attach to the blocks by name, so the graph is
+    stored once for the whole pool instead of being pickled into every process. Use as a context manager, or call
+    close() to release the blocks.
+    """
+
+    def __init__(self, graph):
+        self.blocks = {}
+        self.specs = {}
+        for name in SHARED_ARRAYS:
+            array = np.ascontiguousarray(getattr(graph, name))
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks[name] = block
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach_graph(specs):
+    global _worker_graph
+    arrays = {}
+    for name, (blockName, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=blockName)
+        _worker_blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _worker_graph = CSRGraph(arrays['states'], arrays['indptr'], arrays['indices'])
+
+
+def _run_query(args):
+    i, init_state, goal_state, search = args
+    return i, search(GraphQuery([goal_state], init_state), _worker_graph)
+
+
+def parallel_breadth_first_search(graph, queries, processes=None, search=breadth_first_search_level_sync):
+    """
+    Run independent searches over one graph on a process pool. The graph is shared with the workers through
+    shared memory and results are yielded as soon as each search finishes, not in query order.
+
+    :param graph: CSRGraph
+    :param queries: iterable of (init_state, goal_state) pairs
+    :param processes: number of worker processes, os.cpu_count() by default
+    :param search: module-level search function taking (problem, graph), e.g. breadth_first_search_level_sync or
+                   bidirectional_search_direction_optimizing
+    :return: generator of (query index, (path, num_nodes_expanded, max_frontier_size))
+    """
+    tasks = ((i, init_state, goal_state, search) for i, (init_state, goal_state) in enumerate(queries))
+    with SharedCSRGraph(graph) as shared:
+        with multiprocessing.Pool(processes, initializer=_attach_graph, initargs=(shared.specs,)) as pool:
+            for result in pool.imap_unordered(_run_query, tasks):
+                yield result
@@ -0,0 +1,123 @@
+import argparse
+import csv
+import multiprocessing
+import time
+import numpy as np
+from search_problems import get_random_grid_problem
+from breadth_first_search import breadth_first_search
+from a_star_search import a_star_search, a_star_search_grid
+from jump_point_search import jump_point_search
+
+#searches the benchmark can run, looked up by name so that tasks stay picklable
+SEARCHES = {'bfs': breadth_first_search,
+            'a_star': a_star_search,
+            'a_star_grid': a_star_search_grid,
+            'jps': jump_point_search}
+
+
+def run_instance(task):
+    """
+    Solve one seeded random grid instance.
+
+    :param task: (search name, p_occ, M, N, seed)
+    :return: dict record of the run
+    """
+    searchName, p_occ, M, N, seed = task
+    #get_random_grid_problem draws from the global NumPy generator, seeding it makes the instance reproducible
+    np.random.seed(seed)
+    problem = get_random_grid_problem(p_occ, M, N)
+    start = time.perf_counter()
+    path, num_nodes_expanded, max_frontier_size = SEARCHES[searchName](problem)
+    runtime = time.perf_counter() - start
+    return {'search': searchName, 'p_occ': p_occ, 'M': M, 'N': N, 'seed': seed, 'solved': int(len(path) > 0),
+            'nodes_expanded': num_nodes_expanded, 'max_frontier_size': max_frontier_size, 'runtime': runtime}
+
+
+def run_benchmark(p_occs, sizes, num_instances, searches=('bfs', 'a_star'), processes=None, base_seed=0):
+    """
+    Sweep the occupancy probability and grid size, solving num_instances seeded instances per setting with every
+    search. Instance k of a setting uses seed base_seed + k, so all searches see the same grids.
+
+    :param p_occs: occupancy probabilities to sweep
+    :param sizes: list of (M, N) grid sizes
+    :param num_instances: number of random instances per (p_occ, size)
+    :param searches: names from SEARCHES
+    :param processes: number of worker processes, os.cpu_count() by default
+    :return: list of records from run_instance
+    """
+    tasks = [(searchName, float(p_occ), M, N, base_seed + k)
+             for searchName in searches for (M, N) in sizes for p_occ in p_occs for k in range(num_instances)]
+    with multiprocessing.Pool(processes) as pool:
+        return list(pool.imap_unordered(run_instance, tasks, chunksize=max(1, len(tasks) // 256)))
+
+
+def summarize(records):
+    """
+    Average the records of every (search, M, N, p_occ) setting.
+
+    :return: list of rows sorted by search, size and p_occ, with the solved fraction and mean nodes expanded, frontier
+             peak and runtime
+    """
+    groups = {}
+    for record in records:
+        key = (record['search'], record['M'], record['N'], record['p_occ'])
+        groups.setdefault(key, []).append(record)
+    rows = []
+    for (searchName, M, N, p_occ), group in sorted(groups.items()):
+        rows.append({'search': searchName, 'M': M, 'N': N, 'p_occ': p_occ, 'instances': len(group),
+                     'solved_fraction': float(np.mean([r['solved'] for r in group])),
+                     'mean_nodes_expanded': float(np.mean([r['nodes_expanded'] for r in group])),
+                     'mean_max_frontier_size': float(np.mean([r['max_frontier_size'] for r in group])),
+                     'mean_runtime': float(np.mean([r['runtime'] for r in group]))})
+    return rows
+
+
+def phase_transition(rows, search='a_star', M=None, N=None, high=0.9, low=0.1):
+    """
+    Locate the phase transition on a summarized curve: it starts at the first p_occ where the solved fraction falls
+    below high, ends at the first p_occ where it falls below low, and the peak is the p_occ with the most nodes
+    expanded on average.
+
+    :return: tuple containing (transition_start_probability, transition_end_probability, peak_probability), in the
+             format of a_star_search.search_phase_transition (None where the curve never crosses a threshold)
+    """
+    curve = [row for row in rows if row['search'] == search and (M is None or row['M'] == M)
+             and (N is None or row['N'] == N)]
+    curve.sort(key=lambda row: row['p_occ'])
+    start = next((row['p_occ'] for row in curve if row['solved_fraction'] < high), None)
+    end = next((row['p_occ'] for row in curve if row['solved_fraction'] < low), None)
+    peak = max(curve, key=lambda row: row['mean_nodes_expanded'])['p_occ'] if curve else None
+    return start, end, peak
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Phase-transition benchmark on random grid problems')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50], help='square grid sizes')
+    parser.add_argument('--p-min', type=float, default=0.05)
+    parser.add_argument('--p-max', type=float, default=0.8)
+    parser.add_argument('--p-step', type=float, default=0.05)
+    parser.add_argument('--instances', type=int, default=100, help='random instances per setting')
+    parser.add_argument('--searches', nargs='+', default=['bfs', 'a_star'], choices=sorted(SEARCHES))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='phase_transition.csv')
+    args = parser.parse_args()
+
+    p_occs = np.round(np.arange(args.p_min, args.p_max + 1e-9, args.p_step), 4)
+    sizes = [(size, size) for size in args.sizes]
+    records = run_benchmark(p_occs, sizes, args.instances, args.searches, args.processes, args.seed)
+    rows = summarize(records)
+    write_csv(rows, args.output)
+
+    for searchName in args.searches:
+        for M, N in sizes:
+            start, end, peak = phase_transition(rows, searchName, M, N)
+            print("{:} {:}x{:}: transition {:} -> {:}, peak nodes expanded at p_occ = {:}".format(
+                searchName, M, N, start, end, peak))
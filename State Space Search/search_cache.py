@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from search_problems import get_random_grid_problem
+
+#bumped when the entry format or the fingerprint changes, so old entries are never read back
+RESULT_CACHE_VERSION = 1
+
+
+def problem_fingerprint(problem):
+    """
+    Hash identifying a search problem instance: the occupancy grid of a GridSearchProblem (and the cost raster and
+    move set of a WeightedGridSearchProblem) or the V and E arrays of a GraphSearchProblem, plus the initial state
+    and the goal states in order. Instances with the same fingerprint give the same search results.
+
+    :param problem: instance of GridSearchProblem or GraphSearchProblem
+    :return: sha1 hex digest
+    """
+    sha = hashlib.sha1()
+    if hasattr(problem, 'grid_map'):
+        grid = np.asarray(problem.grid_map).astype(bool)
+        sha.update(b'grid')
+        sha.update(np.array(grid.shape, dtype=np.int64).tobytes())
+        sha.update(np.packbits(grid).tobytes())
+        costMap = getattr(problem, 'cost_map', None)
+        if costMap is not None:
+            sha.update(b'costs')
+            sha.update(np.ascontiguousarray(costMap, dtype=np.float64).tobytes())
+            sha.update(b'diagonal' if getattr(problem, 'diagonal', False) else b'orthogonal')
+    else:
+        V = np.ascontiguousarray(problem.V, dtype=np.int64).ravel()
+        E = np.ascontiguousarray(problem.E, dtype=np.int64).ravel()
+        sha.update(b'graph')
+        sha.update(np.array([len(V), len(E)], dtype=np.int64).tobytes())
+        sha.update(V.tobytes())
+        sha.update(E.tobytes())
+    sha.update(np.array([problem.init_state] + list(problem.goal_states), dtype=np.int64).tobytes())
+    return sha.hexdigest()
+
+
+def search_name(search):
+    """
+    Stable name of a module-level search function or method: its module and qualified name. Lambdas, partials and
+    functions defined inside another function have no name that tells them apart, they need an explicit one.
+
+    :raises ValueError: if search has no such name
+    """
+    qualname = getattr(search, '__qualname__', None)
+    if qualname is None or '<lambda>' in qualname or '<locals>' in qualname:
+        raise ValueError('{!r} has no stable name, pass name= to the cache'.format(search))
+    return '{:}.{:}'.format(search.__module__, qualname)
+
+
+def _hash_code(sha, code):
+    #bytecode, names and constants of a code object and of the functions nested in it (the repr of a nested code
+    #object holds its address, so they are hashed recursively instead)
+    sha.update(code.co_code)
+    sha.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _hash_code(sha, const)
+        else:
+            sha.update(repr(const).encode())
+
+
+def code_version(search):
+    """
+    Hash of the code of a search function (of the wrapped function for a partial), so that editing the function
+    invalidates its cached results. Changes to the helpers it calls are not seen, bump the version argument of the
+    cache for those.
+
+    :return: sha1 hex digest, empty for callables without Python code
+    """
+    func = getattr(search, 'func', search)
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return ''
+    sha = hashlib.sha1()
+    _hash_code(sha, code)
+    return sha.hexdigest()
+
+
+class SearchResultCache:
+    """
+    Persistent cache of (path, num_nodes_expanded, max_frontier_size) results, keyed by the fingerprint of the problem
+    and the name, code hash and version of the search, so repeated runs of the same instances skip the search. Every
+    entry is a small JSON file in cache_dir, written through a temporary file. When the entries exceed max_bytes the
+    least recently used ones are removed; a hit refreshes the mtime of its file, which is the recency used for
+    eviction. Several processes may share the directory.
+
+    Attributes
+    --------------
+
+        cache_dir: directory of the entries
+        max_bytes: size budget of the entries
+        hits, misses, evictions: counters since the cache object was created
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=64 << 20):
+        """
+        :param cache_dir: directory of the entries, search_cache under the temporary directory by default so that no
+                          cache is left in the working directory
+        :param max_bytes: size budget of the entries
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), 'search_cache')
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        #(mtime, path, size) of every entry file
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                #removed by another process in the meantime
+                continue
+            entries.append((stat.st_mtime_ns, path, stat.st_size))
+        return entries
+
+    def key(self, search, problem, name=None, version=None):
+        """
+        :param search: search function
+        :param problem: search problem
+        :param name: name of the search, defaults to its module and qualified name; required for lambdas, partials and
+                     locally defined functions
+        :param version: optional version string of the search, change it when code the search calls is edited
+        :return: hex key of the entry
+        :raises ValueError: if name is needed but missing
+        """
+        name = search_name(search) if name is None else name
+        raw = '{:}:{:}:{:}:{:}:{:}'.format(RESULT_CACHE_VERSION, name, code_version(search),
+                                          '' if version is None else version, problem_fingerprint(problem))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        """
+        :return: the cached (path, num_nodes_expanded, max_frontier_size), or None
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            #missing, evicted by another process, or unreadable
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['path'], entry['num_nodes_expanded'], entry['max_frontier_size']
+
+    def put(self, key, result):
+        path, num_nodes_expanded, max_frontier_size = result
+        entry = {'path': [int(s) for s in path], 'num_nodes_expanded': int(num_nodes_expanded),
+                 'max_frontier_size': int(max_frontier_size)}
+        data = json.dumps(entry, separators=(',', ':'))
+        entryPath = self._path(key)
+        tmpPath = entryPath + '.tmp'
+        with open(tmpPath, 'w') as f:
+            f.write(data)
+        #an overwritten entry no longer counts
+        try:
+            oldSize = os.path.getsize(entryPath)
+        except FileNotFoundError:
+            oldSize = 0
+        os.replace(tmpPath, entryPath)
+        self.total_bytes += len(data) - oldSize
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        #rescan: other processes may have added or removed entries
+        entries = sorted(self._entries())
+        self.total_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def run(self, search, problem, name=None, version=None):
+        """
+        Return the cached result of search on problem, or run the search and store its result.
+
+        :param search: search function taking the problem
+        :param problem: search problem
+        :param name: name of the search, see key
+        :param version: version of the search, see key
+        :return: (path, num_nodes_expanded, max_frontier_size)
+        """
+        key = self.key(search, problem, name, version)
+        result = self.get(key)
+        if result is None:
+            result = search(problem)
+            self.put(key, result)
+        return result
+
+    def wrap(self, search, name=None, version=None):
+        """
+        :return: function problem -> result of search, going through the cache
+        :raises ValueError: if search needs an explicit name and none is given
+        """
+        if name is None:
+            #fail here rather than at the first call
+            name = search_name(search)
+
+        def cached(problem):
+            return self.run(search, problem, name, version)
+        cached.__name__ = getattr(search, '__name__', 'search')
+        return cached
+
+    def clear(self):
+        for _, path, _ in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.total_bytes = 0
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries()),
+                'bytes': self.total_bytes}
+
+
+if __name__ == '__main__':
+    import time
+    from a_star_search import a_star_search
+    # The second pass over the same instances is answered from disk
+    cache = SearchResultCache(os.path.join(tempfile.gettempdir(), 'search_cache_demo'))
+    cache.clear()
+    np.random.seed(0)
+    problems = [get_random_grid_problem(0.2, 200, 200) for _ in range(5)]
+    for attempt in range(2):
+        start = time.perf_counter()
+        for problem in problems:
+            path, num_nodes_expanded, max_frontier_size = cache.run(a_star_search, problem)
+        print("Pass {:}: {:.3f}s, {:}".format(attempt + 1, time.perf_counter() - start, cache.stats()))
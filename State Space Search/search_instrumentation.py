@@ -0,0 +1,111 @@
+from collections import Counter
+from time import perf_counter
+
+#the searches poll their should_stop callback once every this many expansions, before counting the next one. Once it
+#returns True the search gives up and returns an empty path, which looks the same as "no path": a caller that needs to
+#tell them apart should check its own flag, or raise an exception from should_stop instead, which propagates
+STOP_CHECK_INTERVAL = 64
+
+
+class SearchInstrumentation:
+    """
+    Optional profiling hooks shared by breadth_first_search, bidirectional_search and a_star_search. A search given
+    an instance wraps its problem with wrap_problem and its queue operations with timed; without one the searches run
+    their plain code, so disabled instrumentation costs nothing.
+
+    Attributes
+    --------------
+
+        expanded: number of states whose successors were generated (calls to get_actions)
+        generated: number of child nodes generated (calls to get_child_node)
+        goal_tests: number of goal tests
+        frontier_histogram: Counter of frontier sizes in power-of-two buckets, key b counts sizes in [b, 2b)
+        times: wall time in seconds spent in 'successors', 'heuristic' and 'queue' operations
+    """
+
+    def __init__(self, on_expand=None, on_generate=None, on_goal_test=None):
+        """
+        :param on_expand: called as on_expand(state) for every expanded state
+        :param on_generate: called as on_generate(child_node) for every generated child
+        :param on_goal_test: called as on_goal_test(state, is_goal) for every goal test
+        """
+        self.on_expand = on_expand
+        self.on_generate = on_generate
+        self.on_goal_test = on_goal_test
+        self.expanded = 0
+        self.generated = 0
+        self.goal_tests = 0
+        self.frontier_histogram = Counter()
+        self.times = {'successors': 0.0, 'heuristic': 0.0, 'queue': 0.0}
+
+    def wrap_problem(self, problem):
+        return InstrumentedProblem(problem, self)
+
+    def timed(self, key, function):
+        """
+        :return: function wrapped so that its wall time is added to self.times[key]
+        """
+        times = self.times
+
+        def wrapper(*args):
+            start = perf_counter()
+            result = function(*args)
+            times[key] += perf_counter() - start
+            return result
+        return wrapper
+
+    def goal_test(self, state, is_goal):
+        self.goal_tests += 1
+        if self.on_goal_test is not None:
+            self.on_goal_test(state, is_goal)
+
+    def frontier(self, size):
+        self.frontier_histogram[1 << (size.bit_length() - 1) if size > 0 else 0] += 1
+
+    def summary(self):
+        return {'expanded': self.expanded,
+                'generated': self.generated,
+                'goal_tests': self.goal_tests,
+                'frontier_histogram': dict(sorted(self.frontier_histogram.items())),
+                'times': dict(self.times)}
+
+
+class InstrumentedProblem:
+    """
+    Proxy around a search problem that counts and times get_actions, get_child_node and heuristic, and fires the
+    expand/generate callbacks. Every other attribute is forwarded to the wrapped problem.
+    """
+
+    def __init__(self, problem, instrumentation):
+        self.problem = problem
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def get_actions(self, state):
+        inst = self.instrumentation
+        start = perf_counter()
+        actions = self.problem.get_actions(state)
+        inst.times['successors'] += perf_counter() - start
+        inst.expanded += 1
+        if inst.on_expand is not None:
+            inst.on_expand(state)
+        return actions
+
+    def get_child_node(self, parent, action):
+        inst = self.instrumentation
+        start = perf_counter()
+        child = self.problem.get_child_node(parent, action)
+        inst.times['successors'] += perf_counter() - start
+        inst.generated += 1
+        if inst.on_generate is not None:
+            inst.on_generate(child)
+        return child
+
+    def heuristic(self, state):
+        inst = self.instrumentation
+        start = perf_counter()
+        h = self.problem.heuristic(state)
+        inst.times['heuristic'] += perf_counter() - start
+        return h
@@ -0,0 +1,843 @@
+# test_search.py: State space search
+#
+# --
+# Artificial Intelligence
+# ROB 311
+# Programming Project 1
+#
+# Every search is run on seeded random instances; its path must pass check_solution / check_graph_solution and be as
+# short as the plain breadth-first search.
+
+import asyncio
+import heapq
+import concurrent.futures
+import functools
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from search_problems import GraphSearchProblem, GridSearchProblem, get_random_grid_problem
+from csr_graph import CSRGraph, get_csr_graph, trace_parents, trace_parents_many
+from breadth_first_search import breadth_first_search, breadth_first_search_csr, breadth_first_search_level_sync
+from bidirectional_search import bidirectional_search, bidirectional_search_csr, \
+    bidirectional_search_direction_optimizing
+from a_star_search import a_star_search, a_star_search_grid, goal_set_heuristic
+from jump_point_search import jump_point_search
+from graph_query_service import GraphQueryService, BFSTree
+from graph_loader import load_graph, parse_edge_list
+from out_of_core_search import build_graph_files, open_graph_files, breadth_first_search_out_of_core, \
+    bidirectional_search_out_of_core
+from parallel_search import parallel_breadth_first_search
+from node_store import NodeStore
+from search_instrumentation import SearchInstrumentation, STOP_CHECK_INTERVAL
+from phase_transition_benchmark import run_benchmark, summarize, phase_transition
+from anytime_search import iter_anytime_a_star, anytime_a_star_search
+from incremental_search import LPAStarGridPlanner
+from memory_bounded_search import ida_star_search, sma_star_search
+from landmark_search import LandmarkTable, a_star_search_landmarks, bfs_distances, load_landmark_table
+from async_search import run_search, async_a_star_search, async_breadth_first_search
+from weighted_grid_search import a_star_search_weighted, get_random_weighted_grid_problem
+from hierarchical_search import HPAStarPlanner
+from contraction_hierarchy import ContractionHierarchy, contraction_hierarchy_search
+from bitset import Bitset, VisitedSet
+from search_cache import SearchResultCache, search_name
+
+NUM_TRIALS = 30
+
+
+def random_graphs(num_trials=NUM_TRIALS, num_goals=1):
+    #sparse random graphs, some of them disconnected, with a random start and goals
+    for seed in range(num_trials):
+        np.random.seed(seed)
+        n = np.random.randint(2, 80)
+        V = np.arange(n)
+        E = np.random.randint(0, n, size=(np.random.randint(0, 3 * n), 2))
+        init_state = int(np.random.randint(0, n))
+        goal_states = np.random.randint(0, n, num_goals).tolist()
+        yield GraphSearchProblem(goal_states, init_state, V, E)
+
+
+def random_grids(num_trials=NUM_TRIALS, sizes=((10, 10), (20, 30), (1, 12), (25, 25))):
+    for seed in range(num_trials):
+        np.random.seed(seed)
+        M, N = sizes[seed % len(sizes)]
+        yield get_random_grid_problem([0.1, 0.25, 0.35][seed % 3], M, N)
+
+
+def check_graph_path(problem, path, reference):
+    if len(reference) == 0:
+        assert len(path) == 0, "found a path where BFS found none"
+    else:
+        assert problem.check_graph_solution(path), "invalid path"
+        assert len(path) == len(reference), "path of length {:} instead of {:}".format(len(path), len(reference))
+
+
+def check_grid_path(problem, path, reference, optimal=True):
+    if len(reference) == 0:
+        assert len(path) == 0, "found a path where BFS found none"
+    else:
+        assert problem.check_solution(path), "invalid path"
+        for state, nextState in zip(path[:-1], path[1:]):
+            assert nextState in problem.get_actions(state), "invalid step"
+        if optimal:
+            assert len(path) == len(reference), "path of length {:} instead of {:}".format(len(path), len(reference))
+
+
+def dijkstra_cost(problem):
+    #cost of the cheapest path of a WeightedGridSearchProblem to any of its goals, None if there is none
+    goalStates = set(problem.goal_states)
+    costs = {problem.init_state: 0.0}
+    queue = [(0.0, problem.init_state)]
+    while len(queue) > 0:
+        cost, state = heapq.heappop(queue)
+        if cost > costs[state]:
+            continue
+        if state in goalStates:
+            return cost
+        for action in problem.get_actions(state):
+            child = problem.transition(state, action)
+            childCost = cost + problem.action_cost(state, action)
+            if childCost < costs.get(child, float('inf')):
+                costs[child] = childCost
+                heapq.heappush(queue, (childCost, child))
+    return None
+
+
+def check_weighted_path(problem, path, cost):
+    if cost is None:
+        assert len(path) == 0, "found a path where Dijkstra found none"
+    else:
+        assert problem.check_solution(path), "invalid path"
+        for state, nextState in zip(path[:-1], path[1:]):
+            assert nextState in problem.get_actions(state), "invalid step"
+        assert abs(problem.path_cost(path) - cost) < 1e-6, \
+            "path of cost {:} instead of {:}".format(problem.path_cost(path), cost)
+
+
+# Check the CSR adjacency against the edge array
+def test_csr_graph():
+    for problem in random_graphs():
+        graph = get_csr_graph(problem)
+        assert get_csr_graph(problem) is graph, "CSR graph rebuilt"
+        assert np.all(np.diff(graph.states) > 0)
+        edges = {(int(a), int(b)) for a, b in problem.E} | {(int(b), int(a)) for a, b in problem.E}
+        csrEdges = set()
+        for i in range(graph.num_vertices):
+            for j in graph.neighbours(i).tolist():
+                csrEdges.add((int(graph.states[i]), int(graph.states[j])))
+        assert csrEdges == edges, "adjacency differs from the edge array"
+        assert graph.index_of(int(graph.states[-1]) + 1) == -1
+    print("CSR adjacency is correct")
+
+
+# Check the CSR breadth-first and bidirectional searches on graphs
+def test_csr_searches():
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        graph = CSRGraph.from_edges(problem.V, problem.E)
+        check_graph_path(problem, breadth_first_search_csr(problem, graph)[0], reference)
+        check_graph_path(problem, bidirectional_search_csr(problem, graph)[0], reference)
+    print("CSR searches are correct")
+
+
+# Check the level-synchronous BFS on graphs, and that it expands whole levels
+def test_level_sync_bfs():
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        path, num_nodes_expanded, max_frontier_size = breadth_first_search_level_sync(problem)
+        check_graph_path(problem, path, reference)
+        assert num_nodes_expanded >= len(path) - 1
+    #a star: the whole second level is one frontier
+    problem = GraphSearchProblem([99], 0, np.arange(100), np.array([[0, i] for i in range(1, 99)] + [[98, 99]]))
+    path, num_nodes_expanded, max_frontier_size = breadth_first_search_level_sync(problem)
+    assert path == [0, 98, 99] and max_frontier_size == 98
+    print("Level-synchronous BFS is correct")
+
+
+# Check bidirectional search and the direction-optimizing variant, top-down, bottom-up and switching between them
+def test_bidirectional_search():
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        graph = get_csr_graph(problem)
+        check_graph_path(problem, bidirectional_search(problem)[0], reference)
+        check_graph_path(problem, bidirectional_search_direction_optimizing(problem, graph)[0], reference)
+        #alpha = beta = inf expands every level bottom-up, alpha = 0 every level top-down
+        check_graph_path(problem, bidirectional_search_direction_optimizing(problem, graph, np.inf, np.inf)[0],
+                         reference)
+        check_graph_path(problem, bidirectional_search_direction_optimizing(problem, graph, 0.0)[0], reference)
+    #two dense components: searching the first for a goal in the second ends in bottom-up levels with the defaults
+    np.random.seed(0)
+    E = np.concatenate((np.random.randint(0, 500, size=(3000, 2)), np.random.randint(500, 1000, size=(3000, 2))))
+    for goal_state in (499, 999):
+        problem = GraphSearchProblem([goal_state], 0, np.arange(1000), E)
+        reference = breadth_first_search(problem)[0]
+        check_graph_path(problem, bidirectional_search_direction_optimizing(problem)[0], reference)
+        check_graph_path(problem, bidirectional_search_direction_optimizing(problem, None, np.inf, np.inf)[0],
+                         reference)
+    print("Bidirectional searches are correct")
+
+
+# Check A* on grids, solvable or not
+def test_a_star_search():
+    for problem in random_grids():
+        reference = breadth_first_search(problem)[0]
+        path, num_nodes_expanded, max_frontier_size = a_star_search(problem)
+        check_grid_path(problem, path, reference)
+        assert len(reference) == 0 or num_nodes_expanded >= len(path) - 1
+    print("A* is correct")
+
+
+# Check grid-native A* with both heuristics, also when the cached heuristic table is reused for another start
+def test_a_star_search_grid():
+    for problem in random_grids():
+        reference = breadth_first_search(problem)[0]
+        check_grid_path(problem, a_star_search_grid(problem)[0], reference)
+        check_grid_path(problem, a_star_search_grid(problem, 'euclidean')[0], reference)
+        if len(reference) > 2:
+            problem.init_state = reference[len(reference) // 2]
+            check_grid_path(problem, a_star_search_grid(problem)[0], breadth_first_search(problem)[0])
+    print("Grid A* is correct")
+
+
+# Check Jump Point Search on grids, including open maps full of symmetric paths
+def test_jump_point_search():
+    for problem in random_grids():
+        reference = breadth_first_search(problem)[0]
+        check_grid_path(problem, jump_point_search(problem)[0], reference)
+    for problem in random_grids(10, sizes=((30, 30),)):
+        problem.grid_map[:] = False
+        reference = breadth_first_search(problem)[0]
+        check_grid_path(problem, jump_point_search(problem)[0], reference)
+    print("Jump Point Search is correct")
+
+
+# Check the query service against BFS: one-to-one, one-to-many, cached and reversed queries, and LRU eviction
+def test_graph_query_service():
+    for problem in random_graphs(10):
+        service = GraphQueryService(problem.V, problem.E, cache_size=4)
+        n = len(problem.V)
+        for init_state in range(min(n, 6)):
+            goal_states = list(range(n))
+            paths = service.query_many(init_state, goal_states)[0]
+            for goal_state, path in zip(goal_states, paths):
+                query = GraphSearchProblem([goal_state], init_state, problem.V, problem.E)
+                check_graph_path(query, path, breadth_first_search(query)[0])
+                #the same tree answers again without expanding anything, and the goal's tree answers backwards
+                path, num_nodes_expanded, max_frontier_size = service.query(init_state, goal_state)
+                check_graph_path(query, path, breadth_first_search(query)[0])
+                assert num_nodes_expanded == 0
+                reverse = GraphSearchProblem([init_state], goal_state, problem.V, problem.E)
+                check_graph_path(reverse, service.query(goal_state, init_state)[0], breadth_first_search(reverse)[0])
+        assert len(service.trees) <= 4
+    print("Graph query service is correct")
+
+
+def write_edge_list(path, E, header=(), trailer=()):
+    with open(path, 'w') as f:
+        for line in header:
+            f.write('# {:}\n'.format(line))
+        for a, b in E.tolist():
+            f.write('{:} {:}\n'.format(a, b))
+        for line in trailer:
+            f.write('# {:}\n'.format(line))
+
+
+# Check the edge list parser with and without comments, and the binary cache of load_graph
+def test_graph_loader():
+    np.random.seed(0)
+    E = np.random.randint(0, 1000, size=(20000, 2))
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join(tmpDir, 'edges.txt')
+        for header, trailer in (((), ()), (('Nodes: 1000',), ()), ((), ('trailer',)), (('Nodes: 1000',), ('end',))):
+            write_edge_list(path, E, header, trailer)
+            assert np.array_equal(parse_edge_list(path), E), "edges lost with comments {:} {:}".format(header, trailer)
+
+        V, E2, graph = load_graph(path, mmap_mode=None)
+        assert np.array_equal(E2, E) and np.array_equal(V, np.unique(E))
+        assert np.array_equal(graph.indptr, CSRGraph.from_edges(V, E).indptr)
+        #the cache is used while the source is unchanged, and rebuilt once it changes
+        V, E2, graph = load_graph(path, mmap_mode=None)
+        assert np.array_equal(E2, E)
+        write_edge_list(path, E[:100])
+        V, E2, graph = load_graph(path, mmap_mode=None)
+        assert np.array_equal(E2, E[:100])
+    print("Graph loader is correct")
+
+
+# Check the out-of-core searches over CSR files built from an edge list, with several goals and tiny batches
+def test_out_of_core_search():
+    with tempfile.TemporaryDirectory() as tmpDir:
+        edgePath = os.path.join(tmpDir, 'edges.txt')
+        for k, problem in enumerate(random_graphs(15, num_goals=3)):
+            write_edge_list(edgePath, problem.E, header=('random graph',))
+            outDir = os.path.join(tmpDir, 'csr{:}'.format(k))
+            build_graph_files(edgePath, outDir)
+            graph = open_graph_files(outDir)
+            reference = breadth_first_search(problem)[0]
+            for search in (breadth_first_search_out_of_core, bidirectional_search_out_of_core):
+                check_graph_path(problem, search(problem, graph, tmpDir, max_batch_edges=4)[0], reference)
+            #a start that is also a goal, with no edge in the files, and a start the files do not know
+            n = graph.num_vertices
+            for search in (breadth_first_search_out_of_core, bidirectional_search_out_of_core):
+                assert search(GraphSearchProblem([n + 5], n + 5, problem.V, problem.E), graph, tmpDir)[0] == [n + 5]
+                assert search(GraphSearchProblem([0], n + 5, problem.V, problem.E), graph, tmpDir)[0] == []
+            #release the memory maps before the directory is removed
+            del graph
+    print("Out-of-core searches are correct")
+
+
+# Check that the process pool answers every query, with both searches it accepts
+def test_parallel_search():
+    np.random.seed(1)
+    V = np.arange(200)
+    E = np.random.randint(0, 200, size=(300, 2))
+    graph = CSRGraph.from_edges(V, E)
+    queries = np.random.randint(0, 200, size=(20, 2)).tolist()
+    for search in (breadth_first_search_level_sync, bidirectional_search_direction_optimizing):
+        answered = set()
+        for i, (path, num_nodes_expanded, max_frontier_size) in parallel_breadth_first_search(graph, queries, 2,
+                                                                                              search):
+            init_state, goal_state = queries[i]
+            problem = GraphSearchProblem([goal_state], init_state, V, E)
+            check_graph_path(problem, path, breadth_first_search(problem)[0])
+            answered.add(i)
+        assert answered == set(range(len(queries)))
+    print("Parallel search is correct")
+
+
+# Check the array-backed search tree: paths, parent views and a layout that does not depend on the platform
+def test_node_store():
+    nodes = NodeStore()
+    root = nodes.add(-1, 10, -1, 0)
+    child = nodes.add(root, 11, 2, 1.5)
+    grandchild = nodes.add(child, 2 ** 40, 0, 2.5)
+    assert len(nodes) == 3
+    assert nodes.trace_path(grandchild) == [10, 11, 2 ** 40]
+    view = nodes.view(grandchild)
+    assert view.state == 2 ** 40 and view.action == 0 and view.path_cost == 2.5
+    assert view.parent.state == 11 and view.parent.action == 2 and view.parent.parent.parent is None
+    assert [a.itemsize for a in (nodes.parents, nodes.states, nodes.actions, nodes.costs)] == [8, 8, 8, 8]
+    print("Node store is correct")
+
+
+# Check the peak memory of the searches that keep their tree in a NodeStore: a few arrays of 8-byte entries per cell,
+# where one Node object per generated child and Python sets and dicts took about 170 bytes per cell
+def test_search_memory():
+    M, N = 200, 200
+    problem = GridSearchProblem([M * N - 1], 0, M, N, np.zeros((M, N), dtype=bool))
+    for search in (breadth_first_search, bidirectional_search, a_star_search):
+        tracemalloc.start()
+        try:
+            path = search(problem)[0]
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert len(path) == M + N - 1
+        assert peak < 64 * M * N, "{:} peaked at {:.0f} bytes per cell".format(search.__name__, peak / (M * N))
+    print("Search memory is bounded")
+
+
+# Check that instrumentation leaves the results unchanged and that its counters agree with the searches and callbacks
+def test_search_instrumentation():
+    for problem in random_grids(10):
+        for search in (breadth_first_search, bidirectional_search, a_star_search):
+            calls = {'expand': 0, 'generate': 0, 'goal_test': 0}
+
+            def count(name):
+                def callback(*args):
+                    calls[name] += 1
+                return callback
+            instrumentation = SearchInstrumentation(count('expand'), count('generate'), count('goal_test'))
+            path, num_nodes_expanded, max_frontier_size = search(problem, instrumentation)
+            assert path == search(problem)[0]
+            assert instrumentation.expanded == num_nodes_expanded == calls['expand']
+            assert instrumentation.generated == calls['generate'] and instrumentation.goal_tests == calls['goal_test']
+            summary = instrumentation.summary()
+            assert max(summary['frontier_histogram'], default=0) <= max_frontier_size
+            assert all(t >= 0.0 for t in summary['times'].values())
+    #a search stopped by should_stop reports the same count as the instrumentation
+    problem = GridSearchProblem([100 * 100 - 1], 0, 100, 100, np.zeros((100, 100), dtype=bool))
+    for search in (breadth_first_search, bidirectional_search, a_star_search):
+        polls = []
+
+        def should_stop():
+            polls.append(1)
+            return len(polls) == 3
+        instrumentation = SearchInstrumentation()
+        path, num_nodes_expanded, max_frontier_size = search(problem, instrumentation, should_stop=should_stop)
+        assert path == [] and len(polls) == 3
+        assert instrumentation.expanded == num_nodes_expanded == 3 * STOP_CHECK_INTERVAL - 1
+    print("Search instrumentation is correct")
+
+
+# Check that the benchmark runs every search on the same seeded instances and summarizes them
+def test_phase_transition_benchmark():
+    records = run_benchmark([0.1, 0.4, 0.8], [(10, 10)], 6, ('bfs', 'a_star', 'jps'), processes=2)
+    assert len(records) == 3 * 3 * 6
+    solved = {}
+    for record in records:
+        solved.setdefault((record['p_occ'], record['seed']), set()).add(record['solved'])
+    assert all(len(outcomes) == 1 for outcomes in solved.values()), "searches disagree on an instance"
+    rows = summarize(records)
+    assert len(rows) == 9 and all(row['instances'] == 6 for row in rows)
+    start, end, peak = phase_transition(rows, 'bfs', 10, 10)
+    assert peak in (0.1, 0.4, 0.8) and (start is None or end is None or start <= end)
+    print("Phase-transition benchmark is correct")
+
+
+# Check every ARA* solution against its bound and the final one against BFS, and the counters of a search without one
+def test_anytime_search():
+    for problem in random_grids():
+        reference = breadth_first_search(problem)[0]
+        for path, num_nodes_expanded, max_frontier_size, bound in iter_anytime_a_star(problem):
+            if len(reference) == 0:
+                assert len(path) == 0 and bound is None
+            else:
+                check_grid_path(problem, path, reference, optimal=False)
+                assert len(path) - 1 <= bound * (len(reference) - 1) + 1e-9
+        path, num_nodes_expanded, max_frontier_size, bound = anytime_a_star_search(problem)
+        check_grid_path(problem, path, reference)
+        if len(reference) > 0:
+            assert bound == 1.0, "ARA* stopped at bound {:}".format(bound)
+    #a wall cuts the grid in two: no path, but the work done is reported
+    grid_map = np.zeros((20, 20), dtype=bool)
+    grid_map[:, 10] = True
+    problem = GridSearchProblem([5 * 20 + 15], 5 * 20 + 2, 20, 20, grid_map)
+    path, num_nodes_expanded, max_frontier_size, bound = anytime_a_star_search(problem)
+    #all the 200 cells left of the wall are expanded
+    assert path == [] and num_nodes_expanded == 200 and max_frontier_size > 0 and bound is None
+    path, num_nodes_expanded, max_frontier_size, bound = anytime_a_star_search(problem, node_budget=3)
+    assert path == [] and num_nodes_expanded == 3 and max_frontier_size > 0 and bound is None
+    print("Anytime A* is correct")
+
+
+def random_cell_changes(problem, rng, k=5):
+    #k random cells other than the start and the goals, each set to occupied or free
+    states = rng.choice(problem.M * problem.N, size=min(k, problem.M * problem.N), replace=False).tolist()
+    states = [s for s in states if s != problem.init_state and s not in problem.goal_states]
+    return states, (rng.rand(len(states)) < 0.5).tolist()
+
+
+# Check LPA* against BFS on the initial map and after several batches of cell changes
+def test_incremental_search():
+    for seed, problem in enumerate(random_grids()):
+        planner = LPAStarGridPlanner(problem)
+        check_grid_path(problem, planner.plan()[0], breadth_first_search(problem)[0])
+        #nothing changed, nothing to repair
+        assert planner.plan()[1] == 0
+        rng = np.random.RandomState(seed)
+        for attempt in range(4):
+            #the planner writes the changes into problem.grid_map as well
+            planner.update_cells(*random_cell_changes(problem, rng))
+            check_grid_path(problem, planner.plan()[0], breadth_first_search(problem)[0])
+    print("LPA* is correct")
+
+
+def with_extra_goals(problem, rng, k=2):
+    #the same grid with k more random free cells added to the goals
+    free = np.flatnonzero(~np.asarray(problem.grid_map, dtype=bool).ravel())
+    problem.goal_states = list(problem.goal_states) + rng.choice(free, k).tolist()
+    return problem
+
+
+# Check IDA* and SMA* with one goal and with several, SMA* also with barely enough memory for the solution
+def test_memory_bounded_search():
+    for seed, problem in enumerate(random_grids()):
+        for attempt in range(2):
+            if attempt == 1:
+                problem = with_extra_goals(problem, np.random.RandomState(seed))
+            reference = breadth_first_search(problem)[0]
+            if len(reference) == 0:
+                #both only prove that there is no path after exhausting the map, keep to solvable instances
+                continue
+            check_grid_path(problem, ida_star_search(problem)[0], reference)
+            #a path of r steps holds r+1 nodes, any budget from there on must find it
+            depth = len(reference) - 1
+            for max_nodes in (depth + 1, depth + 3, problem.M * problem.N):
+                path, num_nodes_expanded, max_frontier_size = sma_star_search(problem, max_nodes)
+                check_grid_path(problem, path, reference)
+                assert max_frontier_size <= max_nodes, "SMA* stored {:} nodes".format(max_frontier_size)
+    #goal walled off in its corner: IDA* gives up after covering the reachable region, not after every simple path
+    M, N = 30, 30
+    grid_map = np.zeros((M, N), dtype=bool)
+    grid_map[M - 2, N - 2:] = True
+    grid_map[M - 1, N - 2] = True
+    problem = GridSearchProblem([M * N - 1], 0, M, N, grid_map)
+    for max_nodes in (None, M * N):
+        path, num_nodes_expanded, max_frontier_size = ida_star_search(problem, max_nodes)
+        assert path == [] and num_nodes_expanded <= M * N, "IDA* expanded {:} nodes".format(num_nodes_expanded)
+    print("IDA* and SMA* are correct")
+
+
+# Check ALT: admissible lower bounds, landmark-guided A* against BFS, and the table cached with the graph
+def test_landmark_search():
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        graph = get_csr_graph(problem)
+        table = LandmarkTable.from_graph(graph, k=4)
+        goalIndex = graph.index_of(problem.goal_states[0])
+        distances = bfs_distances(graph, goalIndex)
+        bounds = table.lower_bounds(np.arange(graph.num_vertices), goalIndex)
+        reachable = distances >= 0
+        assert np.all(bounds[reachable] <= distances[reachable]), "inadmissible landmark bound"
+        check_graph_path(problem, a_star_search_landmarks(problem, table)[0], reference)
+        check_graph_path(problem, a_star_search_landmarks(problem)[0], reference)
+
+    np.random.seed(0)
+    E = np.random.randint(0, 300, size=(600, 2))
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join(tmpDir, 'edges.txt')
+        write_edge_list(path, E)
+        V, E2, graph, table = load_landmark_table(path, k=8, mmap_mode=None)
+        V, E2, graph, cached = load_landmark_table(path, k=8, mmap_mode=None)
+        assert np.array_equal(cached.distances, table.distances)
+        #another k rebuilds the table
+        assert load_landmark_table(path, k=3, mmap_mode=None)[3].num_landmarks == 3
+    print("Landmark search is correct")
+
+
+# Check batched path reconstruction against tracing every path on its own
+def test_trace_parents_many():
+    for problem in random_graphs():
+        graph = get_csr_graph(problem)
+        tree = BFSTree(graph, graph.index_of(problem.init_state))
+        tree.grow(np.arange(graph.num_vertices))
+        reached = np.flatnonzero(tree.visited)
+        targets = np.concatenate((reached, reached[::-1], [-1]))
+        pathIndices, pathPtr = trace_parents_many(tree.parents, targets)
+        assert len(pathPtr) == len(targets) + 1
+        for j, target in enumerate(targets.tolist()):
+            expected = trace_parents(tree.parents, target) if target >= 0 else []
+            assert np.array_equal(pathIndices[pathPtr[j]:pathPtr[j + 1]], expected)
+    pathIndices, pathPtr = trace_parents_many(np.array([-1, 0]), np.empty(0, dtype=np.int64))
+    assert len(pathIndices) == 0 and pathPtr.tolist() == [0]
+    print("Batched path reconstruction is correct")
+
+
+# Check should_stop, and the async searches: results, timeouts and cancellation that release the executor thread
+def test_async_search():
+    np.random.seed(0)
+    problem = get_random_grid_problem(0.1, 100, 100)
+    for search in (breadth_first_search, bidirectional_search, a_star_search):
+        path, num_nodes_expanded, max_frontier_size = search(problem, should_stop=lambda: True)
+        assert path == [] and num_nodes_expanded == STOP_CHECK_INTERVAL - 1
+
+    np.random.seed(1)
+    #plain BFS needs several seconds on this one
+    slow = get_random_grid_problem(0.1, 1500, 1500)
+    quick = [get_random_grid_problem(0.2, 20, 20) for _ in range(4)]
+
+    async def main(executor):
+        results = await asyncio.gather(*[async_a_star_search(p, executor=executor) for p in quick])
+        for p, result in zip(quick, results):
+            assert result == a_star_search(p)
+        try:
+            await async_breadth_first_search(slow, timeout=0.05, executor=executor)
+            assert False, "no timeout"
+        except asyncio.TimeoutError:
+            pass
+        #the single worker is free again soon after the timeout
+        start = time.perf_counter()
+        assert await run_search(a_star_search, quick[0], executor=executor) == a_star_search(quick[0])
+        assert time.perf_counter() - start < 1.0
+        task = asyncio.ensure_future(async_breadth_first_search(slow, executor=executor))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+            assert False, "not cancelled"
+        except asyncio.CancelledError:
+            pass
+        start = time.perf_counter()
+        await run_search(a_star_search, quick[1], executor=executor)
+        assert time.perf_counter() - start < 1.0
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        asyncio.run(main(executor))
+    print("Async searches are correct")
+
+
+# Check the searches towards a set of goals: every path must lead to the nearest one
+def test_goal_set_search():
+    for problem in random_graphs(num_goals=4):
+        reference = breadth_first_search(problem)[0]
+        graph = get_csr_graph(problem)
+        for search in (breadth_first_search_csr, breadth_first_search_level_sync, bidirectional_search_csr,
+                       bidirectional_search_direction_optimizing):
+            check_graph_path(problem, search(problem, graph)[0], reference)
+        check_graph_path(problem, bidirectional_search(problem)[0], reference)
+    for seed, problem in enumerate(random_grids()):
+        problem = with_extra_goals(problem, np.random.RandomState(seed), 3)
+        reference = breadth_first_search(problem)[0]
+        for search in (bidirectional_search, a_star_search, a_star_search_grid):
+            check_grid_path(problem, search(problem)[0], reference)
+        heuristic = goal_set_heuristic(problem)
+        for state in reference:
+            assert heuristic(state) <= len(reference) - 1 - reference.index(state), "inadmissible heuristic"
+
+    #goals of a weighted problem are changed through set_goals or goal_states, both drop the cached tables
+    for seed in range(10):
+        np.random.seed(seed)
+        problem = get_random_weighted_grid_problem(0.2, 15, 20)
+        check_weighted_path(problem, a_star_search_weighted(problem)[0], dijkstra_cost(problem))
+        free = np.flatnonzero(~problem.grid_map.ravel())
+        problem.set_goals(np.random.choice(free, 3).tolist())
+        assert isinstance(problem.goal_states, tuple)
+        check_weighted_path(problem, a_star_search_weighted(problem)[0], dijkstra_cost(problem))
+        problem.goal_states = [int(np.random.choice(free))]
+        check_weighted_path(problem, a_star_search_weighted(problem)[0], dijkstra_cost(problem))
+    print("Goal-set searches are correct")
+
+
+# Check weighted A* against Dijkstra with and without diagonal moves, also after the cells and costs change
+def test_weighted_grid_search():
+    for seed in range(NUM_TRIALS):
+        np.random.seed(seed)
+        problem = get_random_weighted_grid_problem(0.2, 15, 20, diagonal=seed % 2 == 0)
+        for attempt in range(3):
+            check_weighted_path(problem, a_star_search_weighted(problem)[0], dijkstra_cost(problem))
+            states = [s for s in np.random.choice(problem.M * problem.N, 10, replace=False).tolist()
+                      if s != problem.init_state and s not in problem.goal_states]
+            problem.set_cell_costs(states, np.random.uniform(1.0, 5.0, len(states)))
+            problem.set_cells(states[:3], True)
+            problem.set_cells(states[3:5], False)
+        #the maps can only be changed through the setters
+        assert not problem.grid_map.flags.writeable and not problem.cost_map.flags.writeable
+    print("Weighted A* is correct")
+
+
+# Check HPA* paths, which are near-optimal: valid, and found whenever one exists, also after cells change
+def test_hierarchical_search():
+    for seed, problem in enumerate(random_grids()):
+        for cluster_size in (4, 7):
+            planner = HPAStarPlanner(problem, cluster_size)
+            check_grid_path(problem, planner.query()[0], breadth_first_search(problem)[0], optimal=False)
+            rng = np.random.RandomState(seed)
+            for attempt in range(3):
+                #the planner writes the changes into problem.grid_map as well
+                planner.update_cells(*random_cell_changes(problem, rng))
+                check_grid_path(problem, planner.query()[0], breadth_first_search(problem)[0], optimal=False)
+            #other start and goal cells of the same map
+            free = np.flatnonzero(~np.asarray(problem.grid_map, dtype=bool).ravel())
+            init_state, goal_state = rng.choice(free, 2).tolist()
+            query = GridSearchProblem([goal_state], init_state, problem.M, problem.N, problem.grid_map)
+            check_grid_path(query, planner.query(init_state, goal_state)[0], breadth_first_search(query)[0],
+                            optimal=False)
+    print("HPA* is correct")
+
+
+def grid_graph(side, num_extra, rng):
+    #road-like graph: a side x side grid with a few random long edges
+    cells = np.arange(side * side).reshape(side, side)
+    E = np.concatenate((np.stack((cells[:, :-1].ravel(), cells[:, 1:].ravel()), axis=1),
+                        np.stack((cells[:-1, :].ravel(), cells[1:, :].ravel()), axis=1),
+                        rng.randint(0, side * side, size=(num_extra, 2))))
+    return np.arange(side * side), E
+
+
+def power_law_graph(n, m, rng):
+    #preferential attachment: every new vertex links to m earlier ones, picked in proportion to their degree
+    ends = list(range(m))
+    E = []
+    for v in range(m, n):
+        targets = set(ends[i] for i in rng.randint(0, len(ends), m))
+        E.extend((v, t) for t in targets)
+        ends.extend(targets)
+        ends.extend([v] * len(targets))
+    return np.arange(n), np.array(E)
+
+
+# Check contraction hierarchy queries against BFS, with and without a core, and the build time on a Facebook-size graph
+def test_contraction_hierarchy():
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        graph = get_csr_graph(problem)
+        check_graph_path(problem, contraction_hierarchy_search(problem)[0], reference)
+        hierarchy = ContractionHierarchy.from_graph(graph, core_factor=None)
+        check_graph_path(problem, contraction_hierarchy_search(problem, hierarchy)[0], reference)
+
+    rng = np.random.RandomState(0)
+    for side, num_extra in ((12, 0), (15, 10), (20, 40)):
+        V, E = grid_graph(side, num_extra, rng)
+        graph = CSRGraph.from_edges(V, E)
+        for core_factor in (1.0, 0.5, None):
+            hierarchy = ContractionHierarchy.from_graph(graph, core_factor=core_factor)
+            for init_state, goal_state in rng.choice(V, size=(20, 2)).tolist():
+                problem = GraphSearchProblem([goal_state], init_state, V, E)
+                check_graph_path(problem, contraction_hierarchy_search(problem, hierarchy)[0],
+                                 breadth_first_search(problem)[0])
+        assert hierarchy.num_shortcuts > 0
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join(tmpDir, 'hierarchy.npz')
+        hierarchy.save(path)
+        loaded = ContractionHierarchy.load(path)
+        for name in ContractionHierarchy.ARRAYS:
+            assert np.array_equal(getattr(loaded, name), getattr(hierarchy, name)), name + " changed by save/load"
+        assert loaded.query(0, side * side - 1)[0] == hierarchy.query(0, side * side - 1)[0]
+
+    #the Facebook graph of the project has 4039 vertices and 88k edges
+    V, E = power_law_graph(4039, 22, rng)
+    graph = CSRGraph.from_edges(V, E)
+    start = time.perf_counter()
+    hierarchy = ContractionHierarchy.from_graph(graph)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 60, "contraction took {:.0f}s".format(elapsed)
+    for source in rng.choice(V, 5).tolist():
+        distances = bfs_distances(graph, source)
+        for target in rng.choice(V, 10).tolist():
+            path = hierarchy.query(source, target)[0]
+            assert len(path) == distances[target] + 1, "path of length {:} instead of {:}".format(
+                len(path), distances[target] + 1)
+            for a, b in zip(path[:-1], path[1:]):
+                assert b in graph.neighbours(a), "invalid step"
+    print("Contraction hierarchy is correct, built the power-law graph in {:.1f}s".format(elapsed))
+
+
+# Check the Bitset and VisitedSet against Python sets, and the searches that take a VisitedSet for their explored states
+def test_visited_set():
+    rng = np.random.RandomState(0)
+    for n in (1, 8, 13, 1000):
+        bitset = Bitset(n)
+        reference = set()
+        for i in rng.randint(0, n, 20).tolist():
+            assert bitset.test(i) == (i in reference)
+            bitset.set(i)
+            reference.add(i)
+        indices = rng.randint(0, n, 50)
+        assert np.array_equal(bitset.test_many(indices), [i in reference for i in indices.tolist()])
+        #repeated indices, several of them in one byte: only the first occurrence of a new one is reported
+        indices = np.concatenate((indices, rng.randint(0, n, 50), indices[:5]))
+        new = bitset.test_and_set_many(indices)
+        expected = []
+        for i in indices.tolist():
+            expected.append(i not in reference)
+            reference.add(i)
+        assert np.array_equal(new, expected)
+        assert bitset.count() == len(reference)
+        bitset.set_many(np.arange(n))
+        assert bitset.count() == n and bitset.test_many(np.arange(n)).all()
+
+    visited = VisitedSet(10, offset=-3)
+    assert -3 not in visited and 7 not in visited and len(visited) == 0
+    visited.add(-3)
+    visited.add(6)
+    visited.add(6)
+    assert -3 in visited and 6 in visited and 5 not in visited and len(visited) == 2
+    assert np.array_equal(visited.add_many([0, 0, 6, 1]), [True, False, False, True])
+    assert len(visited) == 4
+    for bad in (-4, 7):
+        try:
+            visited.add(bad)
+            assert False, "added a state outside of the range"
+        except IndexError:
+            pass
+    try:
+        visited.add_many([0, 7])
+        assert False, "added a state outside of the range"
+    except IndexError:
+        pass
+    assert len(visited) == 4
+
+    problem = GraphSearchProblem([12], 5, np.arange(5, 20), np.array([[5, 9], [9, 12], [19, 12]]))
+    visited = VisitedSet.for_problem(problem)
+    assert visited.offset == 5 and visited.n == 15
+    for problem in random_graphs():
+        reference = breadth_first_search(problem)[0]
+        for search in (breadth_first_search, bidirectional_search, a_star_search):
+            check_graph_path(problem, search(problem, visited_set=VisitedSet.for_problem)[0], reference)
+    for problem in random_grids():
+        assert VisitedSet.for_problem(problem).n == problem.M * problem.N
+        reference = breadth_first_search(problem)[0]
+        for search in (breadth_first_search, bidirectional_search, a_star_search):
+            check_grid_path(problem, search(problem, visited_set=VisitedSet.for_problem)[0], reference)
+    print("Bitset and VisitedSet are correct")
+
+
+def entry_bytes(cache):
+    return sum(os.path.getsize(os.path.join(cache.cache_dir, name)) for name in os.listdir(cache.cache_dir))
+
+
+# Check the search result cache: hits and misses, byte accounting with overwrites, LRU eviction and search names
+def test_search_cache():
+    with tempfile.TemporaryDirectory() as tmpDir:
+        cache = SearchResultCache(tmpDir)
+        problems = list(random_grids(8))
+        for attempt in range(2):
+            for problem in problems:
+                path, num_nodes_expanded, max_frontier_size = cache.run(breadth_first_search, problem)
+                assert list(path) == list(breadth_first_search(problem)[0])
+        assert cache.hits == len(problems) and cache.misses == len(problems)
+        assert cache.total_bytes == entry_bytes(cache)
+        assert SearchResultCache(tmpDir).total_bytes == cache.total_bytes
+
+        #overwriting an entry replaces its bytes instead of adding to them
+        key = cache.key(breadth_first_search, problems[0])
+        for path in ([1, 2, 3], list(range(100)), [4]):
+            cache.put(key, (path, 1, 1))
+            assert cache.total_bytes == entry_bytes(cache)
+        assert cache.get(key) == ([4], 1, 1)
+
+        cached = cache.wrap(breadth_first_search)
+        assert cached(problems[1])[0] == list(breadth_first_search(problems[1])[0])
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        result = ([1, 2, 3], 5, 6)
+        cache = SearchResultCache(tmpDir)
+        cache.put('probe', result)
+        size = cache.total_bytes
+        cache.clear()
+        cache = SearchResultCache(tmpDir, max_bytes=3 * size)
+        for i, key in enumerate('abc'):
+            cache.put(key, result)
+            os.utime(os.path.join(tmpDir, key + '.json'), ns=(i * 10 ** 9, i * 10 ** 9))
+        #a hit makes 'a' the most recently used entry, so 'b' is the one evicted
+        assert cache.get('a') == result
+        cache.put('d', result)
+        assert cache.evictions == 1
+        assert sorted(os.listdir(tmpDir)) == ['a.json', 'c.json', 'd.json']
+        assert cache.total_bytes == entry_bytes(cache) == 3 * size
+        assert cache.get('b') is None
+
+        def local_search(problem):
+            return breadth_first_search(problem)
+        for search in (lambda problem: breadth_first_search(problem), functools.partial(breadth_first_search),
+                       local_search):
+            for call in (lambda: search_name(search), lambda: cache.key(search, problems[0]),
+                         lambda: cache.wrap(search)):
+                try:
+                    call()
+                    assert False, "no error for a search without a stable name"
+                except ValueError:
+                    pass
+            assert cache.wrap(search, name='bfs')(problems[0])[0] == list(breadth_first_search(problems[0])[0])
+    print("Search result cache is correct")
+
+
+if __name__ == '__main__':
+    test_csr_graph()
+    test_csr_searches()
+    test_level_sync_bfs()
+    test_bidirectional_search()
+    test_a_star_search()
+    test_a_star_search_grid()
+    test_jump_point_search()
+    test_graph_query_service()
+    test_graph_loader()
+    test_out_of_core_search()
+    test_parallel_search()
+    test_node_store()
+    test_search_instrumentation()
+    test_phase_transition_benchmark()
+    test_anytime_search()
+    test_incremental_search()
+    test_memory_bounded_search()
+    test_landmark_search()
+    test_trace_parents_many()
+    test_async_search()
+    test_goal_set_search()
+    test_weighted_grid_search()
+    test_hierarchical_search()
+    test_contraction_hierarchy()
+    test_visited_set()
+    test_search_cache()
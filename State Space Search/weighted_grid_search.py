@@ -0,0 +1,223 @@
+import heapq
+import math
+import numpy as np
+from search_problems import Node, GridSearchProblem
+from csr_graph import trace_parents
+from grid_map import grid_arrays, heuristic_table, padded_free_cells, to_padded, from_padded
+
+#(row, column) steps of the 8-connected neighbourhood, orthogonal moves first
+MOVES_8 = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+class WeightedGridSearchProblem(GridSearchProblem):
+    """
+    GridSearchProblem with a traversal cost per cell and, optionally, diagonal moves. Moving into a cell costs the
+    cell's cost times the length of the step (1, or sqrt(2) for a diagonal). A diagonal step may not cut the corner of
+    an occupied cell, so both orthogonal cells next to it must be free. The heuristic is the octile distance to the
+    nearest goal scaled by the cheapest cell cost, which keeps it admissible.
+
+    The problem keeps read-only copies of grid_map and cost_map and a tuple of goal_states, so the tables cached for
+    a_star_search_weighted cannot go stale behind its back: change them through set_cells, set_cell_costs and
+    set_goals, which drop the cache.
+
+    :param goal_states: list of goal cell ids (row*N + col)
+    :param init_state: start cell id
+    :param M: number of rows
+    :param N: number of columns
+    :param grid_map: (M, N) occupancy matrix, truthy where the cell is an obstacle
+    :param cost_map: (M, N) array of positive traversal costs, all ones if None
+    :param diagonal: allow the four diagonal moves
+    """
+    #heuristic already measures the distance to the nearest of all goal_states (see goal_set_heuristic)
+    multi_goal_heuristic = True
+
+    def __init__(self, goal_states, init_state, M, N, grid_map, cost_map=None, diagonal=True):
+        super().__init__(goal_states, init_state, M, N, np.array(grid_map, dtype=bool))
+        if cost_map is None:
+            cost_map = np.ones((M, N))
+        self.cost_map = np.array(cost_map, dtype=np.float64)
+        self.grid_map.flags.writeable = False
+        self.cost_map.flags.writeable = False
+        self.diagonal = diagonal
+        self._padded = None
+
+    def _padded_arrays(self):
+        #padded free mask, entry cost and heuristic tables shared by the methods below and a_star_search_weighted;
+        #built on first use and dropped when the costs or the goals change
+        if self._padded is None:
+            occupied, M, N = grid_arrays(self)
+            W = N + 2
+            free = padded_free_cells(occupied, M, N)
+            costs = np.full((M + 2) * W, np.inf)
+            costs.reshape(M + 2, W)[1:-1, 1:-1] = self.cost_map
+            costs[~free] = np.inf
+            kind = 'octile' if self.diagonal else 'manhattan'
+            freeCosts = self.cost_map.ravel()[~occupied]
+            scale = float(freeCosts.min()) if len(freeCosts) > 0 else 1.0
+            h = scale * heuristic_table(M + 2, W, to_padded(self.goal_states, N), kind).astype(np.float64)
+            self._padded = {'free': free, 'costs': costs, 'h': h}
+        return self._padded
+
+    def _update(self, name, states, values):
+        #write into a fresh copy of a read-only map, then drop the cached tables
+        rows, cols = np.divmod(np.asarray(states, dtype=np.int64), self.N)
+        array = getattr(self, name).copy()
+        array[rows, cols] = values
+        array.flags.writeable = False
+        setattr(self, name, array)
+        self._padded = None
+
+    def set_cells(self, states, occupied):
+        """
+        Flip a batch of cells between free and occupied, the problem is reused for the next queries.
+
+        :param states: list of cell ids
+        :param occupied: bool, or a list with the new occupancy of every cell
+        """
+        self._update('grid_map', states, occupied)
+
+    def set_cell_costs(self, states, costs):
+        """
+        Change the traversal cost of a batch of cells, the problem is reused for the next queries.
+
+        :param states: list of cell ids
+        :param costs: new cost, or a list with the new cost of every cell
+        """
+        self._update('cost_map', states, costs)
+
+    def set_goals(self, goal_states):
+        self.goal_states = goal_states
+
+    @property
+    def goal_states(self):
+        return self._goal_states
+
+    @goal_states.setter
+    def goal_states(self, goal_states):
+        #a tuple, so the goals cannot be edited in place behind the cache
+        self._goal_states = tuple(int(goal) for goal in goal_states)
+        self._padded = None
+
+    def get_actions(self, state):
+        r, c = self.get_position(state)
+        moves = MOVES_8 if self.diagonal else MOVES_8[:4]
+        actions = []
+        for dr, dc in moves:
+            rr, cc = r + dr, c + dc
+            if not (0 <= rr < self.M and 0 <= cc < self.N) or self.grid_map[rr, cc]:
+                continue
+            if dr != 0 and dc != 0 and (self.grid_map[r + dr, c] or self.grid_map[r, c + dc]):
+                #no cutting corners
+                continue
+            actions.append(self.get_state(rr, cc))
+        return actions
+
+    def transition(self, state, action):
+        return action
+
+    def action_cost(self, state, action):
+        r, c = self.get_position(state)
+        rr, cc = self.get_position(action)
+        length = math.sqrt(2.0) if r != rr and c != cc else 1.0
+        return length * float(self.cost_map[rr, cc])
+
+    def get_child_node(self, parent, action):
+        state = self.transition(parent.state, action)
+        return Node(parent, state, action, parent.path_cost + self.action_cost(parent.state, action))
+
+    def heuristic(self, state):
+        return float(self._padded_arrays()['h'][to_padded(state, self.N)])
+
+    def path_cost(self, path):
+        return sum(self.action_cost(a, b) for a, b in zip(path[:-1], path[1:]))
+
+
+def a_star_search_weighted(problem):
+    """
+    A* for WeightedGridSearchProblem, in the style of a_star_search_grid: cells are ids of the map padded with a wall,
+    the entry costs and the octile heuristic to the goal set are precomputed for the whole raster in vectorized passes
+    and kept on the problem between queries, and g-costs, parents and the closed set live in flat arrays.
+
+    :param problem: an instance of WeightedGridSearchProblem to solve
+    :return: path: a list of states (ints) describing the path from problem.init_state to the nearest state of
+                   problem.goal_states
+             num_nodes_expanded: number of nodes expanded by your search
+             max_frontier_size: maximum frontier size during search
+    """
+    num_nodes_expanded = 0
+    max_frontier_size = 0
+    if problem.init_state in problem.goal_states:
+        return [int(problem.init_state)], num_nodes_expanded, max_frontier_size
+
+    N = problem.N
+    W = N + 2
+    arrays = problem._padded_arrays()
+    initState = int(to_padded(problem.init_state, N))
+    goalArray = np.zeros(len(arrays['free']), dtype=bool)
+    goalArray[to_padded(problem.goal_states, N)] = True
+    gArray = np.full(len(arrays['free']), np.inf)
+    parentArray = np.full(len(arrays['free']), -1, dtype=np.int64)
+    closedArray = ~arrays['free']
+
+    isFree = memoryview(arrays['free'])
+    entryCosts = memoryview(arrays['costs'])
+    hTable = memoryview(arrays['h'])
+    isGoal = memoryview(goalArray)
+    gCosts = memoryview(gArray)
+    parents = memoryview(parentArray)
+    closed = memoryview(closedArray)
+    #(offset, step length, offsets of the two cells a diagonal step passes between)
+    moves = [(dr * W + dc, math.sqrt(2.0) if dr != 0 and dc != 0 else 1.0, dr * W, dc)
+             for dr, dc in (MOVES_8 if problem.diagonal else MOVES_8[:4])]
+    gCosts[initState] = 0.0
+
+    frontier = [(hTable[initState], hTable[initState], initState)]
+    while len(frontier) > 0:
+        max_frontier_size = max(max_frontier_size, len(frontier))
+        _, _, currState = heapq.heappop(frontier)
+        if closed[currState]:
+            continue
+        if isGoal[currState]:
+            path = from_padded(trace_parents(parentArray, currState), N).tolist()
+            return path, num_nodes_expanded, max_frontier_size
+        closed[currState] = True
+        num_nodes_expanded += 1
+
+        currCost = gCosts[currState]
+        for offset, length, rowStep, colStep in moves:
+            childState = currState + offset
+            if closed[childState]:
+                continue
+            if length != 1.0 and not (isFree[currState + rowStep] and isFree[currState + colStep]):
+                continue
+            childCost = currCost + length * entryCosts[childState]
+            if childCost < gCosts[childState]:
+                gCosts[childState] = childCost
+                parents[childState] = currState
+                h = hTable[childState]
+                heapq.heappush(frontier, (childCost + h, h, childState))
+
+    return [], num_nodes_expanded, max_frontier_size
+
+
+def get_random_weighted_grid_problem(p_occ, M, N, max_cost=5.0, diagonal=True):
+    """
+    Random WeightedGridSearchProblem: obstacles with probability p_occ, costs drawn uniformly from [1, max_cost].
+    """
+    grid_map = np.random.rand(M, N) < p_occ
+    cost_map = np.random.uniform(1.0, max_cost, size=(M, N))
+    free = np.flatnonzero(~grid_map.ravel())
+    init_state, goal_state = np.random.choice(free, 2, replace=False)
+    return WeightedGridSearchProblem([int(goal_state)], int(init_state), M, N, grid_map, cost_map, diagonal)
+
+
+if __name__ == '__main__':
+    problem = get_random_weighted_grid_problem(0.2, 200, 200)
+    path, num_nodes_expanded, max_frontier_size = a_star_search_weighted(problem)
+    print("Path of cost {:.2f} in {:} steps, {:} nodes expanded".format(problem.path_cost(path), len(path) - 1,
+                                                                       num_nodes_expanded))
+    # Same map, another start: the cost raster and heuristic table are reused
+    problem.init_state = path[len(path) // 2]
+    path, num_nodes_expanded, max_frontier_size = a_star_search_weighted(problem)
+    print("Path of cost {:.2f} in {:} steps, {:} nodes expanded".format(problem.path_cost(path), len(path) - 1,
+                                                                       num_nodes_expanded))